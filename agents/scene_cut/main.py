@@ -5,6 +5,7 @@ import subprocess
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore
+from mp4_ranges import GcsRangeReader, fetch_time_ranges, range_fetch_enabled
 
 # Initialize Google Cloud Storage client
 storage_client = storage.Client()
@@ -20,6 +21,13 @@ except ValueError:
 
 db = firestore.client()
 
+def _timecode_to_seconds(timecode: str) -> float:
+    """Converts a HH:MM:SS or MM:SS timecode (seconds may be fractional) to seconds."""
+    seconds = 0.0
+    for part in str(timecode).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
 def process_video_for_clips(document_id: str):
     """
     Fetches video information and time codes from a Firebase Firestore document
@@ -84,11 +92,26 @@ def process_video_for_clips(document_id: str):
     local_source_path = f"/tmp/{os.path.basename(source_blob_name)}"
 
     try:
-        # 2. Download the source video from GCS
-        print(f"Downloading '{source_blob_name}' from bucket '{bucket_name}' to '{local_source_path}'...")
+        # 2. Download the source video from GCS. For MP4 sources only the index and
+        # the bytes of the requested clips are fetched, into a sparse local file.
         bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(source_blob_name)
-        blob.download_to_filename(local_source_path)
+        fetched = None
+        if range_fetch_enabled:
+            try:
+                time_ranges = [
+                    (_timecode_to_seconds(clip_info["start_time"]), _timecode_to_seconds(clip_info["end_time"]))
+                    for clip_info in time_codes_data
+                    if clip_info.get("start_time") and clip_info.get("end_time")
+                ]
+                print(f"Fetching {len(time_ranges)} time ranges of '{source_blob_name}' to '{local_source_path}'...")
+                reader = GcsRangeReader(storage_client, bucket_name, source_blob_name)
+                fetched = fetch_time_ranges(reader, time_ranges, local_source_path)
+            except Exception as e:
+                print(f"Byte-range fetch failed, downloading the whole file: {e}")
+        if not fetched:
+            print(f"Downloading '{source_blob_name}' from bucket '{bucket_name}' to '{local_source_path}'...")
+            blob = bucket.blob(source_blob_name)
+            blob.download_to_filename(local_source_path)
         print("Download complete.")
 
         # Determine output format (e.g., based on input video extension)
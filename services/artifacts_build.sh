@@ -15,6 +15,13 @@ services=(
     "transcription_generator"
 )
 
+# The byte-range MP4 reader and the segment pool live in common/; the scene_cut agent and
+# the video processor are built from their own directories, so they are copied next to them.
+echo "Copying common/mp4_ranges.py and common/segment_pool.py to the scene_cut agent and the video processor..."
+cp common/mp4_ranges.py ../agents/scene_cut/
+cp common/mp4_ranges.py ../utilities/video-processor/
+cp common/segment_pool.py ../utilities/video-processor/
+
 # Loop through each service name in the 'services' array.
 for service_name in "${services[@]}"; do
     echo "--- Starting publish process for service: $service_name ---"
@@ -0,0 +1,151 @@
+""" Batch prediction request lines and response parsing for backfills
+
+Every line of a batch input file holds one GenerateContentRequest for one
+asset and one task. The request carries a `backfill_key` label, which the
+run manifest maps back to the asset and task when the output is ingested.
+"""
+import json
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from common.generation_profiles import get_generation_profile
+from common.video_input import resolve_video_input, build_video_part
+from summaries_generator.prompts import (
+    SUMMARY_PROMPT,
+    SUMMARY_SYSTEM_INSTRUCTION,
+    KEY_SECTIONS_PROMPT,
+    KEY_SECTIONS_SYSTEM_INSTRUCTION,
+    CATEGORIZATION_PROMPT,
+    CATEGORIZATION_SYSTEM_INSTRUCTION,
+)
+from summaries_generator.structured_output_schema import (
+    SUMMARY_SCHEMA,
+    KEY_SECTIONS_SCHEMA,
+    ASSET_CATEGORIZATION_SCHEMA,
+)
+from previews_generator.prompts import SHORTS_PROMPT, SHORTS_SYSTEM_INSTRUCTION
+from previews_generator.structured_output_schema import SHORTS_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+# Backfill tasks: (prompt, system instruction, response schema, metadata section).
+# The task names double as generation profile and video input task names.
+BATCH_TASKS = {
+    "summary": (SUMMARY_PROMPT, SUMMARY_SYSTEM_INSTRUCTION, SUMMARY_SCHEMA, "summary"),
+    "sections": (KEY_SECTIONS_PROMPT, KEY_SECTIONS_SYSTEM_INSTRUCTION, KEY_SECTIONS_SCHEMA, "summary"),
+    "categorization": (
+        CATEGORIZATION_PROMPT,
+        CATEGORIZATION_SYSTEM_INSTRUCTION,
+        ASSET_CATEGORIZATION_SCHEMA,
+        "summary",
+    ),
+    "shorts": (SHORTS_PROMPT, SHORTS_SYSTEM_INSTRUCTION, SHORTS_SCHEMA, "previews"),
+}
+
+BACKFILL_KEY_LABEL = "backfill_key"
+
+SAFETY_SETTINGS = [
+    {"category": category, "threshold": "OFF"}
+    for category in (
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_HARASSMENT",
+    )
+]
+
+
+def make_backfill_key(asset_id: str, task: str) -> str:
+    """Returns a label-safe key (lowercase hex, under 63 characters) for an asset task."""
+    return hashlib.sha1(f"{asset_id}:{task}".encode("utf-8")).hexdigest()
+
+
+def build_request_line(
+    asset_id: str,
+    file_location: str,
+    task: str,
+    default_model: str,
+    duration: Optional[float] = None,
+) -> Tuple[str, str, dict]:
+    """
+    Builds the batch input line for one asset and one task, using the same
+    prompts, schemas, generation profile and video input settings as the
+    online services.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        file_location (str): GCS URI of the media file.
+        task (str): One of the BATCH_TASKS names.
+        default_model (str): Model used when the task profile does not name one.
+        duration (Optional[float]): Asset duration in seconds.
+
+    Returns:
+        Tuple[str, str, dict]: The backfill key, the model and the JSONL line.
+    """
+    prompt, system_instruction, schema, _ = BATCH_TASKS[task]
+    profile = get_generation_profile(task, default_model=default_model)
+    video_input = resolve_video_input(task, duration)
+    media_resolution = video_input.get("media_resolution") or profile["media_resolution"]
+    video_part = build_video_part(file_location, "video/*", video_input)
+    key = make_backfill_key(asset_id, task)
+
+    generation_config = {
+        "temperature": profile["temperature"],
+        "topP": 1,
+        "seed": 0,
+        "maxOutputTokens": profile["max_output_tokens"],
+        "responseMimeType": "application/json",
+        "responseSchema": schema,
+        "thinkingConfig": {"thinkingBudget": profile["thinking_budget"]},
+    }
+    if media_resolution:
+        generation_config["mediaResolution"] = media_resolution
+
+    line = {
+        "request": {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [
+                        {"text": prompt},
+                        video_part.model_dump(mode="json", by_alias=True, exclude_none=True),
+                    ],
+                }
+            ],
+            "systemInstruction": {"parts": [{"text": system_instruction}]},
+            "generationConfig": generation_config,
+            "safetySettings": SAFETY_SETTINGS,
+            "labels": {BACKFILL_KEY_LABEL: key},
+        }
+    }
+    return key, profile["model"], line
+
+
+def parse_output_line(line: dict) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Extracts the backfill key and response text from a batch output line.
+
+    Returns:
+        Tuple: (backfill key, response text, error). The response text is None
+        when the request failed, in which case the error describes why.
+    """
+    key = ((line.get("request") or {}).get("labels") or {}).get(BACKFILL_KEY_LABEL)
+    if line.get("status"):
+        return key, None, str(line["status"])
+    candidates = (line.get("response") or {}).get("candidates") or []
+    if not candidates:
+        return key, None, "No candidates in response"
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    text = "".join(part.get("text", "") for part in parts if not part.get("thought"))
+    if not text:
+        return key, None, f"Empty response (finish reason: {candidates[0].get('finishReason')})"
+    return key, text, None
+
+
+def parse_task_result(text: str):
+    """Decodes a task's response text, returning an error dictionary when malformed."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {"error": f"Malformed JSON response from model: {text}"}
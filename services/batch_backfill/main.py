@@ -0,0 +1,284 @@
+"""
+Catalogue backfills through Vertex AI batch prediction.
+
+Backfilling the summary, key sections, categorization and shorts of many
+assets through the online services sends one request per asset and task and
+consumes the online quota. This tool writes those requests into JSONL input
+files instead, submits them as batch prediction jobs (one per model) and
+ingests the output back into the asset documents with batched writes.
+
+A run lives under a GCS prefix or a local directory holding its manifest,
+input files and output files:
+
+    python -m batch_backfill.main prepare gs://bucket/backfills/run-1 --all
+    python -m batch_backfill.main submit gs://bucket/backfills/run-1
+    python -m batch_backfill.main ingest gs://bucket/backfills/run-1 --wait
+
+`submit --local` runs the requests through the LocalBatchRunner stand-in
+instead, optionally answering them from a fixtures file mapping task names
+to canned responses so the whole flow can be tested offline.
+"""
+import os
+import json
+import logging
+import argparse
+import datetime
+from collections import defaultdict
+from typing import List, Optional
+
+from common.logging_config import configure_logger
+from common.media_asset_manager import MediaAssetManager
+from common.video_input import get_asset_duration
+from summaries_generator.summary_status import (
+    SUBTASK_ERROR_PREFIXES,
+    build_summary_update,
+    get_previous_subtasks,
+)
+
+from .batch_requests import (
+    BATCH_TASKS,
+    BACKFILL_KEY_LABEL,
+    build_request_line,
+    parse_output_line,
+    parse_task_result,
+)
+from .runners import (
+    VertexBatchRunner,
+    LocalBatchRunner,
+    SUCCEEDED_JOB_STATES,
+    write_text,
+    read_text,
+    read_jsonl,
+    list_jsonl,
+)
+
+configure_logger()
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
+location = os.environ.get("GCP_REGION", "us-central1")
+llm_model = os.environ.get("LLM_MODEL", "gemini-2.5-flash")
+
+
+def _model_dir(model: str) -> str:
+    """Turns a model name into a path segment."""
+    return model.replace("/", "_")
+
+
+def _manifest_uri(run: str) -> str:
+    return f"{run.rstrip('/')}/manifest.json"
+
+
+def load_manifest(run: str) -> dict:
+    """Reads the manifest of a run."""
+    return json.loads(read_text(_manifest_uri(run)))
+
+
+def save_manifest(run: str, manifest: dict):
+    """Writes the manifest of a run."""
+    write_text(_manifest_uri(run), json.dumps(manifest, indent=2))
+
+
+def select_assets(asset_manager: MediaAssetManager, asset_ids: Optional[List[str]]) -> List[tuple]:
+    """
+    Returns (asset_id, asset_data) pairs for the requested assets, or for
+    every video asset when no IDs are given. YouTube and dummy assets are
+    skipped since batch jobs only read media from Cloud Storage.
+    """
+    if asset_ids:
+        assets = [(asset_id, asset_manager.get_asset(asset_id)) for asset_id in asset_ids]
+    else:
+        assets = [
+            (doc.id, doc.to_dict())
+            for doc in asset_manager.media_assets_collection.where(
+                "file_category", "==", "video"
+            ).stream()
+        ]
+    return [
+        (asset_id, asset_data)
+        for asset_id, asset_data in assets
+        if asset_data
+        and asset_data.get("source", "GCS") != "youtube"
+        and not asset_data.get("is_dummy")
+    ]
+
+
+def prepare(run: str, asset_ids: Optional[List[str]], tasks: List[str]) -> dict:
+    """
+    Writes the input files of a run, one per model, and its manifest mapping
+    every backfill key to its asset and task.
+    """
+    asset_manager = MediaAssetManager(project_id=project_id)
+    lines_per_model = defaultdict(list)
+    entries = {}
+    for asset_id, asset_data in select_assets(asset_manager, asset_ids):
+        for task in tasks:
+            key, model, line = build_request_line(
+                asset_id,
+                asset_data["file_path"],
+                task,
+                llm_model,
+                get_asset_duration(asset_data),
+            )
+            lines_per_model[model].append(json.dumps(line))
+            entries[key] = {"asset_id": asset_id, "task": task, "model": model}
+
+    inputs = {}
+    for model, lines in lines_per_model.items():
+        input_uri = f"{run.rstrip('/')}/input/{_model_dir(model)}.jsonl"
+        write_text(input_uri, "\n".join(lines) + "\n")
+        inputs[model] = input_uri
+        logger.info("Wrote %d requests for %s to %s", len(lines), model, input_uri)
+
+    manifest = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "tasks": tasks,
+        "inputs": inputs,
+        "jobs": {},
+        "entries": entries,
+    }
+    save_manifest(run, manifest)
+    return manifest
+
+
+def _fixture_responder(manifest: dict, fixtures_path: str):
+    """Builds a LocalBatchRunner responder answering every task with its fixture."""
+    with open(fixtures_path, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    def respond(model: str, request: dict) -> dict:
+        key = request["labels"][BACKFILL_KEY_LABEL]
+        task = manifest["entries"][key]["task"]
+        return {"candidates": [{"content": {"parts": [{"text": json.dumps(fixtures[task])}]}}]}
+
+    return respond
+
+
+def submit(run: str, local: bool = False, fixtures: Optional[str] = None) -> dict:
+    """Submits one batch job per input file and records the job names in the manifest."""
+    manifest = load_manifest(run)
+    if local:
+        responder = _fixture_responder(manifest, fixtures) if fixtures else None
+        runner = LocalBatchRunner(project_id, responder)
+    else:
+        runner = VertexBatchRunner(project_id, location)
+
+    for model, input_uri in manifest["inputs"].items():
+        output_prefix = f"{run.rstrip('/')}/output/{_model_dir(model)}/"
+        job_name = runner.submit(
+            model, input_uri, output_prefix, f"backfill-{_model_dir(model)}"
+        )
+        manifest["jobs"][model] = {"name": job_name, "output_prefix": output_prefix}
+    manifest["local"] = local
+    save_manifest(run, manifest)
+    return manifest
+
+
+def _previews_update(result) -> dict:
+    """Builds the previews update from a shorts result."""
+    if isinstance(result, list):
+        return {"status": "completed", "clips": result, "error_message": None}
+    error = result.get("error") if isinstance(result, dict) else None
+    return {"status": "failed", "error_message": error or f"Unexpected response format: {result}"}
+
+
+def ingest(run: str, wait: bool = False) -> int:
+    """
+    Reads the output of the run's jobs and writes the results to the assets.
+
+    Returns:
+        int: The number of asset updates committed.
+    """
+    manifest = load_manifest(run)
+    runner = LocalBatchRunner(project_id) if manifest.get("local") else VertexBatchRunner(project_id, location)
+
+    task_results = defaultdict(dict)
+    for model, job in manifest["jobs"].items():
+        state = runner.wait(job["name"]) if wait else runner.get_state(job["name"])
+        if state not in SUCCEEDED_JOB_STATES:
+            logger.error("Batch job %s for %s ended in state %s", job["name"], model, state)
+            continue
+        for output_uri in list_jsonl(job["output_prefix"]):
+            for line in read_jsonl(output_uri):
+                key, text, error = parse_output_line(line)
+                entry = manifest["entries"].get(key)
+                if not entry:
+                    logger.warning("Ignoring batch output with unknown key %s", key)
+                    continue
+                result = parse_task_result(text) if text is not None else {"error": error}
+                task_results[entry["asset_id"]][entry["task"]] = result
+
+    # Requests without an output line are reported as failed rather than left pending.
+    for entry in manifest["entries"].values():
+        task_results[entry["asset_id"]].setdefault(
+            entry["task"], {"error": "No batch prediction output for this request"}
+        )
+
+    asset_manager = MediaAssetManager(project_id=project_id)
+    # Runs of a subset of the subtasks are merged into the recorded subtask statuses
+    summary_asset_ids = [
+        asset_id
+        for asset_id, results in task_results.items()
+        if any(task in SUBTASK_ERROR_PREFIXES for task in results)
+    ]
+    recorded_assets = asset_manager.get_assets(
+        summary_asset_ids, ["summary.subtasks", "summary.status", "summary.error_message"]
+    )
+
+    updates = []
+    for asset_id, results in task_results.items():
+        summary_results = {
+            task: result for task, result in results.items() if task in SUBTASK_ERROR_PREFIXES
+        }
+        if summary_results:
+            previous_subtasks = get_previous_subtasks(
+                (recorded_assets.get(asset_id) or {}).get("summary"), list(summary_results)
+            )
+            updates.append(
+                (asset_id, "summary", build_summary_update(summary_results, previous_subtasks))
+            )
+        if "shorts" in results:
+            updates.append((asset_id, "previews", _previews_update(results["shorts"])))
+
+    committed = asset_manager.bulk_update_asset_metadata(updates)
+    logger.info("Ingested %d of %d asset updates from %s", committed, len(updates), run)
+    return committed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prepare_parser = subparsers.add_parser("prepare", help="Write the batch input files.")
+    prepare_parser.add_argument("run", help="GCS prefix or local directory of the run.")
+    prepare_group = prepare_parser.add_mutually_exclusive_group(required=True)
+    prepare_group.add_argument("--asset-ids", nargs="+", help="Assets to backfill.")
+    prepare_group.add_argument("--all", action="store_true", help="Backfill every video asset.")
+    prepare_parser.add_argument(
+        "--tasks",
+        nargs="+",
+        choices=list(BATCH_TASKS),
+        default=list(BATCH_TASKS),
+        help="Tasks to backfill.",
+    )
+
+    submit_parser = subparsers.add_parser("submit", help="Submit the batch jobs.")
+    submit_parser.add_argument("run", help="GCS prefix or local directory of the run.")
+    submit_parser.add_argument("--local", action="store_true", help="Run the requests locally.")
+    submit_parser.add_argument("--fixtures", help="JSON file of canned responses per task, with --local.")
+
+    ingest_parser = subparsers.add_parser("ingest", help="Write the batch output to the assets.")
+    ingest_parser.add_argument("run", help="GCS prefix or local directory of the run.")
+    ingest_parser.add_argument("--wait", action="store_true", help="Wait for the jobs to finish.")
+
+    args = parser.parse_args()
+    if args.command == "prepare":
+        prepare(args.run, None if args.all else args.asset_ids, args.tasks)
+    elif args.command == "submit":
+        submit(args.run, args.local, args.fixtures)
+    elif args.command == "ingest":
+        ingest(args.run, args.wait)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+""" Batch runners: Vertex AI batch prediction and a local stand-in
+
+Both runners read the same JSONL input files and produce output files in
+the batch prediction format, so ingestion does not depend on which one ran.
+Paths can be GCS URIs ("gs://bucket/prefix") or local paths.
+"""
+import os
+import json
+import time
+import logging
+from typing import Callable, List, Optional
+
+from google import genai
+from google.genai import types
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+# Batch job states after which the job will not make progress anymore.
+FINISHED_JOB_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_PARTIALLY_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+SUCCEEDED_JOB_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+
+def _split_gcs_uri(uri: str):
+    """Splits gs://bucket/path into (bucket, path)."""
+    bucket_name, _, path = uri[len("gs://"):].partition("/")
+    return bucket_name, path
+
+
+def write_text(uri: str, text: str):
+    """Writes a text file to GCS or to the local filesystem."""
+    if uri.startswith("gs://"):
+        bucket_name, path = _split_gcs_uri(uri)
+        storage.Client().bucket(bucket_name).blob(path).upload_from_string(text)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+    with open(uri, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def read_text(uri: str) -> str:
+    """Reads a text file from GCS or from the local filesystem."""
+    if uri.startswith("gs://"):
+        bucket_name, path = _split_gcs_uri(uri)
+        return storage.Client().bucket(bucket_name).blob(path).download_as_text()
+    with open(uri, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def list_jsonl(prefix: str) -> List[str]:
+    """Lists the .jsonl files below a GCS prefix or a local directory."""
+    if prefix.startswith("gs://"):
+        bucket_name, path = _split_gcs_uri(prefix)
+        return [
+            f"gs://{bucket_name}/{blob.name}"
+            for blob in storage.Client().list_blobs(bucket_name, prefix=path)
+            if blob.name.endswith(".jsonl")
+        ]
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(prefix)
+        for name in names
+        if name.endswith(".jsonl")
+    )
+
+
+def read_jsonl(uri: str) -> List[dict]:
+    """Reads the JSON objects of a JSONL file."""
+    return [json.loads(line) for line in read_text(uri).splitlines() if line.strip()]
+
+
+class VertexBatchRunner:
+    """Submits input files as Vertex AI batch prediction jobs."""
+
+    def __init__(self, project_id: str, location: str):
+        self.client = genai.Client(vertexai=True, project=project_id, location=location)
+
+    def submit(self, model: str, input_uri: str, output_prefix: str, display_name: str) -> str:
+        """
+        Creates a batch prediction job.
+
+        Returns:
+            str: The job name, used to follow it up.
+        """
+        job = self.client.batches.create(
+            model=model,
+            src=input_uri,
+            config=types.CreateBatchJobConfig(dest=output_prefix, display_name=display_name),
+        )
+        logger.info("Submitted batch job %s for %s", job.name, input_uri)
+        return job.name
+
+    def get_state(self, job_name: str) -> str:
+        """Returns the job state name (e.g. "JOB_STATE_RUNNING")."""
+        job = self.client.batches.get(name=job_name)
+        return job.state.name if hasattr(job.state, "name") else str(job.state)
+
+    def wait(self, job_name: str, poll_seconds: float = 60) -> str:
+        """Blocks until the job is finished and returns its final state."""
+        while True:
+            state = self.get_state(job_name)
+            if state in FINISHED_JOB_STATES:
+                return state
+            logger.info("Batch job %s is %s, waiting...", job_name, state)
+            time.sleep(poll_seconds)
+
+
+class LocalBatchRunner:
+    """
+    Runs batch input files locally, one request at a time, and writes the
+    output in the batch prediction format. Used to test backfills end to end
+    on a handful of assets without creating batch jobs.
+
+    Args:
+        project_id: Project used by the default responder.
+        responder: Callable turning a model name and a request line's "request"
+            object into the "response" object. Defaults to calling the online API.
+    """
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        responder: Optional[Callable[[str, dict], dict]] = None,
+    ):
+        self.project_id = project_id
+        self.responder = responder or self._generate_online
+
+    def _generate_online(self, model: str, request: dict) -> dict:
+        """Sends a batch request through the online generate_content API."""
+        client = genai.Client(vertexai=True, project=self.project_id, location="global")
+        config = types.GenerateContentConfig.model_validate(
+            {
+                **request.get("generationConfig", {}),
+                "systemInstruction": request.get("systemInstruction"),
+                "safetySettings": request.get("safetySettings"),
+                "labels": request.get("labels"),
+            }
+        )
+        response = client.models.generate_content(
+            model=model, contents=request["contents"], config=config
+        )
+        return response.model_dump(mode="json", by_alias=True, exclude_none=True)
+
+    def submit(self, model: str, input_uri: str, output_prefix: str, display_name: str) -> str:
+        """Runs every request of the input file and writes predictions.jsonl under output_prefix."""
+        output_lines = []
+        for line in read_jsonl(input_uri):
+            output_line = {"request": line["request"], "status": ""}
+            try:
+                output_line["response"] = self.responder(model, line["request"])
+            except Exception as e:
+                logger.error("Local batch request failed", exc_info=True)
+                output_line["status"] = str(e)
+            output_lines.append(json.dumps(output_line))
+        write_text(
+            f"{output_prefix.rstrip('/')}/predictions.jsonl",
+            "\n".join(output_lines) + "\n",
+        )
+        logger.info("Ran %d requests locally for %s", len(output_lines), display_name)
+        return f"local/{display_name}"
+
+    def get_state(self, job_name: str) -> str:
+        """Local jobs complete within submit."""
+        return "JOB_STATE_SUCCEEDED"
+
+    def wait(self, job_name: str, poll_seconds: float = 60) -> str:
+        """Local jobs complete within submit."""
+        return "JOB_STATE_SUCCEEDED"
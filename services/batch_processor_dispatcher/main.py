@@ -15,9 +15,11 @@ import logging
 
 from common.logging_config import configure_logger
 from common.media_asset_manager import MediaAssetManager
+from common.media_probe import probe_media
 
 from flask import Flask, request
 from google.cloud import pubsub_v1
+from google.cloud import storage
 
 
 # Logging setup
@@ -32,6 +34,8 @@ project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
 SUMMARIES_TOPIC = os.environ.get("PUBSUB_TOPIC_SUMMARIES")
 TRANSCRIPTION_TOPIC = os.environ.get("PUBSUB_TOPIC_TRANSCRIPTION")
 PREVIEWS_TOPIC = os.environ.get("PUBSUB_TOPIC_PREVIEWS")
+# Probe videos once at ingest so that workers get video_details with their task.
+PROBE_AT_INGEST = os.environ.get("PROBE_AT_INGEST", "true").lower() == "true"
 
 # --- Configuration Validation ---
 # Ensure all required environment variables are set. This prevents the service
@@ -63,6 +67,7 @@ logger.info(
 )
 
 publisher = pubsub_v1.PublisherClient()
+storage_client = storage.Client()
 # MediaAssetManager setup
 asset_manager = MediaAssetManager(project_id=project_id)
 # Pre-format the full topic paths for efficiency
@@ -98,11 +103,12 @@ def process_file_event(event_data):
     This is the core logic of the dispatcher. It performs the following steps:
     1. Validates the incoming message data.
     2. Creates a new asset document in Firestore with initial 'pending' statuses.
-    3. Determines which processing tasks (summary, transcription, etc.) are
+    3. Probes videos stored in GCS and fills in their 'video_details'.
+    4. Determines which processing tasks (summary, transcription, etc.) are
        applicable based on the file's category (e.g., video, audio).
-    4. Publishes messages to the appropriate Pub/Sub topics for each task.
-    5. Updates the asset's status in Firestore to 'dispatched' for each task.
-    6. Marks non-applicable tasks as 'not_applicable' in Firestore.
+    5. Publishes messages to the appropriate Pub/Sub topics for each task.
+    6. Updates the asset's status in Firestore to 'dispatched' for each task.
+    7. Marks non-applicable tasks as 'not_applicable' in Firestore.
 
     Args:
         event_data (dict): The parsed data from the Pub/Sub message.
@@ -154,10 +160,29 @@ def process_file_event(event_data):
         )
         return
 
-    # 2. Determine which tasks to dispatch based on file category.
+    # 2. Probe the video once, so that no worker has to download it or look
+    # up its metadata just to learn its duration, format or checksum.
+    video_details = None
+    if PROBE_AT_INGEST and file_category == "video" and source != "youtube":
+        video_details = probe_media(file_location, storage_client)
+        if video_details:
+            asset_manager.update_asset_metadata(asset_id, "video_details", video_details)
+            logger.info(
+                "Probed video details for %s.",
+                asset_id,
+                extra={"extra_fields": {"asset_id": asset_id, "video_details": video_details}},
+            )
+        else:
+            logger.warning(
+                "Could not probe video details for %s, dispatching without them.",
+                asset_id,
+                extra=log_extra,
+            )
+
+    # 3. Determine which tasks to dispatch based on file category.
     tasks_to_dispatch = CATEGORY_TASK_MAP.get(file_category, [])
 
-    # 3. Dispatch messages for applicable tasks.
+    # 4. Dispatch messages for applicable tasks.
     # The message payload is now simpler and the same for all tasks.
     message_data = {
         "asset_id": asset_id,
@@ -165,6 +190,8 @@ def process_file_event(event_data):
         "file_name": file_name,
         "source": source,
     }
+    if video_details:
+        message_data["video_details"] = video_details
     encoded_message = json.dumps(message_data).encode("utf-8")
 
     for task_name in tasks_to_dispatch:
@@ -217,7 +244,7 @@ def process_file_event(event_data):
                 },
             )
 
-    # 4. Mark non-dispatched tasks as 'not_applicable'.
+    # 5. Mark non-dispatched tasks as 'not_applicable'.
     # This corrects the initial 'pending' status set by insert_asset for tasks
     # that don't apply to this file type (e.g., previews for audio).
     all_possible_tasks = set(TOPIC_PATHS.keys())
@@ -0,0 +1,201 @@
+""" Audio energy envelope and silence index
+
+Picking clip end points that do not truncate dialogue, choosing chunk
+boundaries and trimming highlight edges all need to know where the audio of
+an asset is quiet. `build_silence_index` answers it once per asset:
+    - ffmpeg decodes the audio to mono 16-bit PCM at a low sample rate, streamed
+      through a pipe in chunks,
+    - NumPy computes the RMS energy of every short window of samples,
+    - windows more than SILENCE_THRESHOLD_DB below the loudness of the asset
+      (95th percentile of the envelope), lasting at least SILENCE_MIN_SECONDS,
+      form the silence intervals.
+
+The compact index (interval starts and ends, in seconds) is stored with the
+asset under `transcription.silence_index`, and queried with `SilenceIndex`.
+
+Configuration (environment variables):
+    SILENCE_ANALYSIS_ENABLED: "true" (default) or "false".
+    SILENCE_SAMPLE_RATE: Sample rate the audio is decoded at, in Hz.
+    SILENCE_WINDOW_SECONDS: Length of the envelope windows.
+    SILENCE_THRESHOLD_DB: Decibels below the asset loudness under which audio is silent.
+    SILENCE_MIN_SECONDS: Minimum length of a silence.
+    FFMPEG_BINARY: The ffmpeg executable.
+"""
+import os
+import bisect
+import subprocess
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+silence_analysis_enabled = os.environ.get("SILENCE_ANALYSIS_ENABLED", "true").lower() == "true"
+silence_sample_rate = int(os.environ.get("SILENCE_SAMPLE_RATE", "8000"))
+silence_window_seconds = float(os.environ.get("SILENCE_WINDOW_SECONDS", "0.05"))
+silence_threshold_db = float(os.environ.get("SILENCE_THRESHOLD_DB", "30"))
+silence_min_seconds = float(os.environ.get("SILENCE_MIN_SECONDS", "0.3"))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+SILENCE_INDEX_VERSION = 1
+# Windows decoded per read of the ffmpeg pipe.
+CHUNK_WINDOWS = 4096
+# Level of digital silence, keeping the logarithm finite.
+FLOOR_DB = -100.0
+
+
+def _decode_windows(source: str, sample_rate: int, window_samples: int) -> Iterator[np.ndarray]:
+    """
+    Decodes the audio of source to mono 16-bit PCM with ffmpeg.
+
+    Yields:
+        np.ndarray: Chunks of samples shaped (windows, window_samples), as floats in [-1, 1].
+        The last partial window is dropped.
+    """
+    command = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        "-i", source,
+        "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "pipe:1",
+    ]
+    window_bytes = window_samples * 2
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(window_bytes * CHUNK_WINDOWS)
+            count = len(data) // window_bytes
+            if not count:
+                break
+            samples = np.frombuffer(data[: count * window_bytes], dtype="<i2")
+            yield samples.reshape(count, window_samples) / 32768.0
+    finally:
+        process.stdout.close()
+        errors = process.stderr.read().decode("utf-8", "replace")
+        return_code = process.wait()
+    if return_code != 0:
+        raise RuntimeError(f"ffmpeg failed: {errors.strip()[-2000:]}")
+
+
+def compute_envelope(source: str, sample_rate: Optional[int] = None,
+                     window_seconds: Optional[float] = None) -> np.ndarray:
+    """
+    Computes the RMS energy envelope of the audio of a file.
+
+    Args:
+        source (str): Local path or URL of an audio or video file.
+        sample_rate (Optional[int]): Decoding sample rate, SILENCE_SAMPLE_RATE by default.
+        window_seconds (Optional[float]): Window length, SILENCE_WINDOW_SECONDS by default.
+
+    Returns:
+        np.ndarray: The level of every window, in dBFS.
+    """
+    sample_rate = sample_rate or silence_sample_rate
+    window_samples = max(1, int(round((window_seconds or silence_window_seconds) * sample_rate)))
+    chunks = [
+        np.sqrt(np.mean(np.square(windows), axis=1))
+        for windows in _decode_windows(source, sample_rate, window_samples)
+    ]
+    rms = np.concatenate(chunks) if chunks else np.zeros(0)
+    with np.errstate(divide="ignore"):
+        return np.maximum(20 * np.log10(rms), FLOOR_DB)
+
+
+def find_silences(levels: np.ndarray, window_seconds: float, threshold_db: Optional[float] = None,
+                  min_seconds: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Finds the silences of an envelope.
+
+    Args:
+        levels: Window levels in dBFS, from compute_envelope.
+        window_seconds: Length of the windows.
+        threshold_db: Decibels below the loudness under which audio is silent.
+        min_seconds: Minimum length of a silence.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, float]: The start and end times of the
+        silences in seconds, and the absolute threshold used, in dBFS.
+    """
+    threshold_db = silence_threshold_db if threshold_db is None else threshold_db
+    min_seconds = silence_min_seconds if min_seconds is None else min_seconds
+    if not len(levels):
+        return np.zeros(0), np.zeros(0), FLOOR_DB
+
+    threshold = max(float(np.percentile(levels, 95)) - threshold_db, FLOOR_DB + 1)
+    silent = np.concatenate([[False], levels < threshold, [False]])
+    # Rising and falling edges of the silent mask delimit the silences
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    first_windows, end_windows = edges[0::2], edges[1::2]
+    long_enough = (end_windows - first_windows) * window_seconds >= min_seconds
+    return (
+        first_windows[long_enough] * window_seconds,
+        end_windows[long_enough] * window_seconds,
+        threshold,
+    )
+
+
+def build_silence_index(source: str) -> Dict[str, Any]:
+    """
+    Builds the silence index of the audio of a file.
+
+    Args:
+        source (str): Local path or URL of an audio or video file.
+
+    Returns:
+        dict: starts and ends (seconds) of the silences, threshold_db (dBFS),
+        duration (seconds), window_seconds and version.
+    """
+    levels = compute_envelope(source)
+    starts, ends, threshold = find_silences(levels, silence_window_seconds)
+    return {
+        # Firestore does not store nested arrays, the intervals are kept as two lists
+        "starts": [round(start, 2) for start in starts.tolist()],
+        "ends": [round(end, 2) for end in ends.tolist()],
+        "threshold_db": round(threshold, 1),
+        "duration": round(len(levels) * silence_window_seconds, 2),
+        "window_seconds": silence_window_seconds,
+        "version": SILENCE_INDEX_VERSION,
+    }
+
+
+class SilenceIndex:
+    """Queries the silence intervals of an asset."""
+
+    def __init__(self, starts: List[float], ends: List[float]):
+        self.starts = list(starts)
+        self.ends = list(ends)
+
+    @classmethod
+    def from_asset(cls, asset_data: Optional[dict]) -> "SilenceIndex":
+        """Loads the index stored under transcription.silence_index, empty when there is none."""
+        silence_index = ((asset_data or {}).get("transcription") or {}).get("silence_index") or {}
+        return cls(silence_index.get("starts") or [], silence_index.get("ends") or [])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def nearest_silence(self, seconds: float, max_distance: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """
+        Returns the silence nearest to a time.
+
+        Args:
+            seconds: The time in seconds.
+            max_distance: Ignore silences further than this many seconds.
+
+        Returns:
+            Optional[Tuple[float, float]]: The (start, end) of the silence containing
+            or nearest to the time, or None when there is none within max_distance.
+        """
+        if not self.starts:
+            return None
+        # Silences are sorted and disjoint: only the ones around the time can be nearest
+        position = bisect.bisect_right(self.starts, seconds)
+        best = None
+        best_distance = None
+        for index in (position - 1, position):
+            if 0 <= index < len(self.starts):
+                start, end = self.starts[index], self.ends[index]
+                distance = max(start - seconds, seconds - end, 0.0)
+                if best_distance is None or distance < best_distance:
+                    best, best_distance = (start, end), distance
+        if max_distance is not None and best_distance > max_distance:
+            return None
+        return best
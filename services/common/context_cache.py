@@ -0,0 +1,170 @@
+""" Shared Gemini context caching for media assets """
+import os
+import re
+import datetime
+import logging
+from typing import Optional
+
+from google.genai import types
+
+from common.video_input import build_video_part
+
+logger = logging.getLogger(__name__)
+
+# Asset document field holding one cache record per model and frame rate.
+CONTEXT_CACHE_FIELD = "context_cache"
+context_cache_enabled = os.environ.get("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+context_cache_ttl_seconds = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+# Caches this close to expiring are recreated instead of reused so that a
+# request never references a cache that disappears while it is in flight.
+EXPIRY_MARGIN_SECONDS = 120
+
+
+def _model_key(model_name: str) -> str:
+    """Turns a model name into a key usable in a Firestore field path."""
+    return re.sub(r"[^a-zA-Z0-9_]", "_", model_name)
+
+
+def _get_record(asset_data: Optional[dict], model_key: str) -> dict:
+    """Returns the asset's cache record for the model key, empty when there is none."""
+    return ((asset_data or {}).get(CONTEXT_CACHE_FIELD) or {}).get(model_key) or {}
+
+
+def _is_usable(record: dict, video_uri: str, now: datetime.datetime) -> bool:
+    """Whether a recorded cache holds the video and outlives the expiry margin."""
+    expire_time = record.get("expire_time")
+    return bool(
+        record.get("name")
+        and record.get("video_uri") == video_uri
+        and expire_time
+        and expire_time > now + datetime.timedelta(seconds=EXPIRY_MARGIN_SECONDS)
+    )
+
+
+def get_or_create_video_cache(
+    client,
+    asset_manager,
+    asset_id: str,
+    video_uri: str,
+    model_name: str,
+    mime_type: str = "video/*",
+    fps: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Returns the name of a cached-content entry holding the asset's video,
+    creating one when there is no usable entry for the model yet.
+
+    The cache name and its expiry are recorded on the asset document under
+    `context_cache.<model>_<fps>` so that every service processing the asset
+    can reference the same entry. Expired entries are recreated on demand.
+    Replaced entries are never deleted, as requests that read the record
+    earlier may still reference them; the service-side TTL removes them.
+
+    The record is written in a transaction, only while no usable entry is
+    recorded. When two workers create an entry at the same time, the one that
+    loses deletes its own entry, which no one else references, and uses the
+    recorded one.
+
+    Args:
+        client (genai.Client): The client used for the generation requests.
+        asset_manager (MediaAssetManager): Manager used to read and record the cache entry.
+        asset_id (str): The ID of the asset.
+        video_uri (str): The GCS URI of the video file.
+        model_name (str): The model the cache is created for. Caches are model specific.
+        mime_type (str): The MIME type of the video part.
+        fps (Optional[float]): Frame sampling rate the video is tokenized with.
+            Requests with different sampling rates use different entries.
+
+    Returns:
+        Optional[str]: The cached content name, or None when caching is disabled
+        or the cache could not be created. Callers should then send the video inline.
+    """
+    if not context_cache_enabled:
+        return None
+
+    log_extra = {"extra_fields": {"asset_id": asset_id, "model": model_name}}
+    model_key = _model_key(f"{model_name}_{fps or 'default'}")
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    record = _get_record(asset_manager.get_asset(asset_id), model_key)
+    if _is_usable(record, video_uri, now):
+        logger.info("Reusing context cache %s", record["name"], extra=log_extra)
+        return record["name"]
+
+    try:
+        cached_content = client.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                contents=[
+                    types.Content(
+                        role="user",
+                        parts=[build_video_part(video_uri, mime_type, {"fps": fps})],
+                    )
+                ],
+                display_name=f"asset-{asset_id}"[:128],
+                ttl=f"{context_cache_ttl_seconds}s",
+            ),
+        )
+    except Exception:
+        logger.warning(
+            "Could not create context cache for asset %s, sending video inline.",
+            asset_id,
+            exc_info=True,
+            extra=log_extra,
+        )
+        return None
+
+    expire_time = cached_content.expire_time or (
+        now + datetime.timedelta(seconds=context_cache_ttl_seconds)
+    )
+    recorded = asset_manager.update_asset_metadata_if(
+        asset_id,
+        CONTEXT_CACHE_FIELD,
+        {
+            model_key: {
+                "name": cached_content.name,
+                "model": model_name,
+                "fps": fps,
+                "video_uri": video_uri,
+                "expire_time": expire_time,
+            }
+        },
+        lambda asset_data: not _is_usable(
+            _get_record(asset_data, model_key), video_uri, now
+        ),
+    )
+    if not recorded:
+        record = _get_record(asset_manager.get_asset(asset_id), model_key)
+        if _is_usable(record, video_uri, now):
+            # Another request recorded its entry first, ours was never shared
+            logger.info(
+                "Context cache %s was created concurrently, using it instead of %s",
+                record["name"],
+                cached_content.name,
+                extra=log_extra,
+            )
+            try:
+                client.caches.delete(name=cached_content.name)
+            except Exception:
+                logger.debug(
+                    "Could not delete context cache %s",
+                    cached_content.name,
+                    extra=log_extra,
+                )
+            return record["name"]
+        # The record could not be written, the entry still serves this request
+        logger.warning(
+            "Could not record context cache %s for asset %s",
+            cached_content.name,
+            asset_id,
+            extra=log_extra,
+        )
+        return cached_content.name
+
+    logger.info(
+        "Created context cache %s expiring at %s",
+        cached_content.name,
+        expire_time,
+        extra=log_extra,
+    )
+    return cached_content.name
@@ -0,0 +1,139 @@
+""" Batch frame grabbing for section and clip thumbnails
+
+`grab_frames` extracts the frames at many timestamps of one video with a
+single ffmpeg invocation: every timestamp is an input seeked with `-ss`
+(only the GOP leading to the timestamp is decoded) mapped to its own output
+image, so the source is opened and probed once for the whole batch instead
+of once per thumbnail.
+
+`attach_thumbnails` grabs a frame shortly after the start of every clip or
+section, uploads them and records their URLs under `thumbnail_url`.
+
+Configuration (environment variables):
+    THUMBNAILS_ENABLED: "true" (default) or "false".
+    THUMBNAIL_WIDTH: Width of the thumbnails.
+    THUMBNAIL_FORMAT: "jpg" (default) or "webp".
+    THUMBNAIL_BUCKET: Bucket of the thumbnails, the bucket of the video when unset.
+    FFMPEG_BINARY: The ffmpeg executable.
+"""
+import os
+import logging
+import tempfile
+import subprocess
+from typing import List, Optional, Sequence
+
+from common.timecodes import timecode_to_seconds
+
+logger = logging.getLogger(__name__)
+
+thumbnails_enabled = os.environ.get("THUMBNAILS_ENABLED", "true").lower() == "true"
+thumbnail_width = int(os.environ.get("THUMBNAIL_WIDTH", "480"))
+thumbnail_format = os.environ.get("THUMBNAIL_FORMAT", "jpg").lower()
+thumbnail_bucket = os.environ.get("THUMBNAIL_BUCKET", "")
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+# Inputs opened by a single ffmpeg invocation; larger batches are split.
+MAX_FRAMES_PER_CALL = 32
+GRAB_TIMEOUT_SECONDS = 120
+# The thumbnail of a clip is taken this far into it, past the cut.
+THUMBNAIL_OFFSET_SECONDS = 1.0
+CONTENT_TYPES = {"jpg": "image/jpeg", "webp": "image/webp"}
+# Encoder options of each format.
+FORMAT_OPTIONS = {"jpg": ["-q:v", "3"], "webp": ["-c:v", "libwebp", "-quality", "80"]}
+
+
+def _grab_batch(source: str, timestamps: Sequence[float], output_paths: Sequence[str], width: int,
+                image_format: str) -> None:
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y"]
+    for seconds in timestamps:
+        command += ["-ss", f"{seconds:.3f}", "-i", source]
+    for index, output_path in enumerate(output_paths):
+        command += [
+            "-map", f"{index}:v:0", "-frames:v", "1",
+            "-vf", f"scale={width}:-2",
+        ] + FORMAT_OPTIONS[image_format] + [output_path]
+    result = subprocess.run(command, capture_output=True, timeout=GRAB_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()[-2000:]}")
+
+
+def grab_frames(source: str, timestamps: Sequence[float], output_dir: str, width: Optional[int] = None,
+                image_format: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Extracts the frames at many timestamps of a video.
+
+    Args:
+        source (str): Local path or (signed) URL of the video.
+        timestamps (Sequence[float]): Timestamps in seconds, in any order.
+        output_dir (str): Directory receiving the images.
+        width (Optional[int]): Width of the images, THUMBNAIL_WIDTH by default.
+        image_format (Optional[str]): "jpg" or "webp", THUMBNAIL_FORMAT by default.
+
+    Returns:
+        List[Optional[str]]: The image path of every timestamp, None for the
+        frames that could not be extracted (e.g. past the end of the video).
+    """
+    width = width or thumbnail_width
+    image_format = image_format or thumbnail_format
+    # Identical timestamps share a frame, and inputs are opened in seek order
+    distinct = sorted({round(seconds, 2) for seconds in timestamps})
+    paths = {seconds: os.path.join(output_dir, f"frame_{index:04d}.{image_format}") for index, seconds in enumerate(distinct)}
+    for first in range(0, len(distinct), MAX_FRAMES_PER_CALL):
+        batch = distinct[first:first + MAX_FRAMES_PER_CALL]
+        try:
+            _grab_batch(source, batch, [paths[seconds] for seconds in batch], width, image_format)
+        except (RuntimeError, subprocess.TimeoutExpired):
+            logger.warning("Could not grab %d frames", len(batch), exc_info=True)
+    return [
+        paths[seconds] if os.path.exists(paths[seconds]) and os.path.getsize(paths[seconds]) else None
+        for seconds in (round(seconds, 2) for seconds in timestamps)
+    ]
+
+
+def attach_thumbnails(items: List[dict], start_key: str, end_key: str, asset_id: str, kind: str,
+                      gcs_uri: str, source_url: str, storage_client) -> List[dict]:
+    """
+    Grabs, uploads and attaches a thumbnail to every clip or section.
+
+    The frame is taken THUMBNAIL_OFFSET_SECONDS after the start (at most in
+    the middle of the item), from start_seconds/end_seconds when present or
+    the timecodes otherwise. Its URL is recorded under thumbnail_url.
+
+    Args:
+        items: Dicts holding their timecodes under start_key and end_key (modified in place).
+        start_key: Key of the start timecode.
+        end_key: Key of the end timecode.
+        asset_id (str): The ID of the asset.
+        kind (str): Name of the items in the thumbnail paths (e.g. "sections", "clips").
+        gcs_uri (str): The gs:// URI of the video, whose bucket receives the
+            thumbnails unless THUMBNAIL_BUCKET is set.
+        source_url (str): Local path or signed URL ffmpeg reads the video from.
+        storage_client (storage.Client): Client uploading the thumbnails.
+
+    Returns:
+        List[dict]: The items.
+    """
+    targets = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        start = timecode_to_seconds(item.get("start_seconds", item.get(start_key)))
+        end = timecode_to_seconds(item.get("end_seconds", item.get(end_key)))
+        if start is None:
+            continue
+        offset = THUMBNAIL_OFFSET_SECONDS if end is None else min(THUMBNAIL_OFFSET_SECONDS, max(end - start, 0) / 2)
+        targets.append((item, start + offset))
+    if not targets:
+        return items
+
+    bucket_name = thumbnail_bucket or gcs_uri.replace("gs://", "", 1).split("/", 1)[0]
+    bucket = storage_client.bucket(bucket_name)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = grab_frames(source_url, [seconds for _, seconds in targets], temp_dir)
+        for index, ((item, _), path) in enumerate(zip(targets, paths)):
+            if not path:
+                continue
+            blob_name = f"{asset_id}/thumbnails/{kind}_{index:03d}.{thumbnail_format}"
+            bucket.blob(blob_name).upload_from_filename(path, content_type=CONTENT_TYPES.get(thumbnail_format))
+            item["thumbnail_url"] = f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
+    return items
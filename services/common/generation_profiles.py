@@ -0,0 +1,122 @@
+""" Named generation profiles per LLM task and per-call usage recording
+
+Each task (e.g. "summary", "sections", "shorts") resolves to a profile with:
+    model: Model name. None falls back to the service's LLM_MODEL.
+    thinking_budget: Thinking token budget, -1 for dynamic thinking, 0 to disable it.
+    max_output_tokens: Output token cap.
+    media_resolution: Gemini media resolution (e.g. "MEDIA_RESOLUTION_LOW"), None for the model default.
+    temperature: Sampling temperature.
+
+The built-in defaults can be overridden per task, field by field, with a JSON
+file referenced by GENERATION_PROFILES_FILE and/or inline JSON in
+GENERATION_PROFILES, e.g. '{"categorization": {"thinking_budget": 0}}'.
+"""
+import os
+import json
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = {
+    "model": None,
+    "thinking_budget": -1,
+    "max_output_tokens": 65535,
+    "media_resolution": None,
+    "temperature": 1,
+}
+
+# Small structured outputs get a bounded thinking budget and output cap; tasks
+# that depend on precise timestamps keep dynamic thinking.
+DEFAULT_PROFILES = {
+    "summary": {"thinking_budget": 2048, "max_output_tokens": 8192},
+    "sections": {"thinking_budget": -1, "max_output_tokens": 32768},
+    "categorization": {"thinking_budget": 1024, "max_output_tokens": 4096},
+    "combined_summary": {"thinking_budget": -1, "max_output_tokens": 65535},
+    "shorts": {"thinking_budget": -1, "max_output_tokens": 16384},
+}
+
+
+def _load_profile_overrides() -> dict:
+    """Reads the profile overrides from GENERATION_PROFILES_FILE and GENERATION_PROFILES."""
+    overrides = {}
+    profiles_file = os.environ.get("GENERATION_PROFILES_FILE")
+    sources = []
+    try:
+        if profiles_file:
+            with open(profiles_file, "r", encoding="utf-8") as f:
+                sources.append(json.load(f))
+        if os.environ.get("GENERATION_PROFILES"):
+            sources.append(json.loads(os.environ["GENERATION_PROFILES"]))
+    except (OSError, ValueError):
+        logger.error("Could not load generation profile overrides, using defaults.", exc_info=True)
+        return {}
+
+    for source in sources:
+        for task, profile in source.items():
+            overrides.setdefault(task, {}).update(profile)
+    return overrides
+
+
+_profile_overrides = _load_profile_overrides()
+
+
+def get_generation_profile(task: str, default_model: Optional[str] = None) -> dict:
+    """
+    Resolves the generation profile for a task.
+
+    Args:
+        task (str): The task name. Unknown tasks get the default profile.
+        default_model (Optional[str]): Model used when the profile does not name one.
+
+    Returns:
+        dict: The complete profile, with "model" always set when default_model is given.
+    """
+    profile = {
+        **DEFAULT_PROFILE,
+        **DEFAULT_PROFILES.get(task, {}),
+        **_profile_overrides.get(task, {}),
+    }
+    if not profile["model"]:
+        profile["model"] = default_model
+    return profile
+
+
+def record_generation_metrics(
+    task: str, profile: dict, started_at: float, response=None, asset_id: Optional[str] = None
+):
+    """
+    Logs the latency and token usage of a single model call as a structured
+    entry, so profiles can be tuned from the logs.
+
+    Args:
+        task (str): The task name.
+        profile (dict): The profile the call was made with.
+        started_at (float): time.monotonic() value taken right before the call.
+        response: The GenerateContentResponse, if the call succeeded.
+        asset_id (Optional[str]): The ID of the asset, if any.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    metrics = {
+        "task": task,
+        "asset_id": asset_id,
+        "model": profile.get("model"),
+        "thinking_budget": profile.get("thinking_budget"),
+        "max_output_tokens": profile.get("max_output_tokens"),
+        "media_resolution": profile.get("media_resolution"),
+        "latency_ms": round((time.monotonic() - started_at) * 1000),
+        "succeeded": response is not None,
+        "prompt_token_count": getattr(usage, "prompt_token_count", None),
+        "cached_content_token_count": getattr(usage, "cached_content_token_count", None),
+        "candidates_token_count": getattr(usage, "candidates_token_count", None),
+        "thoughts_token_count": getattr(usage, "thoughts_token_count", None),
+        "total_token_count": getattr(usage, "total_token_count", None),
+    }
+    logger.info(
+        "LLM call for task '%s' took %sms (%s total tokens)",
+        task,
+        metrics["latency_ms"],
+        metrics["total_token_count"],
+        extra={"extra_fields": {"llm_call_metrics": metrics}},
+    )
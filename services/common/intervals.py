@@ -0,0 +1,133 @@
+""" Vectorized interval operations on segment timelines
+
+Segments, clips and sections are handled as two NumPy arrays of start and end
+times (seconds), so that sorting, merging, overlap detection, clamping and gap
+snapping run over every interval at once instead of pairwise in Python. This
+keeps the validation of the thousands of segments produced by windowed
+analysis on a single code path.
+
+Every function takes the start and end arrays and returns new arrays (or a
+named tuple of arrays); the inputs are never modified.
+"""
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Overlaps(NamedTuple):
+    """Overlapping pairs of consecutive intervals: interval index[k] overlaps index[k] + 1."""
+    index: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    duration: np.ndarray
+
+
+class Clamped(NamedTuple):
+    """Clamped intervals, with the mask of the intervals shortened to max_length."""
+    starts: np.ndarray
+    ends: np.ndarray
+    capped: np.ndarray
+
+
+class Snapped(NamedTuple):
+    """Intervals with their small gaps closed: the gap after interval index[k] was snapped."""
+    starts: np.ndarray
+    ends: np.ndarray
+    index: np.ndarray
+
+
+def interval_arrays(items: Sequence[Dict[str, Any]], start_key: str = "start_timestamp",
+                    end_key: str = "end_timestamp") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the start and end arrays of a list of items.
+
+    Args:
+        items: Dicts holding their start and end times in seconds.
+        start_key: Key of the start time.
+        end_key: Key of the end time.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The float start and end times, in item order.
+    """
+    starts = np.fromiter((item[start_key] for item in items), dtype=float, count=len(items))
+    ends = np.fromiter((item[end_key] for item in items), dtype=float, count=len(items))
+    return starts, ends
+
+
+def sort_intervals(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Returns the indices ordering the intervals by start, then end time."""
+    return np.lexsort((ends, starts))
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray, max_gap: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges overlapping intervals, and intervals separated by at most max_gap seconds.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The sorted, disjoint merged intervals.
+    """
+    if not len(starts):
+        return np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+    order = sort_intervals(starts, ends)
+    starts = np.asarray(starts, dtype=float)[order]
+    ends = np.asarray(ends, dtype=float)[order]
+    # An interval starts a new group unless it begins before the furthest end seen so far
+    reach = np.maximum.accumulate(ends)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > reach[:-1] + max_gap
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:], len(starts)) - 1
+    return starts[group_starts], reach[group_ends]
+
+
+def adjacent_overlaps(starts: np.ndarray, ends: np.ndarray) -> Overlaps:
+    """
+    Detects the overlaps between each interval and the next one, in the given order.
+
+    Returns:
+        Overlaps: The index of the first interval of every overlapping pair, with
+        the start, end and duration of the overlap.
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    index = np.flatnonzero((starts[:-1] < ends[1:]) & (starts[1:] < ends[:-1]))
+    overlap_start = np.maximum(starts[index], starts[index + 1])
+    overlap_end = np.minimum(ends[index], ends[index + 1])
+    return Overlaps(index, overlap_start, overlap_end, overlap_end - overlap_start)
+
+
+def clamp_intervals(starts: np.ndarray, ends: np.ndarray, duration: Optional[float] = None,
+                    max_length: Optional[float] = None) -> Clamped:
+    """
+    Clamps the intervals to [0, duration] and shortens them to at most max_length seconds.
+
+    Intervals longer than max_length keep their start. An interval lying past
+    the duration is left empty (start == end) rather than dropped, so the
+    result stays aligned with the input.
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    capped = np.zeros(len(starts), dtype=bool)
+    if max_length is not None:
+        capped = ends - starts > max_length
+        ends = np.where(capped, starts + max_length, ends)
+    upper = np.inf if duration is None else duration
+    starts = np.clip(starts, 0, upper)
+    ends = np.clip(ends, starts, upper)
+    return Clamped(starts, ends, capped)
+
+
+def snap_gaps(starts: np.ndarray, ends: np.ndarray, max_gap: float) -> Snapped:
+    """
+    Closes the gaps of at most max_gap seconds between consecutive intervals,
+    moving both boundaries to the middle of the gap.
+    """
+    starts = np.array(starts, dtype=float)
+    ends = np.array(ends, dtype=float)
+    gaps = starts[1:] - ends[:-1]
+    index = np.flatnonzero((gaps > 0) & (gaps <= max_gap))
+    midpoints = ends[index] + gaps[index] / 2
+    ends[index] = midpoints
+    starts[index + 1] = midpoints
+    return Snapped(starts, ends, index)
@@ -0,0 +1,255 @@
+""" Incremental JSON assembly for streamed model responses
+
+Structured responses are streamed as JSON text split at arbitrary points.
+IncrementalJsonParser scans the text as it arrives and:
+    - yields every complete item of the top-level array, or of the arrays held
+      by the top-level object (e.g. "sections", "chapters"), as soon as its
+      closing bracket arrives, so it can be validated or persisted early,
+    - remembers the last point where the document can be cut and closed, so a
+      response truncated by the output token limit still yields its complete
+      items instead of being thrown away.
+
+A truncated response is never returned as if it were complete: callers get a
+TruncatedResponseError carrying the salvaged document when complete array
+items were received, and decide whether partial items are acceptable.
+
+Configuration (environment variables):
+    LLM_STREAMING_ENABLED: "true" (default) streams generation requests.
+    STREAM_PARTIAL_WRITES: "true" persists complete items while a response streams.
+"""
+import os
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, List, Optional, Tuple
+
+from common.llm_retry import AttemptCancelled, attempt_cancelled
+
+logger = logging.getLogger(__name__)
+
+streaming_enabled = os.environ.get("LLM_STREAMING_ENABLED", "true").lower() == "true"
+stream_partial_writes = os.environ.get("STREAM_PARTIAL_WRITES", "false").lower() == "true"
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+
+
+class TruncatedResponseError(ValueError):
+    """
+    Raised when a streamed response is not a complete JSON document.
+
+    Attributes:
+        partial: The salvaged document when complete items of its arrays were
+            received (see IncrementalJsonParser.salvage), otherwise None. Only
+            the array items of a salvaged document are known to be complete.
+    """
+
+    def __init__(self, task: str, partial: Optional[Any] = None):
+        super().__init__(f"Response for task '{task}' was truncated")
+        self.partial = partial
+
+
+class IncrementalJsonParser:
+    """
+    Streaming scanner for a single JSON document.
+
+    Attributes:
+        items (dict): Complete items seen so far per array key. The top-level
+            array, when the document is an array, is keyed by None.
+    """
+
+    def __init__(self):
+        self.items = defaultdict(list)
+        self._text = ""
+        self._pos = 0
+        # (opening character, key of the container in its parent object)
+        self._stack = []
+        self._in_string = False
+        self._in_scalar = False
+        self._escape = False
+        self._string_start = 0
+        self._reading_key = False
+        self._expect_key = False
+        self._last_key = None
+        self._item_start = None
+        self._item_cut = None
+        self._cut = None
+
+    @property
+    def text(self) -> str:
+        """The text received so far."""
+        return self._text
+
+    def _tracked_array_key(self) -> Tuple[bool, Optional[str]]:
+        """Whether the innermost container is an array whose items are reported, and its key."""
+        if not self._stack or self._stack[-1][0] != "[":
+            return False, None
+        if len(self._stack) == 1 or (len(self._stack) == 2 and self._stack[0][0] == "{"):
+            return True, self._stack[-1][1]
+        return False, None
+
+    def _mark_cut(self, pos: int):
+        """Records that the document can be cut at pos and closed."""
+        closers = "".join(_CLOSERS[opening] for opening, _ in reversed(self._stack))
+        self._cut = (pos, closers)
+
+    def _value_start(self, pos: int):
+        tracked, _ = self._tracked_array_key()
+        if tracked and self._item_start is None:
+            self._item_start = pos
+            # Truncation inside this item falls back to the cut before it.
+            self._item_cut = self._cut
+
+    def _item_end(self, end: int, new_items: list):
+        """Completes the current item of a tracked array, if any."""
+        tracked, key = self._tracked_array_key()
+        if not tracked or self._item_start is None:
+            return
+        raw_item = self._text[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            item = json.loads(raw_item)
+        except ValueError:
+            logger.debug("Skipping unparsable streamed item: %s", raw_item)
+            return
+        self.items[key].append(item)
+        new_items.append((key, item))
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], Any]]:
+        """
+        Adds a chunk of text.
+
+        Returns:
+            list: (array key, item) pairs for the items completed by this chunk.
+        """
+        self._text += chunk
+        text = self._text
+        new_items = []
+        for pos in range(self._pos, len(text)):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._reading_key:
+                        self._reading_key = False
+                        self._last_key = json.loads(text[self._string_start:pos + 1])
+                    else:
+                        self._item_end(pos + 1, new_items)
+                        self._mark_cut(pos + 1)
+                continue
+
+            if self._in_scalar and (ch in _WHITESPACE or ch in ",}]"):
+                self._in_scalar = False
+            if ch in _WHITESPACE or ch == ":":
+                continue
+            if ch == '"':
+                self._reading_key = bool(self._stack) and self._stack[-1][0] == "{" and self._expect_key
+                if not self._reading_key:
+                    self._value_start(pos)
+                self._expect_key = False
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                self._value_start(pos)
+                key = self._last_key if self._stack and self._stack[-1][0] == "{" else None
+                self._stack.append((ch, key))
+                self._expect_key = ch == "{"
+                self._mark_cut(pos + 1)
+            elif ch in "}]":
+                # A scalar item ends with the array holding it.
+                self._item_end(pos, new_items)
+                if self._stack:
+                    self._stack.pop()
+                self._item_end(pos + 1, new_items)
+                self._mark_cut(pos + 1)
+            elif ch == ",":
+                self._item_end(pos, new_items)
+                self._mark_cut(pos)
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == "{"
+            elif not self._in_scalar:
+                self._in_scalar = True
+                self._value_start(pos)
+        self._pos = len(text)
+        return new_items
+
+    def salvage(self) -> Optional[Any]:
+        """
+        Parses the longest prefix of the text that can be closed into a valid
+        document, dropping the incomplete trailing item. Items of the reported
+        arrays are kept whole or not at all.
+
+        Returns:
+            The salvaged document, or None when nothing could be recovered.
+        """
+        cut = self._item_cut if self._item_start is not None else self._cut
+        if not cut:
+            return None
+        pos, closers = cut
+        try:
+            return json.loads(self._text[:pos] + closers)
+        except ValueError:
+            return None
+
+    def salvage_items(self) -> Optional[Any]:
+        """
+        Salvages the document only when complete items of its arrays were
+        received. Documents without arrays, such as a single object, cannot be
+        partially recovered.
+        """
+        return self.salvage() if self.items else None
+
+
+def stream_generate_content(
+    client,
+    model: str,
+    contents,
+    config,
+    on_partial: Optional[Callable[[Optional[str], list], None]] = None,
+):
+    """
+    Streams a generate_content call through an IncrementalJsonParser.
+
+    When the call runs as an attempt of call_with_retries that gets abandoned
+    (a losing hedge, or an attempt past its deadline), the stream is closed at
+    the next chunk, which stops the generation, and on_partial is no longer
+    called, so a stale attempt never overwrites the final results.
+
+    Args:
+        client (genai.Client): The client used for the request.
+        model (str): The model name.
+        contents: The request contents.
+        config (types.GenerateContentConfig): The request config.
+        on_partial: Optional callback receiving an array key and all of that
+            array's complete items whenever new items arrive.
+
+    Returns:
+        Tuple: The response text, the last streamed chunk (which carries the
+        usage metadata) and the parser.
+
+    Raises:
+        AttemptCancelled: The attempt was abandoned while streaming.
+    """
+    parser = IncrementalJsonParser()
+    last_chunk = None
+    stream = client.models.generate_content_stream(
+        model=model, contents=contents, config=config
+    )
+    for chunk in stream:
+        if attempt_cancelled():
+            stream.close()
+            raise AttemptCancelled("Streamed attempt abandoned")
+        last_chunk = chunk
+        if not chunk.text:
+            continue
+        new_items = parser.feed(chunk.text)
+        if on_partial and not attempt_cancelled():
+            for key in dict.fromkeys(key for key, _ in new_items):
+                try:
+                    on_partial(key, list(parser.items[key]))
+                except Exception:
+                    logger.warning("Partial result callback failed", exc_info=True)
+    return parser.text, last_chunk, parser
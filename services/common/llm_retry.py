@@ -0,0 +1,263 @@
+""" Resilient model calls: retries, backoff, hedging and deadlines
+
+`call_with_retries` wraps a single model call (e.g. a `generate_content`
+lambda) and:
+    - retries errors that are worth retrying (429, 5xx, timeouts, connection
+      errors) with full-jitter exponential backoff,
+    - optionally fires a hedged duplicate when an attempt runs longer than a
+      percentile of the recent latencies of the same task, keeping whichever
+      answers first,
+    - optionally bounds each attempt and the call as a whole with deadlines,
+    - flags the attempts that lost a hedge race or were abandoned at their
+      deadline, so that streamed calls stop reading (see attempt_cancelled),
+    - logs the number of attempts and whether a hedge was used.
+
+Configuration (environment variables):
+    LLM_RETRY_MAX_ATTEMPTS: Attempts per call, including the first one.
+    LLM_RETRY_BASE_DELAY_SECONDS / LLM_RETRY_MAX_DELAY_SECONDS: Backoff bounds.
+    LLM_ATTEMPT_TIMEOUT_SECONDS: Deadline of a single attempt, "0" (default) for none.
+    LLM_CALL_DEADLINE_SECONDS: Deadline of the call, all attempts included, "0" (default)
+        for none. Long generations can take several minutes, so deadlines should
+        stay close to the request timeout of the service.
+    LLM_HEDGING_ENABLED: "true" to enable hedged requests (costs extra tokens).
+    LLM_HEDGE_PERCENTILE: Latency percentile after which an attempt is hedged.
+    LLM_HEDGE_MIN_SAMPLES: Latency samples needed before hedging a task.
+    LLM_CALL_WORKERS: Threads running attempts, shared by all the calls of the process.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional, TypeVar
+
+import httpx
+from google.genai import errors
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+retry_max_attempts = int(os.environ.get("LLM_RETRY_MAX_ATTEMPTS", "4"))
+retry_base_delay_seconds = float(os.environ.get("LLM_RETRY_BASE_DELAY_SECONDS", "2"))
+retry_max_delay_seconds = float(os.environ.get("LLM_RETRY_MAX_DELAY_SECONDS", "60"))
+attempt_timeout_seconds = float(os.environ.get("LLM_ATTEMPT_TIMEOUT_SECONDS", "0"))
+call_deadline_seconds = float(os.environ.get("LLM_CALL_DEADLINE_SECONDS", "0"))
+hedging_enabled = os.environ.get("LLM_HEDGING_ENABLED", "false").lower() == "true"
+hedge_percentile = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+hedge_min_samples = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+call_workers = int(os.environ.get("LLM_CALL_WORKERS", "32"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Number of recent successful latencies kept per task for the hedge delay.
+LATENCY_WINDOW = 200
+
+# Attempts run on this pool so that they can be bounded by a deadline and
+# hedged. An attempt that misses its deadline or loses a hedge race is
+# abandoned, not interrupted: its cancelled flag is set instead. Streamed
+# calls return at their next chunk, but a non-streaming call keeps its worker
+# until the model answers, so a burst of hedges or deadlines can fill the
+# pool and queue the attempts of other calls behind them. Size the pool for
+# the concurrency of the service plus the expected abandoned attempts.
+_executor = ThreadPoolExecutor(max_workers=call_workers, thread_name_prefix="llm-call")
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_latencies_lock = threading.Lock()
+# The cancelled flag of the attempt running on the current thread.
+_attempt_state = threading.local()
+
+
+class LlmDeadlineExceeded(TimeoutError):
+    """Raised when an attempt or the whole call runs past its deadline."""
+
+
+class AttemptCancelled(Exception):
+    """Raised by a call that stopped because its attempt was abandoned."""
+
+
+def attempt_cancelled() -> bool:
+    """
+    Whether the attempt running on the current thread was abandoned, because
+    it lost a hedge race or missed its deadline. Long running calls check it
+    to stop reading a stream and to skip their side effects.
+    """
+    cancelled = getattr(_attempt_state, "cancelled", None)
+    return bool(cancelled and cancelled.is_set())
+
+
+def _submit(call: Callable[[], T], attempts: dict) -> Future:
+    """Runs call on the pool with its own cancelled flag, recorded in attempts."""
+    cancelled = threading.Event()
+
+    def run():
+        _attempt_state.cancelled = cancelled
+        try:
+            return call()
+        finally:
+            _attempt_state.cancelled = None
+
+    future = _executor.submit(run)
+    attempts[future] = cancelled
+    return future
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Returns True for errors that may succeed when the call is repeated."""
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff delay before the given retry (1-based)."""
+    return random.uniform(0, min(retry_max_delay_seconds, retry_base_delay_seconds * 2 ** attempt))
+
+
+def _record_latency(task: str, latency: float):
+    with _latencies_lock:
+        _latencies[task].append(latency)
+
+
+def _hedge_delay(task: str) -> Optional[float]:
+    """The latency percentile of the task, once enough calls have been observed."""
+    if not hedging_enabled:
+        return None
+    with _latencies_lock:
+        samples = sorted(_latencies[task])
+    if len(samples) < hedge_min_samples:
+        return None
+    index = min(len(samples) - 1, int(len(samples) * hedge_percentile / 100))
+    return samples[index]
+
+
+def _run_attempt(call: Callable[[], T], task: str, timeout: Optional[float], attempts: dict) -> T:
+    """
+    Runs one attempt, hedging it when it outlives the task's hedge delay.
+    The attempts still running when it returns or raises are flagged as
+    cancelled.
+
+    Args:
+        call: The model call.
+        task (str): The task name.
+        timeout (Optional[float]): Deadline of the attempt in seconds, None for none.
+        attempts (dict): Empty dict filled with the submitted futures and their
+            cancelled flags; more than one entry means the attempt was hedged,
+            whether it succeeded or not.
+
+    Returns:
+        The result of the first call that succeeded.
+    """
+    hedge_after = _hedge_delay(task)
+    started_at = time.monotonic()
+    pending = {_submit(call, attempts)}
+    hedged = False
+    last_error = None
+    try:
+        while pending:
+            elapsed = time.monotonic() - started_at
+            wait_time = None
+            if timeout is not None:
+                wait_time = timeout - elapsed
+                if wait_time <= 0:
+                    raise LlmDeadlineExceeded(f"Attempt exceeded its {timeout:.0f}s deadline")
+            if hedge_after is not None and not hedged:
+                hedge_wait = max(hedge_after - elapsed, 0)
+                wait_time = hedge_wait if wait_time is None else min(wait_time, hedge_wait)
+
+            done, pending = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    _record_latency(task, time.monotonic() - started_at)
+                    return future.result()
+                last_error = future.exception()
+
+            if hedge_after is not None and not hedged and pending:
+                if time.monotonic() - started_at >= hedge_after:
+                    logger.info("Hedging slow call for task '%s' after %.1fs", task, hedge_after)
+                    # Added even when already done, so that a fast hedge is not lost
+                    pending.add(_submit(call, attempts))
+                    hedged = True
+        raise last_error
+    finally:
+        # Losing hedges and attempts past their deadline stop as soon as they check the flag
+        for future, cancelled in attempts.items():
+            if not future.done():
+                cancelled.set()
+
+
+def call_with_retries(call: Callable[[], T], task: str = "default", asset_id: Optional[str] = None) -> T:
+    """
+    Runs a model call with retries, backoff, optional hedging and deadlines.
+
+    Args:
+        call: Zero-argument callable performing the model call.
+        task (str): The task name, used to track latencies and in the logs.
+        asset_id (Optional[str]): The ID of the asset, for the logs.
+
+    Returns:
+        The result of the first successful attempt.
+
+    Raises:
+        The last error when it is not retryable or the attempts or deadline
+        are exhausted.
+    """
+    deadline = time.monotonic() + call_deadline_seconds if call_deadline_seconds > 0 else None
+    hedged_attempts = 0
+    attempt = 0
+    while True:
+        attempt += 1
+        timeout = attempt_timeout_seconds if attempt_timeout_seconds > 0 else None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        attempts = {}
+        error = None
+        try:
+            result = _run_attempt(call, task, timeout, attempts)
+        except Exception as e:
+            error = e
+        # A hedged attempt counts whether it succeeded or not
+        hedged_attempts += len(attempts) > 1
+        if error is None:
+            _log_attempts(task, asset_id, attempt, hedged_attempts, succeeded=True)
+            return result
+
+        delay = _backoff_delay(attempt)
+        if (
+            not is_retryable(error)
+            or attempt >= retry_max_attempts
+            or (deadline is not None and time.monotonic() + delay >= deadline)
+        ):
+            _log_attempts(task, asset_id, attempt, hedged_attempts, succeeded=False)
+            raise error
+        logger.warning(
+            "Retryable error on attempt %d for task '%s', retrying in %.1fs: %s",
+            attempt,
+            task,
+            delay,
+            error,
+            extra={"extra_fields": {"asset_id": asset_id, "task": task}},
+        )
+        time.sleep(delay)
+
+
+def _log_attempts(task: str, asset_id: Optional[str], attempts: int, hedged_attempts: int, succeeded: bool):
+    """Logs the attempt count of a call as a structured entry."""
+    logger.info(
+        "LLM call for task '%s' %s after %d attempt(s)",
+        task,
+        "succeeded" if succeeded else "failed",
+        attempts,
+        extra={
+            "extra_fields": {
+                "llm_call_attempts": {
+                    "task": task,
+                    "asset_id": asset_id,
+                    "attempts": attempts,
+                    "hedged_attempts": hedged_attempts,
+                    "succeeded": succeeded,
+                }
+            }
+        },
+    )
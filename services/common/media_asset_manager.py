@@ -1,12 +1,14 @@
 """ Service for handling document storage """
 import logging
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 from google.cloud import firestore
 
 # Get a logger instance for this module.
 # It will inherit the configuration from the root logger in the service entry point.
 logger = logging.getLogger(__name__)
+# Maximum number of writes Firestore accepts in a single batch.
+BATCH_WRITE_LIMIT = 500
 # Assume __app_id is globally available in the Cloud Run environment
 # For local testing, you might need to set it:
 # __app_id = "your-default-app-id"
@@ -41,6 +43,42 @@ class MediaAssetManager:
         """
         return self.media_assets_collection.document(asset_id)
 
+    def _build_update_payload(self, metadata_type: str, data: dict) -> dict:
+        """
+        Helper method building the Firestore update payload for update_asset_metadata.
+
+        Args:
+            metadata_type (str): The name of the top-level or nested field to update.
+            data (dict): The fields to update within that section.
+
+        Returns:
+            dict: The update payload, including the last_updated timestamps.
+        """
+        update_payload = {}
+        current_time = firestore.SERVER_TIMESTAMP
+
+        # Check if the update is for a nested dictionary (e.g., "summary", "transcription").
+        # These are predefined, structured objects within the Firestore document.
+        if metadata_type in ["summary", "transcription", "previews", "video_details",
+                        "image_details", "article_details", "context_cache"]:
+            # For nested objects, construct the update payload using dot notation.
+            # This allows Firestore to update individual fields within the nested object
+            # without overwriting the entire object.
+            for key, value in data.items():
+                update_payload[f"{metadata_type}.{key}"] = value
+            update_payload[f"{metadata_type}.last_updated"] = current_time
+        else:
+            # If it's not a known nested object, treat it as a top-level field.
+            # The 'data' argument is the direct value for the field, or a dict
+            # like {"poster_url": "new_url"} holding it.
+            if isinstance(data, dict) and list(data) == [metadata_type]:
+                update_payload[metadata_type] = data[metadata_type]
+            else:
+                update_payload[metadata_type] = data
+
+        update_payload["last_updated"] = current_time # Always update top-level timestamp
+        return update_payload
+
     def insert_asset(
         self,
         asset_id: str,
@@ -155,6 +193,33 @@ class MediaAssetManager:
                         asset_id, exc_info=True, extra={"extra_fields": {"asset_id": asset_id}})
             return None
 
+    def get_assets(self, asset_ids: List[str], field_paths: Optional[List[str]] = None) -> dict:
+        """
+        Retrieves many media asset documents with batched reads.
+
+        Args:
+            asset_ids (List[str]): The unique IDs of the media assets.
+            field_paths (Optional[List[str]]): Only read these fields (e.g., "summary.subtasks").
+
+        Returns:
+            dict: The data of each asset found, keyed by asset ID.
+        """
+        assets = {}
+        for start in range(0, len(asset_ids), BATCH_WRITE_LIMIT):
+            chunk = asset_ids[start:start + BATCH_WRITE_LIMIT]
+            try:
+                docs = self.db.get_all([self._get_doc_ref(asset_id) for asset_id in chunk],
+                                       field_paths=field_paths)
+                for doc in docs:
+                    if doc.exists:
+                        assets[doc.id] = doc.to_dict()
+            except Exception:
+                logger.error("Error retrieving %d assets",
+                            len(chunk),
+                            exc_info=True,
+                            extra={"extra_fields": {"asset_ids": chunk}})
+        return assets
+
     def update_asset_metadata(
         self,
         asset_id: str,
@@ -177,25 +242,7 @@ class MediaAssetManager:
             bool: True if update was successful, False otherwise.
         """
         doc_ref = self._get_doc_ref(asset_id)
-        update_payload = {}
-        current_time = firestore.SERVER_TIMESTAMP
-
-        # Check if the update is for a nested dictionary (e.g., "summary", "transcription").
-        # These are predefined, structured objects within the Firestore document.
-        if metadata_type in ["summary", "transcription", "previews", "video_details",
-                        "image_details", "article_details"]:
-            # For nested objects, construct the update payload using dot notation.
-            # This allows Firestore to update individual fields within the nested object
-            # without overwriting the entire object.
-            for key, value in data.items():
-                update_payload[f"{metadata_type}.{key}"] = value
-            update_payload[f"{metadata_type}.last_updated"] = current_time
-        else:
-            # If it's not a known nested object, treat it as a top-level field.
-            # The 'data' argument is expected to be the direct value for the field.
-            update_payload[metadata_type] = data
-
-        update_payload["last_updated"] = current_time # Always update top-level timestamp
+        update_payload = self._build_update_payload(metadata_type, data)
 
         try:
             doc_ref.update(update_payload)
@@ -213,6 +260,94 @@ class MediaAssetManager:
                         {"asset_id": asset_id, "metadata_type": metadata_type}})
             return False
 
+    def update_asset_metadata_if(
+        self,
+        asset_id: str,
+        metadata_type: str,
+        data: dict,
+        condition: Callable[[dict], bool]
+    ) -> bool:
+        """
+        Applies an update_asset_metadata update in a transaction, only when the
+        condition holds for the asset's current data. Concurrent writers see
+        each other's update, so at most one of them wins a create-if-absent.
+
+        Args:
+            asset_id (str): The unique ID of the media asset.
+            metadata_type (str): Same as update_asset_metadata.
+            data (dict): Same as update_asset_metadata.
+            condition (Callable[[dict], bool]): Called with the asset's data read
+                in the transaction. It may be called again when the transaction is retried.
+
+        Returns:
+            bool: True if the update was applied, False when the condition did not
+            hold, the asset does not exist or the transaction failed.
+        """
+        doc_ref = self._get_doc_ref(asset_id)
+        update_payload = self._build_update_payload(metadata_type, data)
+
+        @firestore.transactional
+        def apply(transaction) -> bool:
+            doc = doc_ref.get(transaction=transaction)
+            if not doc.exists or not condition(doc.to_dict()):
+                return False
+            transaction.update(doc_ref, update_payload)
+            return True
+
+        try:
+            updated = apply(self.db.transaction())
+            if updated:
+                logger.info("Successfully updated '%s' for asset: %s",
+                            metadata_type, asset_id,
+                            extra={"extra_fields":
+                            {"asset_id": asset_id, "metadata_type": metadata_type}})
+            return updated
+        except Exception:
+            logger.error("Error updating '%s' for asset %s in a transaction",
+                        metadata_type,
+                        asset_id,
+                        exc_info=True,
+                        extra={"extra_fields":
+                        {"asset_id": asset_id, "metadata_type": metadata_type}})
+            return False
+
+    def bulk_update_asset_metadata(self, updates: List[Tuple[str, str, dict]]) -> int:
+        """
+        Applies many update_asset_metadata updates with batched writes. A batch
+        fails as a whole when one of its documents is missing (e.g. a deleted
+        asset), in which case its updates are retried one by one so the others
+        are still applied.
+
+        Args:
+            updates (List[Tuple[str, str, dict]]): (asset_id, metadata_type, data) tuples,
+                with the same semantics as update_asset_metadata.
+
+        Returns:
+            int: The number of updates that were committed.
+        """
+        committed = 0
+        for start in range(0, len(updates), BATCH_WRITE_LIMIT):
+            chunk = updates[start:start + BATCH_WRITE_LIMIT]
+            batch = self.db.batch()
+            for asset_id, metadata_type, data in chunk:
+                batch.update(self._get_doc_ref(asset_id),
+                             self._build_update_payload(metadata_type, data))
+            try:
+                batch.commit()
+                committed += len(chunk)
+                logger.info("Successfully committed %d batched asset updates", len(chunk))
+            except Exception:
+                logger.warning("Error committing %d batched asset updates, retrying them one by one",
+                            len(chunk),
+                            exc_info=True,
+                            extra={"extra_fields":
+                            {"asset_ids": [asset_id for asset_id, _, _ in chunk]}})
+                committed += sum(
+                    self.update_asset_metadata(asset_id, metadata_type, data)
+                    for asset_id, metadata_type, data in chunk
+                )
+        return committed
+
     def delete_asset(self, asset_id: str) -> bool:
         """
         Deletes a media asset document from Firestore.
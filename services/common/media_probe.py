@@ -0,0 +1,248 @@
+""" Media probing without downloading the whole file
+
+`probe_media` reports the technical facts of a video in Cloud Storage
+(duration, resolution, frame rate, codecs, bitrate, keyframe interval and
+size) without writing anything to disk:
+    - progressive MP4s are probed by parsing their `moov` box, read with a
+      couple of ranged GETs through `common.mp4_ranges`,
+    - other files are probed by running ffprobe against a short-lived signed
+      URL, so that only the bytes ffprobe needs are transferred. This needs
+      the ffprobe binary, which only some service images install.
+
+Configuration (environment variables):
+    FFPROBE_BINARY: The ffprobe executable.
+    SERVICE_ACCOUNT_EMAIL: Service account signing the URLs, the default
+        credentials' account when unset.
+"""
+import os
+import json
+import logging
+import datetime
+import subprocess
+from typing import Optional
+
+import google.auth
+import google.auth.transport.requests
+from google.cloud import storage
+
+from common.mp4_ranges import GcsRangeReader, read_mp4_index
+
+logger = logging.getLogger(__name__)
+
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+FFPROBE_TIMEOUT_SECONDS = 60
+SIGNED_URL_EXPIRATION = datetime.timedelta(minutes=15)
+# Seconds of packets ffprobe reads to measure the keyframe interval.
+KEYFRAME_SCAN_SECONDS = 20
+
+# MP4 sample entry types with the matching ffprobe codec names.
+MP4_CODEC_NAMES = {
+    "avc1": "h264",
+    "avc3": "h264",
+    "hvc1": "hevc",
+    "hev1": "hevc",
+    "vp09": "vp9",
+    "av01": "av1",
+    "mp4v": "mpeg4",
+    "mp4a": "aac",
+    "Opus": "opus",
+    "ac-3": "ac3",
+    "ec-3": "eac3",
+    "fLaC": "flac",
+    ".mp3": "mp3",
+}
+
+
+def _parse_gcs_uri(gcs_uri: str):
+    bucket_name, _, blob_name = gcs_uri.replace("gs://", "", 1).partition("/")
+    return bucket_name, blob_name
+
+
+def probe_mp4(reader) -> Optional[dict]:
+    """
+    Probes a progressive MP4 from its `moov` box.
+
+    Args:
+        reader: Range reader of the file (e.g. GcsRangeReader).
+
+    Returns:
+        dict: The probe result (see probe_media), or None when the file is not
+        a progressive MP4.
+    """
+    index = read_mp4_index(reader)
+    if not index:
+        return None
+    video = next((track for track in index.tracks if track.handler == "vide"), None)
+    audio = next((track for track in index.tracks if track.handler == "soun"), None)
+    duration = max(track.duration / track.timescale for track in index.tracks if track.timescale)
+
+    result = {
+        "duration": round(duration, 3),
+        "width": None,
+        "height": None,
+        "fps": None,
+        "video_codec": None,
+        "audio_codec": MP4_CODEC_NAMES.get(audio.codec, audio.codec) if audio else None,
+        "bitrate": int(index.size * 8 / duration) if duration else None,
+        "keyframe_interval": None,
+        "size_bytes": index.size,
+        "probe_method": "mp4_index",
+    }
+    if video:
+        video_duration = video.duration / video.timescale if video.timescale else 0
+        fps = len(video.times) / video_duration if video_duration else None
+        if video.sync_samples is None:
+            # Every sample is a keyframe
+            keyframe_interval = 1 / fps if fps else None
+        elif len(video.sync_samples) > 1:
+            first, last = video.sync_samples[0], video.sync_samples[-1]
+            keyframe_interval = (video.times[last] - video.times[first]) / video.timescale / (len(video.sync_samples) - 1)
+        else:
+            keyframe_interval = video_duration
+        result.update(
+            {
+                "width": video.width,
+                "height": video.height,
+                "fps": round(fps, 3) if fps else None,
+                "video_codec": MP4_CODEC_NAMES.get(video.codec, video.codec),
+                "keyframe_interval": round(keyframe_interval, 3) if keyframe_interval else None,
+            }
+        )
+    return result
+
+
+def signed_url(blob) -> str:
+    """Signs a short-lived GET URL, delegating the signature to IAM when there is no private key."""
+    credentials, _ = google.auth.default()
+    credentials.refresh(google.auth.transport.requests.Request())
+    service_account_email = os.environ.get("SERVICE_ACCOUNT_EMAIL") or getattr(
+        credentials, "service_account_email", None
+    )
+    return blob.generate_signed_url(
+        version="v4",
+        expiration=SIGNED_URL_EXPIRATION,
+        method="GET",
+        service_account_email=service_account_email,
+        access_token=credentials.token,
+    )
+
+
+def _run_ffprobe(arguments: list) -> dict:
+    result = subprocess.run(
+        [FFPROBE_BINARY, "-v", "error", "-of", "json"] + arguments,
+        capture_output=True,
+        text=True,
+        timeout=FFPROBE_TIMEOUT_SECONDS,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {result.stderr.strip()[-2000:]}")
+    return json.loads(result.stdout or "{}")
+
+
+def _frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Parses an ffprobe rational frame rate such as "30000/1001"."""
+    numerator, _, denominator = (rate or "").partition("/")
+    try:
+        value = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value else None
+
+
+def probe_with_ffprobe(url: str, size_bytes: Optional[int] = None) -> dict:
+    """
+    Probes a file or URL with ffprobe.
+
+    Args:
+        url (str): Local path or (signed) URL of the file.
+        size_bytes (Optional[int]): The file size, when already known.
+
+    Returns:
+        dict: The probe result (see probe_media).
+    """
+    probe = _run_ffprobe(
+        [
+            "-show_entries",
+            "format=duration,bit_rate,size:stream=codec_type,codec_name,width,height,avg_frame_rate",
+            url,
+        ]
+    )
+    streams = probe.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    media_format = probe.get("format", {})
+
+    keyframe_interval = None
+    if video:
+        packets = _run_ffprobe(
+            [
+                "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags",
+                "-read_intervals", f"%+{KEYFRAME_SCAN_SECONDS}",
+                url,
+            ]
+        ).get("packets", [])
+        keyframes = sorted(
+            float(packet["pts_time"])
+            for packet in packets
+            if "K" in packet.get("flags", "") and packet.get("pts_time") not in (None, "N/A")
+        )
+        if len(keyframes) > 1:
+            keyframe_interval = round((keyframes[-1] - keyframes[0]) / (len(keyframes) - 1), 3)
+
+    duration = float(media_format["duration"]) if media_format.get("duration") else None
+    size_bytes = size_bytes or (int(media_format["size"]) if media_format.get("size") else None)
+    return {
+        "duration": round(duration, 3) if duration else None,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "fps": _frame_rate(video.get("avg_frame_rate")),
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+        "bitrate": int(media_format["bit_rate"]) if media_format.get("bit_rate") else None,
+        "keyframe_interval": keyframe_interval,
+        "size_bytes": size_bytes,
+        "probe_method": "ffprobe",
+    }
+
+
+def probe_media(gcs_uri: str, storage_client: Optional[storage.Client] = None) -> Optional[dict]:
+    """
+    Probes a video in Cloud Storage without downloading it.
+
+    Args:
+        gcs_uri (str): The gs:// URI of the video.
+        storage_client (Optional[storage.Client]): Client to reuse, a new one by default.
+
+    Returns:
+        dict: duration (seconds), width, height, fps, video_codec, audio_codec,
+        bitrate (bits per second), keyframe_interval (seconds), size_bytes,
+        checksum and probe_method, with None for the facts that could not be
+        determined.
+        None when the file could not be probed at all.
+    """
+    storage_client = storage_client or storage.Client()
+    bucket_name, blob_name = _parse_gcs_uri(gcs_uri)
+    try:
+        reader = GcsRangeReader(storage_client, bucket_name, blob_name)
+    except Exception:
+        logger.error("Could not read %s for probing", gcs_uri, exc_info=True)
+        return None
+
+    result = None
+    try:
+        result = probe_mp4(reader)
+    except Exception:
+        logger.warning("Could not parse the MP4 index of %s, falling back to ffprobe", gcs_uri, exc_info=True)
+
+    if not result:
+        try:
+            result = probe_with_ffprobe(signed_url(reader.blob), reader.size)
+        except Exception:
+            logger.error("Could not probe %s with ffprobe", gcs_uri, exc_info=True)
+            return None
+
+    # Same format as common.response_cache.get_source_checksum
+    blob = reader.blob
+    result["checksum"] = f"crc32c:{blob.crc32c}" if blob.crc32c else f"md5:{blob.md5_hash}"
+    return result
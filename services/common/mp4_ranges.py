@@ -0,0 +1,386 @@
+""" Byte-range access to MP4 sources in Cloud Storage
+
+Cutting a few clips out of a long title only needs the MP4 index (the `moov`
+box) and the samples of the requested time ranges, not the whole file. This
+module:
+    - reads the `moov` box with a couple of small ranged GETs,
+    - parses the sample tables of every track to map time ranges to byte
+      ranges (from the keyframe preceding each range start),
+    - fetches only those byte ranges, in parallel, into a sparse local file
+      of the original size, so ffmpeg can open it as if it were complete.
+
+Fragmented MP4s and other containers are not supported; callers fall back to
+a full download when `fetch_time_ranges` returns None.
+
+The module only uses the standard library (readers wrap the storage client),
+so services/artifacts_build.sh copies it as is into the video-processor
+utility and the scene_cut agent at build time. This file is the only source.
+
+Configuration (environment variables):
+    RANGE_FETCH_ENABLED: "true" (default) fetches only the needed byte ranges.
+    RANGE_FETCH_PADDING_SECONDS: Margin fetched around every time range.
+    RANGE_FETCH_WORKERS: Parallel ranged GETs.
+    RANGE_FETCH_CHUNK_MB: Maximum size of a single ranged GET.
+    RANGE_FETCH_MAX_FRACTION: Above this fraction of the file, download it whole.
+"""
+import os
+import bisect
+import struct
+import logging
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+range_fetch_enabled = os.environ.get("RANGE_FETCH_ENABLED", "true").lower() == "true"
+range_fetch_padding_seconds = float(os.environ.get("RANGE_FETCH_PADDING_SECONDS", "2"))
+range_fetch_workers = int(os.environ.get("RANGE_FETCH_WORKERS", "8"))
+range_fetch_chunk_bytes = int(float(os.environ.get("RANGE_FETCH_CHUNK_MB", "8")) * 1024 * 1024)
+range_fetch_max_fraction = float(os.environ.get("RANGE_FETCH_MAX_FRACTION", "0.5"))
+
+# Bytes read from the start of the file to find the top-level boxes.
+HEAD_PROBE_BYTES = 64 * 1024
+# Byte ranges closer than this are fetched with a single GET.
+MERGE_GAP_BYTES = 256 * 1024
+# Samples fetched from the start of every track, read by ffmpeg when probing.
+PROBE_SECONDS = 1.0
+
+
+class GcsRangeReader:
+    """Reads byte ranges of a Cloud Storage object."""
+
+    def __init__(self, storage_client, bucket_name: str, blob_name: str):
+        self.blob = storage_client.bucket(bucket_name).get_blob(blob_name)
+        if self.blob is None:
+            raise FileNotFoundError(f"gs://{bucket_name}/{blob_name} does not exist")
+        self.size = self.blob.size
+
+    def read(self, start: int, end: int) -> bytes:
+        """Returns the bytes in [start, end)."""
+        end = min(end, self.size)
+        if end <= start:
+            return b""
+        return self.blob.download_as_bytes(start=start, end=end - 1, checksum=None)
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Yields (type, payload start, box end) for the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header_size = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type.decode("latin-1"), pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _child(data: bytes, start: int, end: int, box_type: str) -> Optional[Tuple[int, int]]:
+    """Returns the payload bounds of the first child box of the given type."""
+    for child_type, child_start, child_end in _iter_boxes(data, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+
+def _find_moov(reader) -> Optional[Tuple[int, bytes, bytes]]:
+    """
+    Walks the top-level boxes to find the `moov` box.
+
+    Returns:
+        Tuple: The offset of the box, its full bytes and the bytes read from
+        the start of the file, or None when there is no `moov` box.
+    """
+    head = reader.read(0, min(HEAD_PROBE_BYTES, reader.size))
+    pos = 0
+    while pos + 8 <= reader.size:
+        header = head[pos:pos + 16] if pos + 16 <= len(head) else reader.read(pos, pos + 16)
+        if len(header) < 8:
+            return None
+        size, box_type = struct.unpack_from(">I4s", header)
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+        elif size == 0:
+            size = reader.size - pos
+        if size < 8:
+            return None
+        if box_type == b"moov":
+            moov = head[pos:pos + size] if pos + size <= len(head) else reader.read(pos, pos + size)
+            return pos, moov, head
+        pos += size
+    return None
+
+
+class Mp4Track:
+    """Sample table of one track, mapping sample indices to times and byte offsets."""
+
+    def __init__(self, handler: str, timescale: int, duration: int, media_time: int,
+                 times: array, offsets: array, sizes: array, sync_samples: Optional[List[int]],
+                 codec: Optional[str] = None, width: Optional[int] = None, height: Optional[int] = None):
+        self.handler = handler
+        self.timescale = timescale
+        self.duration = duration
+        # Sample entry type (e.g. "avc1", "mp4a") and coded size of video tracks
+        self.codec = codec
+        self.width = width
+        self.height = height
+        # Decode time of the first presented sample (from the edit list)
+        self.media_time = media_time
+        self.times = times
+        self.offsets = offsets
+        self.sizes = sizes
+        # 0-based indices of the sync samples, None when every sample is one
+        self.sync_samples = sync_samples
+
+    def sample_span(self, start: float, end: float) -> Tuple[int, int]:
+        """Returns the [first, last) samples covering [start, end] seconds, from the preceding sync sample."""
+        if not self.times:
+            return 0, 0
+        first = max(bisect.bisect_right(self.times, start * self.timescale + self.media_time) - 1, 0)
+        if self.sync_samples:
+            sync_index = bisect.bisect_right(self.sync_samples, first) - 1
+            first = self.sync_samples[sync_index] if sync_index >= 0 else 0
+        last = bisect.bisect_left(self.times, end * self.timescale + self.media_time) + 1
+        return first, min(last, len(self.times))
+
+    def byte_ranges(self, start: float, end: float) -> List[Tuple[int, int]]:
+        """Returns the contiguous [start, end) byte ranges of the samples covering [start, end] seconds."""
+        first, last = self.sample_span(start, end)
+        ranges = []
+        for index in range(first, last):
+            sample_start = self.offsets[index]
+            sample_end = sample_start + self.sizes[index]
+            if ranges and ranges[-1][1] == sample_start:
+                ranges[-1][1] = sample_end
+            else:
+                ranges.append([sample_start, sample_end])
+        return [(range_start, range_end) for range_start, range_end in ranges]
+
+
+def _parse_full_box_table(data: bytes, start: int, fmt: str) -> List[tuple]:
+    """Reads the entries of a table box: version/flags, entry count, then the entries."""
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    entry_start = start + 8
+    entry_size = struct.calcsize(fmt)
+    return list(struct.iter_unpack(fmt, data[entry_start:entry_start + count * entry_size]))
+
+
+def _parse_track(data: bytes, start: int, end: int) -> Optional[Mp4Track]:
+    """Builds the sample table of a `trak` box."""
+    mdia = _child(data, start, end, "mdia")
+    if not mdia:
+        return None
+    mdhd = _child(data, *mdia, "mdhd")
+    hdlr = _child(data, *mdia, "hdlr")
+    minf = _child(data, *mdia, "minf")
+    stbl = _child(data, *minf, "stbl") if minf else None
+    if not (mdhd and hdlr and stbl):
+        return None
+
+    if data[mdhd[0]] == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, mdhd[0] + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, mdhd[0] + 12)
+    handler = data[hdlr[0] + 8:hdlr[0] + 12].decode("latin-1")
+
+    media_time = 0
+    edts = _child(data, start, end, "edts")
+    elst = _child(data, *edts, "elst") if edts else None
+    if elst:
+        version = data[elst[0]]
+        entry_fmt = ">QqI" if version == 1 else ">IiI"
+        for _, entry_media_time, _ in _parse_full_box_table(data, elst[0], entry_fmt):
+            # Empty edits (media_time -1) only delay the presentation
+            if entry_media_time >= 0:
+                media_time = entry_media_time
+                break
+
+    codec, width, height = None, None, None
+    stsd = _child(data, *stbl, "stsd")
+    if stsd:
+        entry = next(_iter_boxes(data, stsd[0] + 8, stsd[1]), None)
+        if entry:
+            codec = entry[0].strip()
+            if handler == "vide" and entry[1] + 28 <= entry[2]:
+                width, height = struct.unpack_from(">HH", data, entry[1] + 24)
+
+    stts = _child(data, *stbl, "stts")
+    stsz = _child(data, *stbl, "stsz")
+    stsc = _child(data, *stbl, "stsc")
+    stco = _child(data, *stbl, "stco")
+    co64 = _child(data, *stbl, "co64")
+    stss = _child(data, *stbl, "stss")
+    if not (stts and stsz and stsc and (stco or co64)):
+        return None
+
+    times = array("q")
+    time = 0
+    for count, delta in _parse_full_box_table(data, stts[0], ">II"):
+        for _ in range(count):
+            times.append(time)
+            time += delta
+
+    uniform_size, sample_count = struct.unpack_from(">II", data, stsz[0] + 4)
+    if uniform_size:
+        sizes = array("q", [uniform_size]) * sample_count
+    else:
+        sizes = array("q", (size for (size,) in struct.iter_unpack(">I", data[stsz[0] + 12:stsz[0] + 12 + sample_count * 4])))
+
+    if co64:
+        chunk_offsets = [offset for (offset,) in _parse_full_box_table(data, co64[0], ">Q")]
+    else:
+        chunk_offsets = [offset for (offset,) in _parse_full_box_table(data, stco[0], ">I")]
+    chunk_runs = _parse_full_box_table(data, stsc[0], ">III")
+
+    offsets = array("q")
+    sample = 0
+    for run_index, (first_chunk, samples_per_chunk, _) in enumerate(chunk_runs):
+        next_first_chunk = chunk_runs[run_index + 1][0] if run_index + 1 < len(chunk_runs) else len(chunk_offsets) + 1
+        for chunk in range(first_chunk, next_first_chunk):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(samples_per_chunk):
+                if sample >= sample_count:
+                    break
+                offsets.append(offset)
+                offset += sizes[sample]
+                sample += 1
+
+    sample_count = min(len(times), len(offsets), len(sizes))
+    sync_samples = None
+    if stss:
+        sync_samples = [number - 1 for (number,) in _parse_full_box_table(data, stss[0], ">I")]
+    return Mp4Track(handler, timescale, duration, media_time,
+                    times[:sample_count], offsets[:sample_count], sizes[:sample_count], sync_samples,
+                    codec, width, height)
+
+
+class Mp4Index:
+    """The parsed `moov` box of an MP4 source."""
+
+    def __init__(self, size: int, moov_offset: int, moov: bytes, head: bytes, tracks: List[Mp4Track]):
+        self.size = size
+        self.moov_offset = moov_offset
+        self.moov = moov
+        self.head = head
+        self.tracks = tracks
+
+    def byte_ranges(self, time_ranges: Sequence[Tuple[float, float]], padding: float) -> List[Tuple[int, int]]:
+        """Returns the merged byte ranges holding the samples of the time ranges, padding included."""
+        ranges = []
+        for track in self.tracks:
+            ranges.extend(track.byte_ranges(0, PROBE_SECONDS))
+            for start, end in time_ranges:
+                ranges.extend(track.byte_ranges(max(start - padding, 0), end + padding))
+
+        merged = []
+        for range_start, range_end in sorted(ranges):
+            if merged and range_start - merged[-1][1] <= MERGE_GAP_BYTES:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        return [(range_start, range_end) for range_start, range_end in merged]
+
+
+def read_mp4_index(reader) -> Optional[Mp4Index]:
+    """
+    Reads and parses the `moov` box through a range reader.
+
+    Returns:
+        Mp4Index: The index, or None when the source is not a progressive MP4.
+    """
+    found = _find_moov(reader)
+    if not found:
+        return None
+    moov_offset, moov, head = found
+    _, moov_start, moov_end = next(_iter_boxes(moov))
+    tracks = []
+    for box_type, start, end in _iter_boxes(moov, moov_start, moov_end):
+        if box_type == "mvex":
+            # Fragmented MP4: samples are described by the fragments, not the moov
+            return None
+        if box_type == "trak":
+            try:
+                track = _parse_track(moov, start, end)
+            except (struct.error, IndexError):
+                track = None
+            if track and track.handler in ("vide", "soun"):
+                tracks.append(track)
+    if not tracks:
+        return None
+    return Mp4Index(reader.size, moov_offset, moov, head, tracks)
+
+
+def _split_ranges(ranges: List[Tuple[int, int]], chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Splits byte ranges into GETs of at most chunk_bytes."""
+    chunks = []
+    for range_start, range_end in ranges:
+        for chunk_start in range(range_start, range_end, chunk_bytes):
+            chunks.append((chunk_start, min(chunk_start + chunk_bytes, range_end)))
+    return chunks
+
+
+def fetch_time_ranges(reader, time_ranges: Sequence[Tuple[float, float]], local_path: str,
+                      padding: Optional[float] = None) -> Optional[str]:
+    """
+    Writes a sparse local copy of an MP4 source holding its index and the
+    samples of the given time ranges.
+
+    Args:
+        reader: Range reader of the source (e.g. GcsRangeReader).
+        time_ranges: (start, end) ranges in seconds.
+        local_path: Path of the local file to write.
+        padding: Seconds fetched around every range, RANGE_FETCH_PADDING_SECONDS by default.
+
+    Returns:
+        str: The local path, or None when the source cannot be read by ranges
+        or the ranges cover most of it, in which case it should be downloaded whole.
+    """
+    index = read_mp4_index(reader)
+    if not index:
+        logger.info("Source is not a progressive MP4, byte-range fetching is not possible")
+        return None
+
+    padding = range_fetch_padding_seconds if padding is None else padding
+    ranges = index.byte_ranges(time_ranges, padding)
+    total_bytes = sum(range_end - range_start for range_start, range_end in ranges)
+    if total_bytes > range_fetch_max_fraction * index.size:
+        logger.info("Requested ranges cover %.0f%% of the source, downloading it whole",
+                    100.0 * total_bytes / index.size)
+        return None
+
+    write_lock = threading.Lock()
+    with open(local_path, "wb") as f:
+        # Unwritten regions stay holes and take no space
+        f.truncate(index.size)
+        f.write(index.head)
+        f.seek(index.moov_offset)
+        f.write(index.moov)
+
+        def fetch(byte_range: Tuple[int, int]):
+            data = reader.read(*byte_range)
+            with write_lock:
+                f.seek(byte_range[0])
+                f.write(data)
+
+        chunks = _split_ranges(ranges, range_fetch_chunk_bytes)
+        with ThreadPoolExecutor(max_workers=max(1, range_fetch_workers)) as executor:
+            list(executor.map(fetch, chunks))
+
+    logger.info(
+        "Fetched %d byte ranges (%.1f MB of %.1f MB) for %d time ranges",
+        len(chunks),
+        total_bytes / 1e6,
+        index.size / 1e6,
+        len(time_ranges),
+    )
+    return local_path
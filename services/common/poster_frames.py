@@ -0,0 +1,195 @@
+""" Poster frame extraction and scoring
+
+Assets are created with a placeholder `poster_url`. `generate_poster`
+replaces it with a frame of the video:
+    - a handful of candidate timestamps is spread over the body of the video
+      (moved to the middle of their shot when the shot index is known),
+    - ffmpeg seeks to each candidate and decodes a single keyframe
+      (`-skip_frame nokey`), which bounds the decoding to a few frames per asset,
+    - every frame is scored with NumPy for sharpness (variance of the
+      Laplacian), brightness and contrast,
+    - the best frame is uploaded as JPEG at a few widths.
+
+Configuration (environment variables):
+    POSTER_ENABLED: "true" (default) or "false".
+    POSTER_CANDIDATES: Number of candidate frames scored per asset.
+    POSTER_WIDTHS: Comma separated widths of the uploaded posters.
+    POSTER_BUCKET: Bucket of the posters, the bucket of the video when unset.
+    FFMPEG_BINARY: The ffmpeg executable.
+"""
+import io
+import os
+import bisect
+import logging
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+poster_enabled = os.environ.get("POSTER_ENABLED", "true").lower() == "true"
+poster_candidates = int(os.environ.get("POSTER_CANDIDATES", "8"))
+poster_widths = [int(width) for width in os.environ.get("POSTER_WIDTHS", "1280,640,320").split(",") if width.strip()]
+poster_bucket = os.environ.get("POSTER_BUCKET", "")
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+# Host of the placeholder posters set by MediaAssetManager.insert_asset.
+PLACEHOLDER_POSTER_HOST = "placehold.co"
+# Candidates are taken from this share of the video, skipping intros and credits.
+CANDIDATE_SPAN = (0.1, 0.7)
+# Width the frames are scored at.
+ANALYSIS_WIDTH = 320
+GRAB_TIMEOUT_SECONDS = 20
+JPEG_QUALITY = 85
+
+
+def is_placeholder_poster(poster_url: Optional[str]) -> bool:
+    """Whether an asset still has the default placeholder poster (or none)."""
+    return not poster_url or PLACEHOLDER_POSTER_HOST in poster_url
+
+
+def candidate_times(duration: float, count: int, shot_boundaries: Sequence[float] = ()) -> List[float]:
+    """
+    Spreads count candidate timestamps over the body of the video, each moved
+    to the middle of its shot when the shot boundaries are known.
+    """
+    first, last = CANDIDATE_SPAN
+    times = np.linspace(duration * first, duration * last, count).tolist()
+    if not shot_boundaries:
+        return times
+    edges = [0.0] + list(shot_boundaries) + [duration]
+    centered = []
+    for seconds in times:
+        position = min(max(bisect.bisect_right(edges, seconds), 1), len(edges) - 1)
+        centered.append((edges[position - 1] + edges[position]) / 2)
+    # Several candidates can fall in the same long shot
+    return sorted(set(centered))
+
+
+def grab_keyframe(source: str, seconds: float) -> Optional[Image.Image]:
+    """
+    Decodes the keyframe at or before a timestamp, and only that frame.
+
+    Args:
+        source (str): Local path or (signed) URL of the video.
+        seconds (float): The timestamp.
+
+    Returns:
+        Optional[Image.Image]: The RGB frame, or None when it could not be decoded.
+    """
+    command = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        "-skip_frame", "nokey", "-noaccurate_seek",
+        "-ss", f"{seconds:.3f}", "-i", source,
+        "-an", "-sn", "-dn", "-frames:v", "1",
+        "-f", "image2pipe", "-c:v", "png", "pipe:1",
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=GRAB_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        logger.warning("Timed out grabbing the keyframe at %.1fs", seconds)
+        return None
+    if result.returncode != 0 or not result.stdout:
+        logger.warning("Could not grab the keyframe at %.1fs: %s", seconds, result.stderr.decode("utf-8", "replace")[-500:])
+        return None
+    return Image.open(io.BytesIO(result.stdout)).convert("RGB")
+
+
+def score_frame(image: Image.Image) -> Dict[str, float]:
+    """
+    Scores a frame as a poster.
+
+    Returns:
+        dict: sharpness (variance of the Laplacian), brightness and contrast
+        (mean and standard deviation of the luminance, 0-1), and the overall
+        score, favouring sharp, well exposed and contrasted frames.
+    """
+    height = max(1, round(image.height * ANALYSIS_WIDTH / image.width))
+    gray = np.asarray(image.convert("L").resize((ANALYSIS_WIDTH, height)), dtype=float) / 255
+    laplacian = (
+        gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+    brightness = float(gray.mean())
+    contrast = float(gray.std())
+    # 1 for a mid-tone frame, 0 for a black or white one
+    exposure = max(0.0, 1 - ((brightness - 0.45) / 0.45) ** 2)
+    return {
+        "sharpness": sharpness,
+        "brightness": brightness,
+        "contrast": contrast,
+        "score": exposure * contrast * float(np.sqrt(sharpness)),
+    }
+
+
+def _resized(image: Image.Image, width: int) -> Image.Image:
+    if image.width <= width:
+        return image
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+
+def upload_poster(image: Image.Image, storage_client, bucket_name: str, asset_id: str) -> Dict[str, str]:
+    """
+    Uploads a poster at every POSTER_WIDTHS width.
+
+    Returns:
+        Dict[str, str]: The URL of each size, keyed by width.
+    """
+    bucket = storage_client.bucket(bucket_name)
+    urls = {}
+    for width in sorted(set(poster_widths), reverse=True):
+        buffer = io.BytesIO()
+        _resized(image, width).save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        blob_name = f"{asset_id}/posters/poster_{width}.jpg"
+        bucket.blob(blob_name).upload_from_string(buffer.getvalue(), content_type="image/jpeg")
+        urls[str(width)] = f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
+    return urls
+
+
+def generate_poster(
+    asset_id: str,
+    gcs_uri: str,
+    source_url: str,
+    duration: float,
+    storage_client,
+    shot_boundaries: Sequence[float] = (),
+) -> Optional[Dict[str, Any]]:
+    """
+    Picks and uploads the poster of a video.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        gcs_uri (str): The gs:// URI of the video, whose bucket receives the
+            posters unless POSTER_BUCKET is set.
+        source_url (str): Local path or signed URL ffmpeg reads the video from.
+        duration (float): The video duration in seconds.
+        storage_client (storage.Client): Client uploading the posters.
+        shot_boundaries (Sequence[float]): Shot boundaries, when known.
+
+    Returns:
+        dict: poster_url (the largest size), posters (URL per width),
+        timestamp and score of the chosen frame; None when no frame could
+        be decoded.
+    """
+    best = None
+    for seconds in candidate_times(duration, poster_candidates, shot_boundaries):
+        image = grab_keyframe(source_url, seconds)
+        if image is None:
+            continue
+        scores = score_frame(image)
+        if best is None or scores["score"] > best[2]["score"]:
+            best = (seconds, image, scores)
+    if best is None:
+        return None
+
+    seconds, image, scores = best
+    bucket_name = poster_bucket or gcs_uri.replace("gs://", "", 1).split("/", 1)[0]
+    urls = upload_poster(image, storage_client, bucket_name, asset_id)
+    return {
+        "poster_url": urls[str(max(int(width) for width in urls))],
+        "posters": urls,
+        "timestamp": round(seconds, 2),
+        "score": round(scores["score"], 4),
+    }
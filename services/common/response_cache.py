@@ -0,0 +1,317 @@
+""" Persistent cache for LLM responses keyed by media, prompt, schema and model
+
+Configuration (environment variables):
+    LLM_RESPONSE_CACHE_BACKEND: "none" (default), "disk" or "gcs".
+    LLM_RESPONSE_CACHE_DIR: Directory used by the disk backend.
+    LLM_RESPONSE_CACHE_BUCKET: Bucket used by the GCS backend.
+    LLM_RESPONSE_CACHE_PREFIX: Object prefix used by the GCS backend.
+    LLM_RESPONSE_CACHE_MAX_BYTES: Size bound, least recently used entries are evicted first.
+    LLM_RESPONSE_CACHE_EVICT_EVERY: The GCS backend enforces the size bound every this many
+        writes per instance (100 by default). "0" never evicts, leaving expiry to a bucket
+        lifecycle rule on the prefix.
+    LLM_RESPONSE_CACHE_TOUCH_SECONDS: The GCS backend refreshes the last access time of an
+        entry on a hit only when it is older than this (one day by default).
+    LLM_RESPONSE_CACHE_BYPASS: When "true", lookups are skipped but fresh responses are still stored.
+"""
+import os
+import json
+import hashlib
+import logging
+import datetime
+import tempfile
+import threading
+from typing import Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every entry written by a previous key layout.
+CACHE_KEY_VERSION = 1
+
+# Storage client shared by the checksum lookups and the GCS backend.
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def _get_storage_client():
+    """Returns the module's storage client, created on first use."""
+    global _storage_client
+    with _storage_client_lock:
+        if _storage_client is None:
+            from google.cloud import storage
+
+            _storage_client = storage.Client()
+        return _storage_client
+
+
+def _hash(value) -> str:
+    """Returns a stable SHA-256 hex digest for strings and JSON-serializable values."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def build_cache_key(
+    source_checksum: Optional[str],
+    prompt_text: str,
+    response_schema,
+    model_name: str,
+    generation_config: dict,
+) -> str:
+    """
+    Builds the cache key for a single model request.
+
+    Args:
+        source_checksum (Optional[str]): Checksum of the source media, None for text only requests.
+        prompt_text (str): Every piece of text sent to the model, including system instructions.
+        response_schema: The response schema, or None.
+        model_name (str): The model the request is sent to.
+        generation_config (dict): The generation settings that influence the output.
+
+    Returns:
+        str: The hex digest identifying the request.
+    """
+    return _hash(
+        {
+            "version": CACHE_KEY_VERSION,
+            "source": source_checksum,
+            "prompt": _hash(prompt_text),
+            "schema": _hash(response_schema),
+            "model": model_name,
+            "config": generation_config,
+        }
+    )
+
+
+def is_json_response(response_text: Optional[str]) -> bool:
+    """Returns True when the response is valid JSON and therefore worth caching."""
+    try:
+        json.loads(response_text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def get_source_checksum(
+    uri: str, source: str = "GCS", known_checksum: Optional[str] = None
+) -> Optional[str]:
+    """
+    Returns a content checksum for the source media.
+
+    GCS objects use their stored CRC32C (or MD5) so that a re-uploaded file with
+    the same name does not hit stale entries. Other sources fall back to the URI.
+
+    Args:
+        uri (str): The URI of the media file.
+        source (str): The source of the media file (e.g., "GCS", "youtube").
+        known_checksum (Optional[str]): The checksum carried by the request, e.g.
+            the one probed at ingest in `video_details`. It is used as is, without
+            looking the object up.
+
+    Returns:
+        Optional[str]: The checksum, or None when it could not be determined.
+    """
+    if source == "youtube" or not uri.startswith("gs://"):
+        return f"uri:{uri}"
+    if known_checksum:
+        return known_checksum
+    try:
+        parsed_uri = urlparse(uri)
+        blob = _get_storage_client().bucket(parsed_uri.netloc).get_blob(parsed_uri.path.lstrip("/"))
+        if blob is None:
+            return None
+        return f"crc32c:{blob.crc32c}" if blob.crc32c else f"md5:{blob.md5_hash}"
+    except Exception:
+        logger.warning("Could not read checksum for %s", uri, exc_info=True)
+        return None
+
+
+class LocalDiskBackend:
+    """Stores one file per entry in a local directory, evicting by last access time."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as entry:
+                value = entry.read()
+            # The modification time doubles as the last access time for eviction.
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str):
+        # Write to a temporary file first so readers never see a partial entry.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as entry:
+            entry.write(value)
+        os.replace(temp_path, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total_bytes = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+
+
+class GcsBackend:
+    """
+    Stores one object per entry under a bucket prefix, evicting by last access time.
+
+    Listing the prefix costs one request per thousand entries, so the size bound
+    is only enforced every evict_every writes, and the last access time of an
+    entry is only refreshed once it is older than touch_seconds.
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, max_bytes: int, evict_every: int = 100,
+                 touch_seconds: int = 24 * 3600):
+        self.bucket = _get_storage_client().bucket(bucket_name)
+        self.prefix = prefix.rstrip("/") + "/"
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.touch_seconds = touch_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        blob = self.bucket.get_blob(f"{self.prefix}{key}.json")
+        if blob is None:
+            return None
+        value = blob.download_as_text()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        last_access = (blob.metadata or {}).get("last_access")
+        try:
+            if not last_access or (
+                now - datetime.datetime.fromisoformat(last_access)
+            ).total_seconds() > self.touch_seconds:
+                blob.metadata = {"last_access": now.isoformat()}
+                blob.patch()
+        except Exception:
+            logger.debug("Could not refresh last access time for %s", blob.name)
+        return value
+
+    def set(self, key: str, value: str):
+        blob = self.bucket.blob(f"{self.prefix}{key}.json")
+        blob.metadata = {"last_access": datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        blob.upload_from_string(value, content_type="application/json")
+        if not self.evict_every:
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total_bytes = 0
+        blobs = self.bucket.list_blobs(
+            prefix=self.prefix,
+            fields="items(name,size,updated,metadata),nextPageToken",
+        )
+        for blob in blobs:
+            last_access = (blob.metadata or {}).get("last_access") or blob.updated.isoformat()
+            entries.append((last_access, blob.size or 0, blob))
+            total_bytes += blob.size or 0
+
+        for _, size, blob in sorted(entries, key=lambda entry: entry[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                blob.delete()
+            except Exception:
+                logger.debug("Could not evict %s", blob.name)
+            total_bytes -= size
+
+
+class ResponseCache:
+    """
+    Front for the configured backend. Backend failures never fail the caller;
+    they are logged and treated as cache misses.
+    """
+
+    def __init__(self, backend=None, bypass: bool = False):
+        self.backend = backend
+        self.bypass = bypass
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Builds the cache described by the LLM_RESPONSE_CACHE_* environment variables."""
+        backend_name = os.environ.get("LLM_RESPONSE_CACHE_BACKEND", "none").lower()
+        bypass = os.environ.get("LLM_RESPONSE_CACHE_BYPASS", "false").lower() == "true"
+        backend = None
+        try:
+            if backend_name == "disk":
+                backend = LocalDiskBackend(
+                    os.environ.get("LLM_RESPONSE_CACHE_DIR", "/tmp/llm_response_cache"),
+                    int(os.environ.get("LLM_RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+                )
+            elif backend_name == "gcs":
+                backend = GcsBackend(
+                    os.environ["LLM_RESPONSE_CACHE_BUCKET"],
+                    os.environ.get("LLM_RESPONSE_CACHE_PREFIX", "llm-response-cache"),
+                    int(os.environ.get("LLM_RESPONSE_CACHE_MAX_BYTES", str(5 * 1024 ** 3))),
+                    int(os.environ.get("LLM_RESPONSE_CACHE_EVICT_EVERY", "100")),
+                    int(os.environ.get("LLM_RESPONSE_CACHE_TOUCH_SECONDS", str(24 * 3600))),
+                )
+        except Exception:
+            logger.error("Could not initialize the '%s' response cache, caching disabled.",
+                         backend_name, exc_info=True)
+            backend = None
+        return cls(backend, bypass)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str, bypass_cache: bool = False) -> Optional[str]:
+        """Returns the cached response for the key, or None on a miss or when bypassed."""
+        if not self.enabled or self.bypass or bypass_cache:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            logger.warning("Response cache lookup failed for key %s", key, exc_info=True)
+            return None
+        if value is not None:
+            logger.info("Response cache hit for key %s", key)
+        return value
+
+    def set(self, key: str, value: str):
+        """Stores a response. Bypassed lookups still refresh the stored entry."""
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            logger.warning("Response cache write failed for key %s", key, exc_info=True)
+
+
+response_cache = ResponseCache.from_env()
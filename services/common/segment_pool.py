@@ -0,0 +1,104 @@
+"""
+Renders video segments in parallel across a process pool.
+
+Re-encoding a segment (trimming with a logo end-card, or the head of a smart
+cut) is CPU bound and independent of the other segments, so the segments of
+a reel are rendered by a pool of worker processes instead of one at a time.
+The pool is sized from the CPUs and memory actually available to the
+container (cgroup limits included), and results are returned in job order.
+
+The module only uses the standard library, so services/artifacts_build.sh
+copies it as is into the video-processor utility at build time. This file is
+the only source.
+
+Configuration (environment variables):
+    SEGMENT_POOL_MAX_WORKERS: Upper bound on the number of workers (0 = no bound).
+    SEGMENT_WORKER_MEMORY_MB: Memory budgeted per worker, in MB.
+"""
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_POOL_MAX_WORKERS = int(os.environ.get("SEGMENT_POOL_MAX_WORKERS", "0"))
+SEGMENT_WORKER_MEMORY_MB = int(os.environ.get("SEGMENT_WORKER_MEMORY_MB", "1024"))
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def available_cpus() -> int:
+    """Returns the CPUs usable by this process, honouring the cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    cpu_max = _read_first_line("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    return max(1, cpus)
+
+
+def available_memory_bytes() -> Optional[int]:
+    """Returns the memory still available to the container, or None when unknown."""
+    limit = _read_first_line("/sys/fs/cgroup/memory.max")
+    usage = _read_first_line("/sys/fs/cgroup/memory.current")
+    if limit and limit != "max" and usage:
+        return max(0, int(limit) - int(usage))
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def pool_size(job_count: int) -> int:
+    """Number of workers for job_count jobs, bounded by CPUs, memory and SEGMENT_POOL_MAX_WORKERS."""
+    workers = min(job_count, available_cpus())
+    memory = available_memory_bytes()
+    if memory is not None:
+        workers = min(workers, memory // (SEGMENT_WORKER_MEMORY_MB * 1024 * 1024))
+    if SEGMENT_POOL_MAX_WORKERS > 0:
+        workers = min(workers, SEGMENT_POOL_MAX_WORKERS)
+    return max(1, workers)
+
+
+def render_segments(render: Callable[..., Any], jobs: Sequence[tuple]) -> List[Any]:
+    """
+    Calls render(*job) for every job across a process pool.
+
+    Args:
+        render: Module-level function rendering one segment (it must be picklable).
+        jobs: Argument tuples, one per segment.
+
+    Returns:
+        The results of render, in the order of the jobs. An exception raised
+        by a job is re-raised once the pool has shut down.
+    """
+    if not jobs:
+        return []
+    workers = pool_size(len(jobs))
+    logger.info("Rendering %d segments with %d worker process(es)", len(jobs), workers)
+    if workers == 1:
+        return [render(*job) for job in jobs]
+
+    # Spawned workers do not inherit the parent's threads and client connections.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(render, *job) for job in jobs]
+        return [future.result() for future in futures]
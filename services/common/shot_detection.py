@@ -0,0 +1,269 @@
+""" Local shot-boundary detection and snapping
+
+Timecodes returned by the models (clips, key sections, highlight segments)
+often land in the middle of a shot. `detect_shots` finds the shot boundaries
+of a video on the CPU, without any model call:
+    - ffmpeg decodes a downscaled stream sampled at a few frames per second
+      and pipes the raw RGB frames,
+    - for every pair of consecutive frames, the difference of their colour
+      histograms and their mean pixel difference are computed with NumPy over
+      whole chunks of frames at once,
+    - frames scoring above a threshold start a new shot, keeping the strongest
+      cut within any minimum shot length.
+Decoding stops once SHOT_DETECTION_TIME_BUDGET_SECONDS have elapsed, so that
+long videos cannot hold the request that detects their shots; the index then
+only covers the analyzed part and is marked incomplete.
+
+The result is a compact shot index stored with the asset under
+`video_details.shot_index`, that every clip generator snaps its timecodes to
+with `snap_times` / `snap_timecodes`.
+
+Configuration (environment variables):
+    SHOT_DETECTION_ENABLED: "true" (default) or "false".
+    SHOT_SAMPLE_FPS: Frames sampled per second of video.
+    SHOT_CUT_THRESHOLD: Score (0-1) above which two frames belong to different shots.
+    SHOT_MIN_SECONDS: Minimum length of a shot.
+    SHOT_SNAP_TOLERANCE_SECONDS: Maximum distance a timecode is moved to reach a boundary.
+    SHOT_DETECTION_TIME_BUDGET_SECONDS: Maximum time spent decoding a video, 0 for no limit.
+    FFMPEG_BINARY: The ffmpeg executable.
+"""
+import os
+import time
+import bisect
+import logging
+import subprocess
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from common.timecodes import timecode_to_seconds, seconds_to_timecode
+
+logger = logging.getLogger(__name__)
+
+shot_detection_enabled = os.environ.get("SHOT_DETECTION_ENABLED", "true").lower() == "true"
+shot_sample_fps = float(os.environ.get("SHOT_SAMPLE_FPS", "4"))
+shot_cut_threshold = float(os.environ.get("SHOT_CUT_THRESHOLD", "0.3"))
+shot_min_seconds = float(os.environ.get("SHOT_MIN_SECONDS", "1.0"))
+shot_snap_tolerance = float(os.environ.get("SHOT_SNAP_TOLERANCE_SECONDS", "1.5"))
+shot_time_budget = float(os.environ.get("SHOT_DETECTION_TIME_BUDGET_SECONDS", "180"))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+
+SHOT_INDEX_VERSION = 1
+# Size of the analyzed frames, enough for colour and layout changes.
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+# Histogram bins per colour channel.
+HISTOGRAM_BINS = 16
+# Frames scored together, bounding the memory used by long videos.
+CHUNK_FRAMES = 512
+
+
+def _sample_frames(source: str, sample_fps: float) -> Iterator[np.ndarray]:
+    """
+    Decodes source with ffmpeg, downscaled and sampled at sample_fps. Closing
+    the generator early stops ffmpeg.
+
+    Yields:
+        np.ndarray: Chunks of frames, shaped (frames, FRAME_HEIGHT, FRAME_WIDTH, 3).
+    """
+    command = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        # Non-reference frames are not needed at a few frames per second
+        "-skip_frame", "nonref",
+        "-i", source,
+        "-an", "-sn", "-dn",
+        "-vf", f"fps={sample_fps},scale={FRAME_WIDTH}:{FRAME_HEIGHT}:flags=area",
+        "-pix_fmt", "rgb24", "-f", "rawvideo", "pipe:1",
+    ]
+    frame_size = FRAME_WIDTH * FRAME_HEIGHT * 3
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(frame_size * CHUNK_FRAMES)
+            count = len(data) // frame_size
+            if not count:
+                finished = True
+                break
+            yield np.frombuffer(data[: count * frame_size], dtype=np.uint8).reshape(
+                count, FRAME_HEIGHT, FRAME_WIDTH, 3
+            )
+    finally:
+        if not finished:
+            process.kill()
+        process.stdout.close()
+        errors = process.stderr.read().decode("utf-8", "replace")
+        return_code = process.wait()
+    if return_code != 0:
+        raise RuntimeError(f"ffmpeg failed: {errors.strip()[-2000:]}")
+
+
+def _histograms(frames: np.ndarray) -> np.ndarray:
+    """Normalized per-channel colour histograms of a chunk, shaped (frames, 3 * HISTOGRAM_BINS)."""
+    count = len(frames)
+    pixels = frames.reshape(count, -1, 3)
+    # One bincount over the chunk: every (frame, channel, bin) gets its own slot
+    bins = (pixels // (256 // HISTOGRAM_BINS)).astype(np.int64)
+    bins += np.arange(3) * HISTOGRAM_BINS
+    bins += (np.arange(count) * 3 * HISTOGRAM_BINS)[:, None, None]
+    counts = np.bincount(bins.ravel(), minlength=count * 3 * HISTOGRAM_BINS)
+    return counts.reshape(count, 3 * HISTOGRAM_BINS) / pixels.shape[1]
+
+
+def _cut_scores(frames: np.ndarray, histograms: np.ndarray) -> np.ndarray:
+    """
+    Scores (0-1) the change between each frame and the next one: the mean of
+    the histogram distance and of the mean absolute pixel difference.
+    """
+    histogram_distance = np.abs(np.diff(histograms, axis=0)).sum(axis=1) / 6
+    pixel_distance = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=(1, 2, 3)) / 255
+    return (histogram_distance + pixel_distance) / 2
+
+
+def _pick_cuts(scores: np.ndarray, min_frames: int) -> List[int]:
+    """Frames starting a new shot: the strongest cuts first, at least min_frames apart."""
+    candidates = np.flatnonzero(scores > shot_cut_threshold)
+    cuts = []
+    for candidate in candidates[np.argsort(-scores[candidates], kind="stable")].tolist():
+        # scores[k] compares frames k and k + 1, so the new shot starts at frame k + 1
+        frame = candidate + 1
+        position = bisect.bisect_left(cuts, frame)
+        if position > 0 and frame - cuts[position - 1] < min_frames:
+            continue
+        if position < len(cuts) and cuts[position] - frame < min_frames:
+            continue
+        cuts.insert(position, frame)
+    return [cut for cut in cuts if cut >= min_frames]
+
+
+def detect_shots(source: str, sample_fps: Optional[float] = None,
+                 time_budget: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Detects the shot boundaries of a video.
+
+    Args:
+        source (str): Local path or (signed) URL of the video.
+        sample_fps (Optional[float]): Frames sampled per second, SHOT_SAMPLE_FPS by default.
+        time_budget (Optional[float]): Maximum seconds spent decoding,
+            SHOT_DETECTION_TIME_BUDGET_SECONDS by default, 0 for no limit.
+
+    Returns:
+        dict: The shot index: boundaries (start of every shot but the first, in
+        seconds), shot_count, duration (seconds analyzed), complete (False when
+        the time budget ran out first), sample_fps and version.
+    """
+    sample_fps = sample_fps or shot_sample_fps
+    time_budget = shot_time_budget if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget if time_budget > 0 else None
+    score_chunks = []
+    previous_frame = None
+    previous_histogram = None
+    frame_count = 0
+    complete = True
+    chunks = _sample_frames(source, sample_fps)
+    for frames in chunks:
+        frame_count += len(frames)
+        histograms = _histograms(frames)
+        if previous_frame is not None:
+            # Score the first frame of the chunk against the last one of the previous chunk
+            frames = np.concatenate([previous_frame, frames])
+            histograms = np.concatenate([previous_histogram, histograms])
+        score_chunks.append(_cut_scores(frames, histograms))
+        previous_frame = frames[-1:]
+        previous_histogram = histograms[-1:]
+        # Only the last chunk is shorter than CHUNK_FRAMES
+        if deadline is not None and time.monotonic() > deadline and frame_count % CHUNK_FRAMES == 0:
+            complete = False
+            chunks.close()
+            break
+
+    scores = np.concatenate(score_chunks) if score_chunks else np.zeros(0)
+    cuts = _pick_cuts(scores, max(1, int(round(shot_min_seconds * sample_fps))))
+    return {
+        "boundaries": [round(cut / sample_fps, 2) for cut in cuts],
+        "shot_count": len(cuts) + 1 if frame_count else 0,
+        "duration": round(frame_count / sample_fps, 2),
+        "complete": complete,
+        "sample_fps": sample_fps,
+        "version": SHOT_INDEX_VERSION,
+    }
+
+
+def has_shot_index(asset_data: Optional[dict]) -> bool:
+    """Whether shots were already detected for an asset, including single-shot videos without boundaries."""
+    return bool(((asset_data or {}).get("video_details") or {}).get("shot_index"))
+
+
+def get_shot_boundaries(asset_data: Optional[dict]) -> List[float]:
+    """Returns the shot boundaries stored with an asset, or an empty list."""
+    shot_index = ((asset_data or {}).get("video_details") or {}).get("shot_index") or {}
+    return list(shot_index.get("boundaries") or [])
+
+
+def snap_times(times: Sequence[float], boundaries: Sequence[float],
+               tolerance: Optional[float] = None) -> np.ndarray:
+    """
+    Moves every time to the nearest shot boundary within tolerance seconds.
+
+    Args:
+        times: Times in seconds.
+        boundaries: Sorted shot boundaries in seconds.
+        tolerance: Maximum move, SHOT_SNAP_TOLERANCE_SECONDS by default.
+
+    Returns:
+        np.ndarray: The snapped times; times without a boundary in reach are unchanged.
+    """
+    times = np.asarray(times, dtype=float)
+    boundaries = np.asarray(boundaries, dtype=float)
+    if not len(boundaries) or not len(times):
+        return times.copy()
+    tolerance = shot_snap_tolerance if tolerance is None else tolerance
+    # Binary search for the boundaries on either side of every time
+    right = np.clip(np.searchsorted(boundaries, times), 1, len(boundaries) - 1)
+    left = right - 1
+    nearest = np.where(
+        np.abs(times - boundaries[left]) <= np.abs(boundaries[right] - times),
+        boundaries[left],
+        boundaries[right],
+    )
+    return np.where(np.abs(nearest - times) <= tolerance, nearest, times)
+
+
+def snap_timecodes(items: List[dict], start_key: str, end_key: str, boundaries: Sequence[float],
+                   tolerance: Optional[float] = None) -> List[dict]:
+    """
+    Snaps the start and end timecodes of clips or sections to shot boundaries.
+
+    Snapped timecodes are written back in the "MM:SS" format, and the exact
+    times are recorded under start_seconds and end_seconds. Items whose
+    timecodes cannot be parsed, or that would end up empty, are left as is.
+
+    Args:
+        items: Dicts holding their timecodes under start_key and end_key (modified in place).
+        start_key: Key of the start timecode.
+        end_key: Key of the end timecode.
+        boundaries: Sorted shot boundaries in seconds.
+        tolerance: Maximum move, SHOT_SNAP_TOLERANCE_SECONDS by default.
+
+    Returns:
+        List[dict]: The items.
+    """
+    parsed = [
+        (item, timecode_to_seconds(item.get(start_key)), timecode_to_seconds(item.get(end_key)))
+        for item in items
+        if isinstance(item, dict)
+    ]
+    parsed = [(item, start, end) for item, start, end in parsed if start is not None and end is not None]
+    if not parsed or not len(boundaries):
+        return items
+
+    starts = snap_times([start for _, start, _ in parsed], boundaries, tolerance)
+    ends = snap_times([end for _, _, end in parsed], boundaries, tolerance)
+    for (item, _, _), start, end in zip(parsed, starts.tolist(), ends.tolist()):
+        if end <= start:
+            continue
+        item[start_key] = seconds_to_timecode(start)
+        item[end_key] = seconds_to_timecode(end)
+        item["start_seconds"] = round(start, 2)
+        item["end_seconds"] = round(end, 2)
+    return items
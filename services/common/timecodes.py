@@ -0,0 +1,34 @@
+""" Conversions between model timecodes and seconds """
+from typing import Optional, Union
+
+
+def timecode_to_seconds(timecode: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Converts a "HH:MM:SS(.ms)", "MM:SS(.ms)" or plain seconds timecode to seconds.
+
+    Args:
+        timecode: The timecode returned by the model.
+
+    Returns:
+        Optional[float]: The time in seconds, or None when the timecode cannot be parsed.
+    """
+    if timecode is None:
+        return None
+    if isinstance(timecode, (int, float)):
+        return float(timecode)
+    try:
+        seconds = 0.0
+        for part in str(timecode).strip().rstrip("s").split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def seconds_to_timecode(seconds: float) -> str:
+    """
+    Converts seconds to the "MM:SS" format the models and the UI use.
+    Minutes are not wrapped into hours (e.g. 3725 seconds -> "62:05").
+    """
+    total_seconds = int(round(max(seconds, 0)))
+    return f"{total_seconds // 60:02d}:{total_seconds % 60:02d}"
@@ -0,0 +1,76 @@
+""" Access to the transcript stored on an asset by the transcription generator """
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPTION_FIELD = "transcription"
+# Transcription statuses after which no transcript will appear anymore.
+TERMINAL_STATUSES = {"completed", "failed", "skipped"}
+# File categories the dispatcher always sends to the transcription generator.
+TRANSCRIBED_CATEGORIES = {"video", "audio"}
+
+# Deliveries of a task message deferred while its transcript is pending,
+# kept below the max_delivery_attempts of the subscription's dead letter policy.
+transcript_max_deferrals = int(os.environ.get("TRANSCRIPT_MAX_DEFERRALS", "3"))
+# Transcripts below either threshold are too thin to stand in for the video.
+transcript_min_words = int(os.environ.get("TRANSCRIPT_MIN_WORDS", "150"))
+transcript_min_words_per_minute = float(os.environ.get("TRANSCRIPT_MIN_WORDS_PER_MINUTE", "40"))
+
+
+def get_transcript(asset_data: Optional[dict]) -> Optional[dict]:
+    """
+    Returns the asset's completed transcription ("text", "words", ...), or
+    None when it is pending, failed or was skipped. Never waits for it.
+    """
+    transcription = (asset_data or {}).get(TRANSCRIPTION_FIELD) or {}
+    return transcription if transcription.get("status") == "completed" else None
+
+
+def is_transcript_pending(asset_data: Optional[dict]) -> bool:
+    """
+    Whether a transcript is still expected for the asset: the transcription
+    generator has not reached a terminal status yet, or has not started.
+    """
+    asset_data = asset_data or {}
+    if asset_data.get("file_category") not in TRANSCRIBED_CATEGORIES:
+        return False
+    status = (asset_data.get(TRANSCRIPTION_FIELD) or {}).get("status")
+    return status not in TERMINAL_STATUSES
+
+
+def should_defer_for_transcript(asset_data: Optional[dict], delivery_attempt: Optional[int]) -> bool:
+    """
+    Whether a task message should be handed back to Pub/Sub (nacked) to wait
+    for a pending transcript, instead of blocking the request. After
+    TRANSCRIPT_MAX_DEFERRALS deliveries the task proceeds without it.
+
+    Args:
+        asset_data (Optional[dict]): The asset document.
+        delivery_attempt (Optional[int]): The deliveryAttempt of the push
+            request, 1 for the first delivery.
+    """
+    if not is_transcript_pending(asset_data):
+        return False
+    if (delivery_attempt or 1) > transcript_max_deferrals:
+        logger.info(
+            "Transcript still pending after %d deliveries, proceeding without it.",
+            delivery_attempt,
+        )
+        return False
+    return True
+
+
+def is_transcript_sufficient(transcription: Optional[dict], duration: Optional[float] = None) -> bool:
+    """
+    Checks whether a transcript carries enough dialogue to describe the asset
+    on its own, in absolute terms and relative to the asset duration.
+    """
+    text = (transcription or {}).get("text") or ""
+    word_count = len(text.split())
+    if word_count < transcript_min_words:
+        return False
+    if duration:
+        return word_count / (duration / 60) >= transcript_min_words_per_minute
+    return True
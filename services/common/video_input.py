@@ -0,0 +1,121 @@
+""" Per-task video input settings for Gemini requests
+
+A video input setting controls how much of the video the model sees:
+    media_resolution: Gemini media resolution (e.g. "MEDIA_RESOLUTION_LOW"), None for the model default.
+    fps: Frame sampling rate, None for the model default of 1 frame per second.
+    start_offset / end_offset: Seconds delimiting the part of the video to analyze.
+
+Defaults depend on the task and the asset duration. Tasks that only need the
+gist of the content sample fewer, smaller frames as the asset grows, while
+tasks that return timestamps keep the default sampling so that their
+timestamps stay precise. Defaults can be overridden per task, field by field,
+with inline JSON in VIDEO_INPUT_SETTINGS, e.g. '{"summary": {"fps": 0.2}}'.
+"""
+import os
+import json
+import logging
+from typing import Optional
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Tasks whose output does not depend on precise timestamps.
+COARSE_TASKS = {"summary", "categorization", "video_overview"}
+
+# (maximum duration in seconds, settings) pairs for coarse tasks, first match wins.
+COARSE_DURATION_RULES = [
+    (10 * 60, {"media_resolution": None, "fps": None}),
+    (60 * 60, {"media_resolution": "MEDIA_RESOLUTION_LOW", "fps": 0.5}),
+    (float("inf"), {"media_resolution": "MEDIA_RESOLUTION_LOW", "fps": 0.25}),
+]
+
+
+def _load_overrides() -> dict:
+    """Reads the per-task overrides from VIDEO_INPUT_SETTINGS."""
+    try:
+        return json.loads(os.environ.get("VIDEO_INPUT_SETTINGS", "{}"))
+    except ValueError:
+        logger.error("Could not parse VIDEO_INPUT_SETTINGS, using defaults.", exc_info=True)
+        return {}
+
+
+_overrides = _load_overrides()
+
+
+def resolve_video_input(
+    task: str,
+    duration: Optional[float] = None,
+    start_offset: Optional[float] = None,
+    end_offset: Optional[float] = None,
+) -> dict:
+    """
+    Resolves the video input settings for a task.
+
+    Args:
+        task (str): The task name (e.g. "summary", "sections", "video_chunking").
+        duration (Optional[float]): Asset duration in seconds, None when unknown.
+        start_offset (Optional[float]): Start of the part of the video to analyze, in seconds.
+        end_offset (Optional[float]): End of the part of the video to analyze, in seconds.
+
+    Returns:
+        dict: The media_resolution, fps, start_offset and end_offset settings.
+    """
+    settings = {"media_resolution": None, "fps": None}
+    if task in COARSE_TASKS and duration:
+        analyzed_duration = (end_offset or duration) - (start_offset or 0)
+        for max_duration, rule in COARSE_DURATION_RULES:
+            if analyzed_duration <= max_duration:
+                settings.update(rule)
+                break
+    settings.update(_overrides.get(task, {}))
+    settings["start_offset"] = start_offset
+    settings["end_offset"] = end_offset
+    return settings
+
+
+def build_video_part(video_uri: str, mime_type: str, video_input: Optional[dict] = None) -> types.Part:
+    """
+    Builds the video Part for a request, attaching frame sampling and offsets
+    as video metadata when the settings ask for them.
+
+    Args:
+        video_uri (str): The URI of the video file.
+        mime_type (str): The MIME type of the video part.
+        video_input (Optional[dict]): Settings from resolve_video_input.
+
+    Returns:
+        types.Part: The video part.
+    """
+    video_part = types.Part.from_uri(file_uri=video_uri, mime_type=mime_type)
+    video_input = video_input or {}
+    metadata = {}
+    if video_input.get("fps"):
+        metadata["fps"] = video_input["fps"]
+    if video_input.get("start_offset") is not None:
+        metadata["start_offset"] = f"{video_input['start_offset']}s"
+    if video_input.get("end_offset") is not None:
+        metadata["end_offset"] = f"{video_input['end_offset']}s"
+    if metadata:
+        video_part.video_metadata = types.VideoMetadata(**metadata)
+    return video_part
+
+
+def can_use_context_cache(video_input: Optional[dict]) -> bool:
+    """
+    Cached videos are tokenized once, for the whole timeline and at the default
+    resolution, so requests that analyze part of the video or ask for a reduced
+    resolution send the video inline instead.
+    """
+    video_input = video_input or {}
+    return (
+        video_input.get("media_resolution") is None
+        and video_input.get("start_offset") is None
+        and video_input.get("end_offset") is None
+    )
+
+
+def get_asset_duration(asset_data: Optional[dict]) -> Optional[float]:
+    """Returns the asset duration in seconds recorded in video_details, if known."""
+    video_details = (asset_data or {}).get("video_details") or {}
+    return video_details.get("duration")
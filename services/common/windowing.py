@@ -0,0 +1,182 @@
+""" Windowed parallel analysis of long-form video
+
+Long assets are split into overlapping windows that are analyzed concurrently
+through start/end offsets. The items returned for each window (segments,
+chapters, key sections) are then merged back into a single timeline, dropping
+the duplicates produced where windows overlap.
+
+Configuration (environment variables):
+    WINDOWED_ANALYSIS_ENABLED: "true" (default) or "false".
+    WINDOWED_ANALYSIS_MIN_DURATION: Assets at least this long, in seconds, are windowed.
+    WINDOWED_ANALYSIS_WINDOW_SECONDS: Length of each window.
+    WINDOWED_ANALYSIS_OVERLAP_SECONDS: Overlap between consecutive windows.
+    WINDOWED_ANALYSIS_CONCURRENCY: Maximum number of windows analyzed at once.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common.timecodes import seconds_to_timecode
+
+logger = logging.getLogger(__name__)
+
+windowed_analysis_enabled = os.environ.get("WINDOWED_ANALYSIS_ENABLED", "true").lower() == "true"
+windowed_analysis_min_duration = float(os.environ.get("WINDOWED_ANALYSIS_MIN_DURATION", "1800"))
+window_seconds = float(os.environ.get("WINDOWED_ANALYSIS_WINDOW_SECONDS", "600"))
+window_overlap_seconds = float(os.environ.get("WINDOWED_ANALYSIS_OVERLAP_SECONDS", "30"))
+window_concurrency = int(os.environ.get("WINDOWED_ANALYSIS_CONCURRENCY", "4"))
+
+# Items overlapping a kept item by more than this share of the shorter one are duplicates.
+DUPLICATE_OVERLAP_RATIO = 0.5
+# Slack, in seconds, allowed when checking that an item falls within its window.
+WINDOW_TOLERANCE_SECONDS = 5
+
+
+def use_windowed_analysis(duration: Optional[float]) -> bool:
+    """Returns True when an asset of this duration should be analyzed in windows."""
+    return bool(
+        windowed_analysis_enabled and duration and duration >= windowed_analysis_min_duration
+    )
+
+
+def plan_windows(
+    duration: float,
+    length: float = window_seconds,
+    overlap: float = window_overlap_seconds,
+) -> List[Tuple[float, float]]:
+    """
+    Splits the timeline into overlapping (start, end) windows, in seconds.
+    A tail adding less than a quarter window of new content is folded into
+    the previous window instead of getting a window of its own.
+    """
+    step = max(length - overlap, 1.0)
+    windows = []
+    start = 0.0
+    while True:
+        end = min(start + length, float(duration))
+        windows.append((start, end))
+        if end >= duration:
+            break
+        start += step
+    if len(windows) > 1 and windows[-1][1] - windows[-2][1] < step / 4:
+        windows.pop()
+        windows[-1] = (windows[-1][0], float(duration))
+    return windows
+
+
+def window_prompt_note(window: Tuple[float, float]) -> str:
+    """Prompt suffix restricting the analysis to a window while keeping absolute timestamps."""
+    start, end = seconds_to_timecode(window[0]), seconds_to_timecode(window[1])
+    return (
+        f"\n\nANALYSIS WINDOW: Only analyze the part of the video between {start} and {end}. "
+        f"Every timestamp must be an absolute position in the full video, between {start} and {end}."
+    )
+
+
+def run_windows(analyze: Callable[[Tuple[float, float]], Any], windows: List[Tuple[float, float]]) -> list:
+    """
+    Runs analyze(window) for every window concurrently.
+
+    Returns:
+        list: The results in window order. Windows that raised map to None.
+    """
+    def _run(window):
+        try:
+            return analyze(window)
+        except Exception:
+            logger.error("Analysis failed for window %s-%s", window[0], window[1], exc_info=True)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(window_concurrency, len(windows)))) as executor:
+        return list(executor.map(_run, windows))
+
+
+def failed_windows(window_results: list, windows: List[Tuple[float, float]]) -> List[Dict[str, float]]:
+    """
+    Returns the windows whose analysis failed (None results), as start/end
+    dicts in seconds that can be stored in Firestore, which has no nested arrays.
+    """
+    return [
+        {"start": window[0], "end": window[1]}
+        for result, window in zip(window_results, windows)
+        if result is None
+    ]
+
+
+def _to_absolute(times: List[Tuple[float, float]], window: Tuple[float, float]) -> List[Tuple[float, float]]:
+    """
+    Shifts timestamps that were reported relative to the window start back
+    onto the full timeline. This only happens when none of the items fall
+    within the window as reported, but all of them do once shifted.
+    """
+    start, end = window
+    if start <= 0 or not times:
+        return times
+    within = lambda t: start - WINDOW_TOLERANCE_SECONDS <= t[0] and t[1] <= end + WINDOW_TOLERANCE_SECONDS
+    if any(within(t) for t in times):
+        return times
+    shifted = [(t[0] + start, t[1] + start) for t in times]
+    if all(within(t) for t in shifted):
+        logger.warning("Window %s-%s returned relative timestamps, shifting them.", start, end)
+        return shifted
+    return times
+
+
+def merge_windowed_items(
+    window_items: List[Optional[List[Dict[str, Any]]]],
+    windows: List[Tuple[float, float]],
+    get_times: Callable[[Dict[str, Any]], Tuple[Optional[float], Optional[float]]],
+    set_times: Callable[[Dict[str, Any], float, float], None],
+    score: Optional[Callable[[Dict[str, Any]], float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Merges the items found in each window into one timeline.
+
+    Items are clamped to their window, sorted by start time and de-duplicated:
+    an item overlapping an already kept item by more than DUPLICATE_OVERLAP_RATIO
+    of the shorter of the two is treated as the same moment seen from both
+    windows, and only the higher scoring one (or the first one) is kept.
+
+    Args:
+        window_items: The items returned for each window, None for failed windows.
+        windows: The (start, end) windows, in the same order.
+        get_times: Returns an item's (start, end) in seconds, None when unparsable.
+        set_times: Writes a (start, end) in seconds back onto an item.
+        score: Optional ranking used to pick between duplicates.
+
+    Returns:
+        list: The merged items, sorted by start time.
+    """
+    candidates = []
+    for items, window in zip(window_items, windows):
+        if not items:
+            continue
+        parsed = [(item, get_times(item)) for item in items]
+        parsed = [(item, times) for item, times in parsed if None not in times]
+        absolute_times = _to_absolute([times for _, times in parsed], window)
+        for (item, _), (start, end) in zip(parsed, absolute_times):
+            start, end = max(start, window[0]), min(end, window[1])
+            if end <= start:
+                continue
+            candidates.append((start, end, item))
+
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1]))
+    merged = []
+    for start, end, item in candidates:
+        if merged:
+            kept_start, kept_end, kept_item = merged[-1]
+            overlap = min(end, kept_end) - max(start, kept_start)
+            shorter = min(end - start, kept_end - kept_start)
+            if shorter > 0 and overlap / shorter > DUPLICATE_OVERLAP_RATIO:
+                if score and score(item) > score(kept_item):
+                    merged[-1] = (start, end, item)
+                continue
+        merged.append((start, end, item))
+
+    result = []
+    for start, end, item in merged:
+        item = dict(item)
+        set_times(item, start, end)
+        result.append(item)
+    return result
@@ -0,0 +1,151 @@
+""" Snapping of clip boundaries to the word timings of the transcript
+
+Clips and sections come back at the "MM:SS" precision of the models, which
+often cuts a word in half. The word timings stored by the transcription
+generator (`transcription.words`) are loaded into sorted lists once per
+asset. Every boundary is then moved by bisection to the nearest sentence gap,
+or to the nearest gap between two words when it falls inside a word, within a
+tolerance. Starts are placed just before the next word and ends just after
+the previous one, so that long pauses are not kept inside the clips.
+
+Configuration (environment variables):
+    WORD_SNAP_TOLERANCE_SECONDS: Maximum distance a boundary is moved.
+"""
+import os
+import bisect
+from typing import List, Optional
+
+from common.timecodes import timecode_to_seconds, seconds_to_timecode
+
+word_snap_tolerance = float(os.environ.get("WORD_SNAP_TOLERANCE_SECONDS", "1.0"))
+
+# Punctuation ending a sentence in the punctuated transcript.
+SENTENCE_END = (".", "!", "?")
+# Silence kept before the first word and after the last word of a clip.
+WORD_PADDING_SECONDS = 0.2
+
+
+def _nearest(points: List[float], seconds: float) -> Optional[float]:
+    """Returns the point of a sorted list nearest to seconds, or None when it is empty."""
+    position = bisect.bisect_left(points, seconds)
+    candidates = points[max(position - 1, 0):position + 1]
+    return min(candidates, key=lambda point: abs(point - seconds)) if candidates else None
+
+
+class WordTimings:
+    """Sorted word timings of a transcript, with the gaps between words and sentences."""
+
+    def __init__(self, words: List[dict]):
+        timed = []
+        for word in words or []:
+            # The first word's start offset is omitted when it is zero
+            start = timecode_to_seconds(word.get("start_time")) if word.get("start_time") is not None else 0.0
+            end = timecode_to_seconds(word.get("end_time"))
+            if start is not None and end is not None and end >= start:
+                timed.append((start, end, str(word.get("word") or "")))
+        timed.sort()
+
+        self.starts = [start for start, _, _ in timed]
+        self.ends = [end for _, end, _ in timed]
+        # Cut points of every gap (before the first word, between words, after the
+        # last one), for clip starts and for clip ends, and the sentence gaps among them
+        self.cut_points = {"start": [], "end": []}
+        self.sentence_cut_points = {"start": [], "end": []}
+        for index in range(len(timed) + 1 if timed else 0):
+            previous_end = timed[index - 1][1] if index else None
+            next_start = timed[index][0] if index < len(timed) else None
+            if previous_end is None:
+                points = {"start": max(next_start - WORD_PADDING_SECONDS, 0.0)}
+                points["end"] = points["start"]
+            elif next_start is None:
+                points = {"start": previous_end, "end": previous_end + WORD_PADDING_SECONDS}
+            else:
+                middle = (previous_end + next_start) / 2
+                points = {
+                    "start": max(middle, next_start - WORD_PADDING_SECONDS),
+                    "end": min(middle, previous_end + WORD_PADDING_SECONDS),
+                }
+            sentence_gap = previous_end is None or next_start is None or timed[index - 1][2].endswith(SENTENCE_END)
+            for edge, point in points.items():
+                self.cut_points[edge].append(point)
+                if sentence_gap:
+                    self.sentence_cut_points[edge].append(point)
+
+    @classmethod
+    def from_asset(cls, asset_data: Optional[dict]) -> "WordTimings":
+        """Loads the words stored under transcription.words, empty when there are none."""
+        transcription = (asset_data or {}).get("transcription") or {}
+        return cls(transcription.get("words") or [])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def inside_word(self, seconds: float) -> bool:
+        """Whether a time falls strictly inside a spoken word."""
+        index = bisect.bisect_right(self.starts, seconds) - 1
+        return index >= 0 and self.starts[index] < seconds < self.ends[index]
+
+    def snap(self, seconds: float, edge: str = "start", tolerance: Optional[float] = None) -> float:
+        """
+        Moves a clip boundary out of the words.
+
+        Args:
+            seconds: The boundary in seconds.
+            edge: "start" or "end", the boundary of the clip being snapped.
+            tolerance: Maximum move, WORD_SNAP_TOLERANCE_SECONDS by default.
+
+        Returns:
+            float: The nearest sentence gap within tolerance, otherwise the nearest
+            word gap within tolerance when the boundary cuts a word, otherwise
+            the boundary unchanged.
+        """
+        tolerance = word_snap_tolerance if tolerance is None else tolerance
+        sentence_gap = _nearest(self.sentence_cut_points[edge], seconds)
+        if sentence_gap is not None and abs(sentence_gap - seconds) <= tolerance:
+            return sentence_gap
+        if self.inside_word(seconds):
+            gap = _nearest(self.cut_points[edge], seconds)
+            if abs(gap - seconds) <= tolerance:
+                return gap
+        return seconds
+
+
+def snap_to_words(items: List[dict], start_key: str, end_key: str, word_timings: WordTimings,
+                  tolerance: Optional[float] = None) -> List[dict]:
+    """
+    Snaps the start and end of clips or sections to the gaps between words.
+
+    The exact times are read from start_seconds/end_seconds when an earlier
+    step recorded them, from the timecodes otherwise. Snapped timecodes are
+    written back in the "MM:SS" format along with start_seconds and
+    end_seconds. Items that cannot be parsed, or that would end up empty,
+    are left as is.
+
+    Args:
+        items: Dicts holding their timecodes under start_key and end_key (modified in place).
+        start_key: Key of the start timecode.
+        end_key: Key of the end timecode.
+        word_timings: The word timings of the asset.
+        tolerance: Maximum move, WORD_SNAP_TOLERANCE_SECONDS by default.
+
+    Returns:
+        List[dict]: The items.
+    """
+    if not len(word_timings):
+        return items
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        start = timecode_to_seconds(item.get("start_seconds", item.get(start_key)))
+        end = timecode_to_seconds(item.get("end_seconds", item.get(end_key)))
+        if start is None or end is None:
+            continue
+        start = word_timings.snap(start, "start", tolerance)
+        end = word_timings.snap(end, "end", tolerance)
+        if end <= start:
+            continue
+        item[start_key] = seconds_to_timecode(start)
+        item[end_key] = seconds_to_timecode(end)
+        item["start_seconds"] = round(start, 2)
+        item["end_seconds"] = round(end, 2)
+    return items
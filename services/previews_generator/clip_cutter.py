@@ -0,0 +1,302 @@
+#Required Imports
+import os
+import json
+import bisect
+import subprocess
+import tempfile
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.environ.get("FFPROBE_BINARY", "ffprobe")
+
+# Cuts starting this close after a keyframe are moved back onto it and stream copied.
+KEYFRAME_TOLERANCE_SECONDS = float(os.environ.get("CLIP_KEYFRAME_TOLERANCE_SECONDS", "0.5"))
+# Stream-copied clips whose duration is further than this from the expected one are re-encoded.
+DURATION_TOLERANCE_SECONDS = float(os.environ.get("CLIP_DURATION_TOLERANCE_SECONDS", "0.5"))
+
+# Encoders producing streams that can be concatenated with stream-copied ones.
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "vp9": "libvpx-vp9", "vp8": "libvpx"}
+AUDIO_ENCODERS = {"aac": "aac", "opus": "libopus", "vorbis": "libvorbis", "mp3": "libmp3lame"}
+# ffprobe profile names and the matching encoder -profile:v values.
+VIDEO_PROFILES = {
+    "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+    "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+    "Main 10": "main10", "Main Still Picture": "mainstillpicture",
+    "Profile 0": "0", "Profile 1": "1", "Profile 2": "2", "Profile 3": "3",
+}
+# Containers whose video track timescale can be set, to match the source time base.
+TIMESCALE_CONTAINERS = {".mp4", ".m4v", ".mov"}
+# Parameters a re-encoded part must share with the source to be joined to copied parts.
+VIDEO_MATCH_KEYS = ("codec_name", "profile", "level", "codec_tag_string", "width", "height", "pix_fmt", "time_base")
+AUDIO_MATCH_KEYS = ("codec_name", "sample_rate", "channels")
+
+
+def _run(command: List[str]) -> str:
+    """Runs an ffmpeg/ffprobe command and returns its stdout, raising with stderr on failure."""
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{command[0]} failed: {result.stderr.strip()[-2000:]}")
+    return result.stdout
+
+
+def probe_streams(video_path: str) -> Dict[str, Any]:
+    """
+    Reads the codec parameters of the first video and audio streams and the
+    container duration.
+
+    Args:
+        video_path: Local path of the video
+
+    Returns:
+        Dict with 'video' and 'audio' stream entries (None when absent) and
+        'duration' in seconds (None when unknown)
+    """
+    output = _run([
+        FFPROBE_BINARY, "-v", "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,profile,level,codec_tag_string,time_base,"
+        "pix_fmt,width,height,sample_rate,channels:format=duration",
+        "-of", "json", video_path,
+    ])
+    probe = json.loads(output)
+    streams = probe.get("streams", [])
+    duration = (probe.get("format") or {}).get("duration")
+    return {
+        "video": next((s for s in streams if s.get("codec_type") == "video"), None),
+        "audio": next((s for s in streams if s.get("codec_type") == "audio"), None),
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+    }
+
+
+def is_valid_clip(clip_path: str, expected_duration: float, streams: Dict[str, Any]) -> bool:
+    """
+    Cheap ffprobe check of a stream-copied clip: it must hold the streams of
+    the source and last expected_duration within DURATION_TOLERANCE_SECONDS.
+    Catches copies with a missing stream or cut short by damaged packets.
+    """
+    try:
+        clip_streams = probe_streams(clip_path)
+    except RuntimeError:
+        return False
+    if clip_streams["video"] is None or (streams.get("audio") and clip_streams["audio"] is None):
+        return False
+    duration = clip_streams["duration"]
+    return duration is not None and abs(duration - expected_duration) <= DURATION_TOLERANCE_SECONDS
+
+
+def matches_source(part_path: str, streams: Dict[str, Any]) -> bool:
+    """
+    Probes a re-encoded part and checks it shares the codec parameters of the
+    source (VIDEO_MATCH_KEYS, AUDIO_MATCH_KEYS), so the concat demuxer can
+    join it to stream-copied parts.
+    """
+    try:
+        part_streams = probe_streams(part_path)
+    except RuntimeError:
+        return False
+    for kind, keys in (("video", VIDEO_MATCH_KEYS), ("audio", AUDIO_MATCH_KEYS)):
+        source, part = streams.get(kind), part_streams.get(kind)
+        if (source is None) != (part is None):
+            return False
+        mismatched = [key for key in keys if source and source.get(key) != part.get(key)]
+        if mismatched:
+            print(f"Re-encoded part {part_path} differs from the source in {kind} {', '.join(mismatched)}")
+            return False
+    return True
+
+
+def _match_source_options(video: Dict[str, Any], video_encoder: str, output_path: str) -> List[str]:
+    """Encoder options reproducing the profile, level, codec tag and timescale of the source."""
+    options = []
+    profile = VIDEO_PROFILES.get(video.get("profile"))
+    if profile:
+        options += ["-profile:v", profile]
+    level = video.get("level")
+    if isinstance(level, int) and level > 0:
+        if video_encoder == "libx264":
+            options += ["-level:v", f"{level / 10:.1f}"]
+        elif video_encoder == "libx265":
+            # HEVC levels are stored as 30 times the level number
+            options += ["-x265-params", f"level-idc={level / 30:g}"]
+    codec_tag = video.get("codec_tag_string")
+    if codec_tag and not codec_tag.startswith("["):
+        options += ["-tag:v", codec_tag]
+    _, _, timescale = (video.get("time_base") or "").partition("/")
+    if timescale.isdigit() and os.path.splitext(output_path)[1].lower() in TIMESCALE_CONTAINERS:
+        options += ["-video_track_timescale", timescale]
+    return options
+
+
+def get_keyframe_times(video_path: str, start: Optional[float] = None, end: Optional[float] = None) -> List[float]:
+    """
+    Lists the keyframe timestamps of the video stream from the packet flags,
+    without decoding. Restricting the range only reads that part of the file.
+
+    Args:
+        video_path: Local path of the video
+        start: Optional start of the range to read, in seconds
+        end: Optional end of the range to read, in seconds
+
+    Returns:
+        Sorted keyframe timestamps in seconds
+    """
+    command = [FFPROBE_BINARY, "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0"]
+    if start is not None or end is not None:
+        # ffprobe starts reading at the keyframe preceding the interval start
+        interval_start = f"{max(start or 0, 0):.3f}"
+        interval_end = f"{end:.3f}" if end is not None else ""
+        command += ["-read_intervals", f"{interval_start}%{interval_end}"]
+    output = _run(command + [video_path])
+
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(set(keyframes))
+
+
+def _encode(video_path: str, start: float, end: float, output_path: str,
+            streams: Dict[str, Any], match_source: bool):
+    """
+    Re-encodes [start, end] frame accurately. With match_source the codecs
+    and parameters of the source are reused so the result can be
+    concatenated with stream-copied parts.
+    """
+    video, audio = streams.get("video") or {}, streams.get("audio") or {}
+    video_encoder = VIDEO_ENCODERS.get(video.get("codec_name"), "libx264") if match_source else "libx264"
+    audio_encoder = AUDIO_ENCODERS.get(audio.get("codec_name"), "aac") if match_source else "aac"
+    command = [
+        FFMPEG_BINARY, "-y", "-v", "error",
+        "-ss", f"{start:.6f}", "-i", video_path, "-t", f"{end - start:.6f}",
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", video_encoder, "-c:a", audio_encoder,
+    ]
+    if video_encoder in ("libx264", "libx265"):
+        command += ["-preset", "veryfast", "-crf", "18"]
+    else:
+        command += ["-b:v", "0", "-crf", "30", "-deadline", "realtime", "-cpu-used", "8"]
+    if match_source:
+        command += _match_source_options(video, video_encoder, output_path)
+        if video.get("pix_fmt"):
+            command += ["-pix_fmt", video["pix_fmt"]]
+        if audio.get("sample_rate"):
+            command += ["-ar", str(audio["sample_rate"])]
+        if audio.get("channels"):
+            command += ["-ac", str(audio["channels"])]
+    _run(command + [output_path])
+
+
+def concat_copy(part_paths: List[Union[str, Tuple[str, float, float]]], output_path: str):
+    """
+    Joins parts sharing the same codec parameters without re-encoding.
+
+    Args:
+        part_paths: Files to join, or (path, inpoint, outpoint) tuples to only
+            take [inpoint, outpoint) of a file. Inpoints must be keyframes.
+        output_path: Path of the joined file
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+        for part in part_paths:
+            path, inpoint, outpoint = part if isinstance(part, tuple) else (part, None, None)
+            escaped_path = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped_path}'\n")
+            if inpoint is not None:
+                list_file.write(f"inpoint {inpoint:.6f}\n")
+            if outpoint is not None:
+                list_file.write(f"outpoint {outpoint:.6f}\n")
+    try:
+        _run([
+            FFMPEG_BINARY, "-y", "-v", "error", "-f", "concat", "-safe", "0",
+            "-i", list_file.name, "-c", "copy", output_path,
+        ])
+    finally:
+        os.remove(list_file.name)
+
+
+def encode_concat(video_path: str, segments: List[Tuple[float, float]], output_path: str,
+                  streams: Dict[str, Any]):
+    """
+    Joins [start, end] segments of a video in a single encode: every segment
+    is read from the source with an input seek and they are joined by one
+    concat filter, so no intermediate files are written.
+    """
+    has_audio = streams.get("audio") is not None
+    command = [FFMPEG_BINARY, "-y", "-v", "error"]
+    for start, end in segments:
+        command += ["-ss", f"{start:.6f}", "-t", f"{end - start:.6f}", "-i", video_path]
+
+    inputs = "".join(
+        f"[{i}:v:0][{i}:a:0]" if has_audio else f"[{i}:v:0]" for i in range(len(segments))
+    )
+    outputs = "[v][a]" if has_audio else "[v]"
+    filter_graph = f"{inputs}concat=n={len(segments)}:v=1:a={int(has_audio)}{outputs}"
+
+    command += ["-filter_complex", filter_graph, "-map", "[v]"]
+    if has_audio:
+        command += ["-map", "[a]", "-c:a", "aac"]
+    command += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-movflags", "+faststart"]
+    _run(command + [output_path])
+
+
+def plan_cut(video_path: str, start: float, end: float, frame_accurate: bool = True,
+             streams: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float, float]]:
+    """
+    Plans how to cut [start, end] out of a local video re-encoding as little as possible.
+
+    - A start on (or within KEYFRAME_TOLERANCE_SECONDS after) a keyframe is
+      moved onto it and the clip is stream copied.
+    - Otherwise, with frame_accurate, the clip is smart cut: the partial GOP
+      between start and the next keyframe is re-encoded with the source
+      codecs and the rest is stream copied.
+    - Without frame_accurate, the start moves back to the previous keyframe.
+    The end needs no keyframe since frames before it decode on their own.
+
+    Args:
+        video_path: Local path of the source video
+        start: Clip start in seconds
+        end: Clip end in seconds
+        frame_accurate: Keep the exact start instead of snapping to a keyframe
+        streams: probe_streams result of the source
+
+    Returns:
+        Ordered ("copy" | "encode", start, end) parts. A single ("reencode", start, end)
+        part means the source codecs cannot be matched and the clip must be fully re-encoded.
+    """
+    streams = streams or probe_streams(video_path)
+    if not can_stream_copy(streams):
+        return [("reencode", start, end)]
+
+    keyframes = get_keyframe_times(video_path, max(start - KEYFRAME_TOLERANCE_SECONDS, 0), end)
+    index = bisect.bisect_right(keyframes, start)
+    previous_keyframe = keyframes[index - 1] if index > 0 else None
+    next_keyframe = keyframes[index] if index < len(keyframes) else None
+
+    if previous_keyframe is not None and (
+        start - previous_keyframe <= KEYFRAME_TOLERANCE_SECONDS or not frame_accurate
+    ):
+        return [("copy", previous_keyframe, end)]
+    if next_keyframe is None or next_keyframe >= end:
+        # No keyframe inside the clip, nothing to copy
+        return [("encode", start, end)]
+    return [("encode", start, next_keyframe), ("copy", next_keyframe, end)]
+
+
+def can_stream_copy(streams: Dict[str, Any]) -> bool:
+    """Whether parts re-encoded with the source codecs can be joined to copied ones."""
+    video_codec = (streams.get("video") or {}).get("codec_name")
+    audio_codec = (streams.get("audio") or {}).get("codec_name")
+    return video_codec in VIDEO_ENCODERS and (not audio_codec or audio_codec in AUDIO_ENCODERS)
+
+
+def encode_part(video_path: str, start: float, end: float, output_path: str,
+                streams: Dict[str, Any]) -> str:
+    """
+    Re-encodes a part with the source codecs and parameters so it can be
+    joined to copied parts. Check the result with matches_source.
+    """
+    _encode(video_path, start, end, output_path, streams, match_source=True)
+    return output_path
+
@@ -6,19 +6,41 @@ import json
 import os
 import traceback
 import tempfile
-from moviepy import VideoFileClip
+import numpy as np
 from .prompts import VIDEO_OVERVIEW_PROMPT, VIDEO_CHUNKING_PROMPT, REEL_ANALYSIS_PROMPT
-from .video_creator import create_final_highlight_reel
+from .video_creator import render_highlight_reel
+from .reel_selector import REEL_SELECTION_MODE, select_reel_segments
 from .utils import (
     seconds_to_mmss, 
     smooth_segment_boundaries,    
     mmss_to_seconds, 
     extract_json_from_response, 
     initialize_vertex_client,
-    validate_timestamp_markers, 
-    detect_segment_overlap)
+    validate_all_timestamp_markers, 
+    detect_overlaps)
 from .get_video_gcs import download_from_gcs
 from google.cloud import storage
+from common.video_input import resolve_video_input, build_video_part, can_use_context_cache
+from common.context_cache import get_or_create_video_cache
+from common.llm_retry import call_with_retries
+from common.timecodes import timecode_to_seconds, seconds_to_timecode
+from common.intervals import clamp_intervals
+from common.shot_detection import snap_times
+from common.word_timings import WordTimings
+from common.windowing import (
+    use_windowed_analysis,
+    plan_windows,
+    run_windows,
+    failed_windows,
+    window_prompt_note,
+    merge_windowed_items,
+)
+from common.response_cache import (
+    response_cache,
+    build_cache_key,
+    get_source_checksum,
+    is_json_response,
+)
 
 
 from dotenv import load_dotenv
@@ -26,9 +48,87 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def generate_text_cached(client, model_id: str, contents: list, video_url: Optional[str] = None,
+                         config: Optional[GenerateContentConfig] = None, bypass_cache: bool = False,
+                         task: str = "highlights", video_input: Optional[Dict[str, Any]] = None,
+                         asset_id: Optional[str] = None, asset_manager=None) -> str:
+    """
+    Calls the model and returns the response text, answering byte-identical
+    requests from the persistent response cache.
+
+    With an asset_id and asset_manager, the video Part is replaced by the
+    asset's shared context cache (see common.context_cache) when its
+    video_input allows it, so the highlight steps reuse the video tokens of the
+    summaries and previews requests.
+
+    Args:
+        client: genai.Client used for the request
+        model_id: Gemini model to use
+        contents: Request contents (video Part and prompt strings)
+        video_url: GCS URL of the video in the request, if any
+        config: Optional generation config
+        bypass_cache: Skip the cache lookup and always call the model
+        task: Task name used for retries and latency tracking
+        video_input: Video input settings the video Part was built with
+        asset_id: ID of the asset whose context cache is used
+        asset_manager: MediaAssetManager recording the context cache entry
+
+    Returns:
+        The response text
+    """
+    cache_key = None
+    if response_cache.enabled:
+        source_checksum = get_source_checksum(video_url) if video_url else None
+        if source_checksum or not video_url:
+            prompt_text = "\n".join(part for part in contents if isinstance(part, str))
+            generation_config = config.model_dump(mode="json", exclude_none=True) if config else {}
+            # Frame sampling and offsets change what the model sees, so they are part of the key
+            generation_config["video_metadata"] = [
+                part.video_metadata.model_dump(mode="json", exclude_none=True)
+                for part in contents
+                if isinstance(part, Part) and part.video_metadata
+            ]
+            cache_key = build_cache_key(source_checksum, prompt_text, None, model_id, generation_config)
+            cached_response = response_cache.get(cache_key, bypass_cache)
+            if cached_response is not None:
+                return cached_response
+
+    # The response cache key above only depends on the request, not on the context cache used
+    video_parts = [part for part in contents if isinstance(part, Part) and part.file_data]
+    if video_url and video_parts and asset_id and asset_manager and can_use_context_cache(video_input):
+        cached_content = get_or_create_video_cache(
+            client,
+            asset_manager,
+            asset_id,
+            video_url,
+            model_id,
+            mime_type=video_parts[0].file_data.mime_type,
+            fps=(video_input or {}).get("fps"),
+        )
+        if cached_content:
+            print(f"Using context cache {cached_content}")
+            contents = [part for part in contents if part not in video_parts]
+            config = (config or GenerateContentConfig()).model_copy(update={"cached_content": cached_content})
+
+    response = call_with_retries(
+        lambda: client.models.generate_content(
+            model=model_id,
+            contents=contents,
+            config=config,
+        ),
+        task=task,
+    )
+
+    # Only responses that parse are cached so a retry can recover from a bad one
+    if cache_key and is_json_response(extract_json_from_response(response.text or "")):
+        response_cache.set(cache_key, response.text)
+    return response.text
+
+
 ### Function to analyze video overview and extract master character list
 
-def analyze_video_overview(video_url: str, duration: int, model_id: str = 'gemini-2.5-flash') -> Optional[Dict[str, Any]]:
+def analyze_video_overview(video_url: str, duration: int, model_id: str = 'gemini-2.5-flash', bypass_cache: bool = False,
+                           asset_id: Optional[str] = None, asset_manager=None) -> Optional[Dict[str, Any]]:
     """
     Step 2.1: Analyze entire video to get overview and master character list.
     Uses Gemini Flash for faster, cost-effective analysis.
@@ -37,6 +137,9 @@ def analyze_video_overview(video_url: str, duration: int, model_id: str = 'gemin
         video_url: YouTube video URL
         duration: Video duration in seconds
         model_id: Gemini model to use (default: flash)
+        bypass_cache: Skip the response cache lookup
+        asset_id: Optional asset ID, the video is then read from the asset's context cache
+        asset_manager: MediaAssetManager recording the context cache, required with asset_id
         
     Returns:
         Dict with video overview data or None if failed
@@ -60,17 +163,23 @@ def analyze_video_overview(video_url: str, duration: int, model_id: str = 'gemin
         print(f"Video URL: {video_url}")
         
         try:
-            # Try to create the video part
-            video_part = Part.from_uri(
-                file_uri=video_url,
-                mime_type="video/webm",
-            )
+            # Try to create the video part, sampled according to the video duration
+            video_input = resolve_video_input("video_overview", duration)
+            video_part = build_video_part(video_url, "video/webm", video_input)
             print("Successfully created video Part from URI")
             
             # Generate content - VIDEO FIRST (best practice)
-            response = client.models.generate_content(
-                model=model_id,
-                contents=[video_part, prompt],  # Video before prompt
+            response_text = generate_text_cached(
+                client,
+                model_id,
+                [video_part, prompt],  # Video before prompt
+                video_url=video_url,
+                config=GenerateContentConfig(media_resolution=video_input["media_resolution"]),
+                bypass_cache=bypass_cache,
+                task="video_overview",
+                video_input=video_input,
+                asset_id=asset_id,
+                asset_manager=asset_manager,
             )
             print("Successfully generated video overview")
         except Exception as e:
@@ -78,9 +187,6 @@ def analyze_video_overview(video_url: str, duration: int, model_id: str = 'gemin
             print(f"Error type: {type(e).__name__}")
             raise Exception(f"Failed to analyze video overview: {str(e)}") from e
         
-        # Parse the response
-        response_text = response.text
-        
         # Extract and parse JSON
         json_text = extract_json_from_response(response_text)
         overview_data = json.loads(json_text)
@@ -106,7 +212,14 @@ video_chunking_config = GenerateContentConfig(
     temperature=0.01
 )
 
-def chunk_video_segments(video_url: str, duration: int, video_overview: Optional[Dict[str, Any]] = None, model_id: str = 'gemini-2.5-pro') -> Optional[Dict[str, Any]]:
+def _set_segment_times(seg: Dict[str, Any], start: float, end: float):
+    """Writes merged segment boundaries back as MM:SS timestamps."""
+    seg['start_timestamp'] = seconds_to_timecode(start)
+    seg['end_timestamp'] = seconds_to_timecode(end)
+
+
+def chunk_video_segments(video_url: str, duration: int, video_overview: Optional[Dict[str, Any]] = None, model_id: str = 'gemini-2.5-pro', bypass_cache: bool = False, shot_boundaries: Optional[List[float]] = None, word_timings: Optional[WordTimings] = None,
+                         asset_id: Optional[str] = None, asset_manager=None) -> Optional[Dict[str, Any]]:
     """
     Step 2: Use Gemini AI to chunk video into segments with metadata.
     Uses Gemini's multimodal capabilities to analyze video content.
@@ -116,6 +229,12 @@ def chunk_video_segments(video_url: str, duration: int, video_overview: Optional
         duration: Video duration in seconds fetched from Firestore
         video_overview: Optional video overview data with master character list from previous step
         model_id: Gemini model to use
+        bypass_cache: Skip the response cache lookup
+        shot_boundaries: Optional shot boundaries in seconds, segment boundaries are snapped to
+        word_timings: Optional transcript word timings, segment boundaries are moved out of the
+            spoken words instead of applying the text-based validation adjustments
+        asset_id: Optional asset ID, the video is then read from the asset's context cache
+        asset_manager: MediaAssetManager recording the context cache, required with asset_id
         
     Returns:
         Dict with segmented video data or None if failed
@@ -158,33 +277,68 @@ Total Characters: {len(char_list)}
         print(f"Video URL: {video_url}")
         print(f"Duration: {duration_mmss}")
         
-        try:
-            # Try to create the video part
-            video_part = Part.from_uri(
-                file_uri=video_url,
-                mime_type="video/webm",
-            )
-            print("Successfully created video Part from URI")
-            
-            # Generate content - VIDEO FIRST (best practice)
-            response = client.models.generate_content(
-                model=model_id,
-                contents=[video_part, prompt],  # Video before prompt
-                config=video_chunking_config,
+        def request_segments(window=None):
+            """Requests the segments of the whole video, or of a single window."""
+            window_prompt = prompt + window_prompt_note(window) if window else prompt
+            offsets = window or (None, None)
+            try:
+                # Try to create the video part
+                video_input = resolve_video_input("video_chunking", duration, *offsets)
+                video_part = build_video_part(video_url, "video/webm", video_input)
+                print("Successfully created video Part from URI")
+
+                # Generate content - VIDEO FIRST (best practice)
+                response_text = generate_text_cached(
+                    client,
+                    model_id,
+                    [video_part, window_prompt],  # Video before prompt
+                    video_url=video_url,
+                    config=video_chunking_config.model_copy(
+                        update={"media_resolution": video_input["media_resolution"]}
+                    ),
+                    bypass_cache=bypass_cache,
+                    task="video_chunking",
+                    video_input=video_input,
+                    asset_id=asset_id,
+                    asset_manager=asset_manager,
+                )
+                print("Successfully generated content from Vertex AI")
+            except Exception as e:
+                print(f"ERROR in generate_content: {str(e)}")
+                print(f"Error type: {type(e).__name__}")
+                # Try alternative approach or raise with more context
+                raise Exception(f"Failed to analyze video: {str(e)}") from e
+
+            # Extract and parse JSON
+            json_text = extract_json_from_response(response_text)
+            return json.loads(json_text).get('segments', [])
+
+        if use_windowed_analysis(duration):
+            # Long videos are analyzed in overlapping windows concurrently
+            windows = plan_windows(duration)
+            print(f"Analyzing video in {len(windows)} windows...")
+            window_segments = run_windows(request_segments, windows)
+            failed = failed_windows(window_segments, windows)
+            if len(failed) == len(windows):
+                raise Exception("Failed to analyze video: every analysis window failed")
+            for window in failed:
+                print(f"⚠️  Warning: Window {seconds_to_mmss(window['start'])} - {seconds_to_mmss(window['end'])} failed, its segments are missing")
+            merged_segments = merge_windowed_items(
+                window_segments,
+                windows,
+                get_times=lambda seg: (
+                    timecode_to_seconds(seg.get('start_timestamp')),
+                    timecode_to_seconds(seg.get('end_timestamp')),
+                ),
+                set_times=_set_segment_times,
+                score=lambda seg: seg.get('importance_score') or 0,
             )
-            print("Successfully generated content from Vertex AI")
-        except Exception as e:
-            print(f"ERROR in generate_content: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            # Try alternative approach or raise with more context
-            raise Exception(f"Failed to analyze video: {str(e)}") from e
-        
-        # Parse the response
-        response_text = response.text
-        
-        # Extract and parse JSON
-        json_text = extract_json_from_response(response_text)
-        segments_data = json.loads(json_text)
+            # Segment ids restart in every window, renumber the merged timeline
+            for index, seg in enumerate(merged_segments, start=1):
+                seg['segment_id'] = f"seg_{index:03d}"
+            segments_data = {'segments': merged_segments, 'failed_windows': failed}
+        else:
+            segments_data = {'segments': request_segments(), 'failed_windows': []}
         
         # Create master character name list for validation
         master_char_names = []
@@ -195,18 +349,23 @@ Total Characters: {len(char_list)}
         print("Processing segments with enhanced validation...")
         validated_segments = []
         
-        for seg in segments_data.get('segments', []):
+        # Convert MM:SS format to seconds and cap every segment to 30s at once
+        raw_segments = segments_data.get('segments', [])
+        raw_starts = [mmss_to_seconds(seg.get('start_timestamp', '00:00')) for seg in raw_segments]
+        raw_ends = [mmss_to_seconds(seg.get('end_timestamp', '00:00')) for seg in raw_segments]
+        capped = clamp_intervals(raw_starts, raw_ends, max_length=30)
+        # Check every summary for timestamp boundary markers in one pass
+        validation_results = validate_all_timestamp_markers(raw_segments)
+        
+        for i, seg in enumerate(raw_segments):
             segment_id = seg.get('segment_id', 'unknown')
-            # Convert MM:SS format to seconds
-            start = mmss_to_seconds(seg.get('start_timestamp', '00:00'))
-            end = mmss_to_seconds(seg.get('end_timestamp', '00:00'))
+            start = float(capped.starts[i])
+            end = float(capped.ends[i])
             
             # Check segment duration
-            segment_duration = end - start
-            if segment_duration > 30:
-                print(f"⚠️  Warning: Segment {segment_id} exceeds 30s limit ({segment_duration}s)")
-                print(f"   Original: {seconds_to_mmss(start)} - {seconds_to_mmss(end)}")
-                end = start + 30
+            if capped.capped[i]:
+                print(f"⚠️  Warning: Segment {segment_id} exceeds 30s limit ({raw_ends[i] - raw_starts[i]}s)")
+                print(f"   Original: {seconds_to_mmss(raw_starts[i])} - {seconds_to_mmss(raw_ends[i])}")
                 print(f"   Adjusted: {seconds_to_mmss(start)} - {seconds_to_mmss(end)}")
             
             # Extract boundary verification data
@@ -238,22 +397,25 @@ Total Characters: {len(char_list)}
                 continue
                 
             # Run enhanced validation with auto-correction suggestions
-            validation_result = validate_timestamp_markers(seg)
+            validation_result = validation_results[i]
             
             if validation_result['needs_adjustment']:
                 print(f"⚠️  Validation issues in segment {segment_id}:")
                 for issue in validation_result['issues']:
                     print(f"   - {issue}")
                 
-                # Apply suggested adjustments
+                # Apply suggested adjustments, clamped to the video once every segment is validated.
+                # Word timings give exact boundaries, which replace these guesses.
                 suggestions = validation_result['suggestions']
-                if suggestions['adjust_start'] != 0:
-                    new_start = max(0, start + suggestions['adjust_start'])
+                if word_timings:
+                    print(f"   → Boundaries will be snapped to the transcript words")
+                elif suggestions['adjust_start'] != 0:
+                    new_start = start + suggestions['adjust_start']
                     print(f"   → Adjusting start from {start}s to {new_start}s")
                     start = new_start
                 
-                if suggestions['adjust_end'] != 0:
-                    new_end = min(duration, end + suggestions['adjust_end'])
+                if not word_timings and suggestions['adjust_end'] != 0:
+                    new_end = end + suggestions['adjust_end']
                     print(f"   → Adjusting end from {end}s to {new_end}s")
                     end = new_end
                 
@@ -279,11 +441,38 @@ Total Characters: {len(char_list)}
             else:
                 print(f"⚠️  Skipping segment {segment_id} due to low confidence score")
         
+        # Clamp the adjusted segments to the video
+        bounds = clamp_intervals(
+            [seg['start_timestamp'] for seg in validated_segments],
+            [seg['end_timestamp'] for seg in validated_segments],
+            duration=duration,
+        )
+        starts, ends = bounds.starts, bounds.ends
+        if shot_boundaries:
+            # Move the segment boundaries to the nearest shot cuts, unless a segment would end up empty
+            snapped_starts = snap_times(starts, shot_boundaries)
+            snapped_ends = snap_times(ends, shot_boundaries)
+            keep = snapped_ends > snapped_starts
+            starts = np.where(keep, snapped_starts, starts)
+            ends = np.where(keep, snapped_ends, ends)
+            print(f"Snapped segment boundaries to {len(shot_boundaries)} shot cuts")
+        for seg, start, end in zip(validated_segments, starts.tolist(), ends.tolist()):
+            if word_timings:
+                # Keep the segment out of the spoken words, unless it would end up empty
+                snapped_start = word_timings.snap(start, 'start')
+                snapped_end = word_timings.snap(end, 'end')
+                if snapped_end > snapped_start:
+                    start, end = snapped_start, snapped_end
+            seg['start_timestamp'] = start
+            seg['end_timestamp'] = end
+        
         # Return the validated segments with video overview if provided
         result = {
             'segments': validated_segments,
             'total_segments': len(validated_segments),
-            'video_duration': duration
+            'video_duration': duration,
+            # Windows whose segments are missing from the timeline
+            'failed_windows': segments_data['failed_windows'],
         }
         
         # Include video overview data if available
@@ -300,22 +489,22 @@ Total Characters: {len(char_list)}
 
 ## Function to detect overlaps between segments and suggest boundary smoothing
 
-def analyze_reel_flow(segments_data: Dict[str, Any], target_duration: int, model_id: str = 'gemini-2.5-pro') -> Optional[Dict[str, Any]]:
+def analyze_reel_flow(segments_data: Dict[str, Any], target_duration: int, model_id: str = 'gemini-2.5-pro', bypass_cache: bool = False) -> Optional[Dict[str, Any]]:
     """
-    Step 3: Use Gemini AI to analyze and select best segments for reel with boundary smoothing.
+    Step 3: Select the best segments for the reel, with boundary smoothing.
+    Segments are selected locally by reel_selector unless REEL_SELECTION_MODE is "llm",
+    in which case Gemini picks them.
     
     Args:
         segments_data: Output from chunk_video_segments
         target_duration: Target duration for the reel
         model_id: Gemini model to use
+        bypass_cache: Skip the response cache lookup
         
     Returns:
         Dict with selected segments or None if failed
     """
     try:
-        # Initialize Vertex AI client
-        client = initialize_vertex_client()
-        
         # Filter segments by confidence if available
         high_confidence_segments = [
             seg for seg in segments_data['segments']
@@ -328,27 +517,39 @@ def analyze_reel_flow(segments_data: Dict[str, Any], target_duration: int, model
         # Use high confidence segments if available, otherwise use all
         segments_to_analyze = high_confidence_segments if high_confidence_segments else segments_data['segments']
         
-        # Prepare the prompt
-        prompt = REEL_ANALYSIS_PROMPT.format(
-            target_duration=target_duration,
-            min_duration=min(90, target_duration),
-            max_duration=120,
-            segments=json.dumps(segments_to_analyze, indent=2)
-        )
-        
-        # Generate analysis using Vertex AI client
-        print(f"Selecting best segments for highlight reel...")
-        response = client.models.generate_content(
-            model=model_id,
-            contents=[prompt],
-        )
-        
-        # Parse the response
-        response_text = response.text
-        
-        # Extract and parse JSON
-        json_text = extract_json_from_response(response_text)
-        selection_data = json.loads(json_text)
+        if REEL_SELECTION_MODE != 'llm':
+            # Deterministic selection, without a model round trip
+            print(f"Selecting best segments for highlight reel locally...")
+            selection_data = select_reel_segments(
+                segments_to_analyze,
+                target_duration,
+                segments_data.get('video_overview'),
+            )
+        else:
+            # Initialize Vertex AI client
+            client = initialize_vertex_client()
+
+            # Prepare the prompt
+            prompt = REEL_ANALYSIS_PROMPT.format(
+                target_duration=target_duration,
+                min_duration=min(90, target_duration),
+                max_duration=120,
+                segments=json.dumps(segments_to_analyze, indent=2)
+            )
+            
+            # Generate analysis using Vertex AI client
+            print(f"Selecting best segments for highlight reel...")
+            response_text = generate_text_cached(
+                client,
+                model_id,
+                [prompt],
+                bypass_cache=bypass_cache,
+                task="reel_flow",
+            )
+            
+            # Extract and parse JSON
+            json_text = extract_json_from_response(response_text)
+            selection_data = json.loads(json_text)
         
         # Sort selected segments by order
         selected_segments = sorted(
@@ -358,12 +559,9 @@ def analyze_reel_flow(segments_data: Dict[str, Any], target_duration: int, model
         
         # Check for overlaps
         print("Checking for segment overlaps...")
-        overlaps = []
-        for i in range(len(selected_segments) - 1):
-            overlap = detect_segment_overlap(selected_segments[i], selected_segments[i + 1])
-            if overlap:
-                overlaps.append(overlap)
-                print(f"⚠️  Overlap detected: {overlap['duration']}s between segments {overlap['segments']}")
+        overlaps = detect_overlaps(selected_segments)
+        for overlap in overlaps:
+            print(f"⚠️  Overlap detected: {overlap['duration']}s between segments {overlap['segments']}")
         
         # Smooth boundaries if needed
         if any(seg.get('alignment_validated') for seg in selected_segments):
@@ -389,7 +587,8 @@ def analyze_reel_flow(segments_data: Dict[str, Any], target_duration: int, model
         return None
 
 
-def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-2.5-pro') -> Dict[str, Any]:
+def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-2.5-pro', bypass_cache: bool = False, shot_boundaries: Optional[List[float]] = None, word_timings: Optional[WordTimings] = None,
+                          asset_id: Optional[str] = None, asset_manager=None) -> Dict[str, Any]:
     """
     Main orchestrator function for the 4-step highlight reel generation process.
     
@@ -397,6 +596,11 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         video_url: GCS video URL fetched from Firestore
         duration: Video duration in seconds fetched from Firestore
         model_id: AI model to use
+        bypass_cache: Skip the response cache lookups
+        shot_boundaries: Optional shot boundaries in seconds (video_details.shot_index), segments are snapped to
+        word_timings: Optional transcript word timings (WordTimings.from_asset), segments are snapped to
+        asset_id: Optional asset ID, the video steps then share the asset's context cache
+        asset_manager: MediaAssetManager recording the context cache, required with asset_id
         
     Returns:
         Dict with success status and generated HTML or error message
@@ -410,7 +614,7 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         print(f"Starting highlight reel generation for: {video_url}")
         # Step 1: Get video overview with master character list
         print("\n=== Step 1: Analyzing video overview ===")
-        video_overview = analyze_video_overview(video_url, duration,model_id)
+        video_overview = analyze_video_overview(video_url, duration, model_id, bypass_cache, asset_id, asset_manager)
         if video_overview:
             print(f"✓ Video title: {video_overview.get('video_title', 'N/A')}")
             print(f"✓ Found {len(video_overview.get('master_character_list', []))} characters")
@@ -422,7 +626,7 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         
         # Step 2: Chunk video into segments with character validation
         print("\n=== Step 2: Chunking video into segments ===")
-        segments_data = chunk_video_segments(video_url, duration, video_overview, model_id)
+        segments_data = chunk_video_segments(video_url, duration, video_overview, model_id, bypass_cache, shot_boundaries, word_timings, asset_id, asset_manager)
         if not segments_data:
             return {
                 'success': False,
@@ -432,7 +636,7 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         print(f"Successfully chunked video into {segments_data['total_segments']} segments")
 
         # Step 3: Analyze and select best segments
-        selection_data = analyze_reel_flow(segments_data, target_duration, model_id)
+        selection_data = analyze_reel_flow(segments_data, target_duration, model_id, bypass_cache)
         if not selection_data:
             return {
                 'success': False,
@@ -446,30 +650,25 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         # Step 4: Concatenate selected segments into final highlight reel
         print("\n=== Step 4: Creating final highlight reel ===")
         
+        segment_times = []
+        for segment in selected_segments:
+            start_time = segment['start_timestamp']
+            end_time = segment['end_timestamp']
+            print(f"Adding segment {segment['segment_id']} ({start_time:.2f}s - {end_time:.2f}s)...")
+            segment_times.append((start_time, end_time))
+
         with tempfile.TemporaryDirectory() as temp_dir:
+            # Only the bytes of the selected segments are fetched when the source allows it
             print(f"Downloading source video from {video_url}...")
             try:
-                local_video_path = download_from_gcs(video_url, temp_dir)
+                local_video_path = download_from_gcs(video_url, temp_dir, time_ranges=segment_times)
             except Exception as e:
                 print(f"Error downloading video from GCS: {e}")
                 return {'success': False, 'error': f'Failed to download video from GCS: {e}'}
 
-            segment_paths = []
-            with VideoFileClip(local_video_path) as video:
-                for i, segment in enumerate(selected_segments):
-                    start_time = segment['start_timestamp']
-                    end_time = segment['end_timestamp']
-                    segment_id = segment['segment_id']
-                    
-                    print(f"Clipping segment {segment_id} ({start_time:.2f}s - {end_time:.2f}s)...")
-                    clip_path = os.path.join(temp_dir, f"segment_{i+1}_{segment_id}.mp4")
-                    
-                    subclip = video.subclipped(start_time, end_time)
-                    subclip.write_videofile(clip_path, codec="libx264", audio_codec="aac", logger=None)
-                    segment_paths.append(clip_path)
-
+            # The reel is rendered in one pass straight from the source timestamps
             output_file_name = f"highlight_{os.path.basename(video_url).split('.')[0]}.mp4"
-            output_highlight_path = create_final_highlight_reel(segment_paths, output_path=output_file_name)
+            output_highlight_path = render_highlight_reel(local_video_path, segment_times, output_path=output_file_name)
 
             #Upload to GCS
             if output_highlight_path:
@@ -485,7 +684,8 @@ def create_highlight_reel(video_url: str,duration: int, model_id: str = 'gemini-
         
                 gcs_uri = f"gs://{BUCKET_NAME}/{DESTINATION_BLOB_NAME}"
                 print(f"✓ Successfully uploaded highlight to GCS: {gcs_uri}")
-                return {'success': True, 'output_path': output_highlight_path}
+                # A reel built from a partial timeline is reported along with the missing windows
+                return {'success': True, 'output_path': output_highlight_path, 'failed_windows': segments_data['failed_windows']}
             else:
                 return {'success': False, 'error': 'Failed to create final highlight reel'}
 
@@ -2,9 +2,11 @@
 
 import os
 import json
+import time
 import base64
 import logging
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
 from flask import Flask, request
 
 from google import genai
@@ -12,13 +14,45 @@ from google.genai import types
 
 from common.media_asset_manager import MediaAssetManager
 from common.logging_config import configure_logger
+from common.context_cache import get_or_create_video_cache
+from common.generation_profiles import get_generation_profile, record_generation_metrics
+from common.llm_retry import call_with_retries
+from common.timecodes import timecode_to_seconds
+from common.json_stream import (
+    stream_generate_content,
+    streaming_enabled,
+    stream_partial_writes,
+    TruncatedResponseError,
+)
+from common.video_input import (
+    resolve_video_input,
+    build_video_part,
+    can_use_context_cache,
+    get_asset_duration,
+)
+from common.response_cache import (
+    response_cache,
+    build_cache_key,
+    get_source_checksum,
+    is_json_response,
+)
+from common.media_probe import probe_media, signed_url
+from common.shot_detection import (
+    shot_detection_enabled,
+    detect_shots,
+    get_shot_boundaries,
+    has_shot_index,
+    snap_timecodes,
+)
+from common.word_timings import WordTimings, snap_to_words
+from common.poster_frames import poster_enabled, is_placeholder_poster, generate_poster
+from common.frame_grabber import thumbnails_enabled, attach_thumbnails
 
 from .structured_output_schema import SHORTS_SCHEMA
+from .prompts import SHORTS_PROMPT, SHORTS_SYSTEM_INSTRUCTION
 
 
 # Highlight Generation service Imports
-import tempfile
-import moviepy as mp
 from google.cloud import storage
 from google.cloud import firestore
 
@@ -49,7 +83,13 @@ def generate(
     source,
     system_instruction_text,
     response_schema,
-    model_name=llm_model,
+    model_name=None,
+    asset_id=None,
+    bypass_cache=False,
+    task="default",
+    video_input=None,
+    on_partial=None,
+    source_checksum=None,
 ) -> str:
     """ "
     Invokes a generative AI model with a video and text prompt to generate structured data.
@@ -60,46 +100,107 @@ def generate(
         source (str): The source of the video, e.g., "GCS" or "youtube".
         system_instruction_text (str): The system instruction for the model.
         response_schema (dict): The schema for the expected JSON output.
-        model_name (str): The name of the generative model to use (default: "gemini-2.5-pro").
+        model_name (str, optional): Overrides the model of the task's generation profile.
+        asset_id (str, optional): The ID of the asset. When provided, the video is
+            referenced through the asset's shared context cache instead of being sent inline.
+        bypass_cache (bool, optional): Skip the response cache lookup and always call the model.
+        task (str, optional): The generation profile to use (e.g., "summary", "shorts").
+        video_input (dict, optional): Video input settings from resolve_video_input
+            (media resolution, frame sampling rate and start/end offsets).
+        on_partial (callable, optional): Called with an array key and its complete
+            items as they stream in (see common.json_stream).
+        source_checksum (str, optional): The checksum of the video carried by the
+            message, which keys the response cache without looking the object up.
+
+    Raises:
+        TruncatedResponseError: The streamed response is not a complete JSON
+            document. Its partial attribute holds the salvaged document when
+            complete array items were received.
 
     Returns:
         str: The generated JSON string response from the model.
 
     """
+    profile = get_generation_profile(task, default_model=llm_model)
+    if model_name:
+        profile["model"] = model_name
+    model_name = profile["model"]
     logger.info(f"Using model: {model_name}")
+    # The task's video input settings take precedence over the profile's resolution.
+    video_input = dict(video_input or {})
+    video_input["media_resolution"] = (
+        video_input.get("media_resolution") or profile["media_resolution"]
+    )
+
+    # Byte-identical requests are answered from the persistent response cache.
+    cache_key = None
+    if response_cache.enabled:
+        source_checksum = get_source_checksum(video_uri, source, source_checksum)
+        if source_checksum:
+            cache_key = build_cache_key(
+                source_checksum,
+                f"{system_instruction_text}\n{prompt_text}",
+                response_schema,
+                model_name,
+                {**profile, "video_input": video_input},
+            )
+            cached_response = response_cache.get(cache_key, bypass_cache)
+            if cached_response is not None:
+                return cached_response
+
     client = genai.Client(
         vertexai=True,
         project=project_id,
         location="global",
     )
 
-    # Prepare the user prompt parts: one for the text instruction and one for the video file.
-    msg1_text1 = types.Part.from_text(text=prompt_text)
-    msg1_video1 = types.Part.from_uri(
-       file_uri=video_uri,
-        mime_type="video/youtube" if source == "youtube" else "video/*",
-    )
-    msg1_video1 = types.Part.from_uri(
-       file_uri=video_uri,
-        mime_type="video/*",
-    )
+    # Reference the video through the asset's shared context cache when possible.
+    cached_content = None
+    if asset_id and source != "youtube" and can_use_context_cache(video_input):
+        cached_content = get_or_create_video_cache(
+            client,
+            asset_manager,
+            asset_id,
+            video_uri,
+            model_name,
+            fps=video_input.get("fps"),
+        )
 
-    # The system instruction guides the model's behavior and persona.
-    si_text1 = system_instruction_text
+    if cached_content:
+        # Requests using a cache cannot carry their own system instruction,
+        # so it is sent along with the prompt instead.
+        msg1_text1 = types.Part.from_text(
+            text=f"{system_instruction_text}\n\n{prompt_text}"
+        )
+        contents = [
+            types.Content(role="user", parts=[msg1_text1]),
+        ]
+        system_instruction = None
+    else:
+        # Prepare the user prompt parts: one for the text instruction and one for the video file.
+        msg1_text1 = types.Part.from_text(text=prompt_text)
+        msg1_video1 = build_video_part(
+            video_uri,
+            "video/youtube" if source == "youtube" else "video/*",
+            video_input,
+        )
 
-    # Combine the parts into a single user content block.
-    contents = [
-        types.Content(role="user", parts=[msg1_text1, msg1_video1]),
-    ]
+        # Combine the parts into a single user content block.
+        contents = [
+            types.Content(role="user", parts=[msg1_text1, msg1_video1]),
+        ]
+        # The system instruction guides the model's behavior and persona.
+        system_instruction = [types.Part.from_text(text=system_instruction_text)]
 
     # Configure the generation settings for the model.
     generate_content_config = types.GenerateContentConfig(
         # Model creativity and determinism settings.
-        temperature=1,
+        temperature=profile["temperature"],
         top_p=1,
         seed=0,
         # Enforce JSON output according to the provided schema.
-        max_output_tokens=65535,
+        max_output_tokens=profile["max_output_tokens"],
+        media_resolution=video_input["media_resolution"],
         response_mime_type="application/json",
         response_schema=response_schema,
         # Disable safety filters to allow processing of a wide range of content.
@@ -114,33 +215,107 @@ def generate(
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ],
         # Set the system-level instructions for the model.
-        system_instruction=[types.Part.from_text(text=si_text1)],
+        system_instruction=system_instruction,
+        cached_content=cached_content,
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=profile["thinking_budget"],
         ),
     )
 
     # Send the request to the generative model.
-    response = client.models.generate_content(
-        model=model_name,
-        contents=contents,
-        config=generate_content_config,
-    )
+    started_at = time.monotonic()
+    try:
+        if streaming_enabled:
+            # Streaming surfaces complete items before the response ends and
+            # keeps them when the response gets truncated.
+            response_text, response, parser = call_with_retries(
+                lambda: stream_generate_content(
+                    client, model_name, contents, generate_content_config, on_partial
+                ),
+                task=task,
+                asset_id=asset_id,
+            )
+        else:
+            response = call_with_retries(
+                lambda: client.models.generate_content(
+                    model=model_name,
+                    contents=contents,
+                    config=generate_content_config,
+                ),
+                task=task,
+                asset_id=asset_id,
+            )
+            response_text, parser = response.text, None
+    except Exception:
+        record_generation_metrics(task, profile, started_at, asset_id=asset_id)
+        raise
+    record_generation_metrics(task, profile, started_at, response, asset_id)
+
+    # Only well-formed responses are cached so that retries can recover from bad ones.
+    if is_json_response(response_text):
+        if cache_key:
+            response_cache.set(cache_key, response_text)
+    elif parser:
+        # A truncated response is never returned as a complete one. Its complete
+        # array items travel with the error for the callers accepting partial results.
+        logger.warning(
+            "Response for task '%s' is truncated.",
+            task,
+            extra={"extra_fields": {"asset_id": asset_id, "task": task}},
+        )
+        raise TruncatedResponseError(task, parser.salvage_items())
 
-    return response.text
+    return response_text
 
 
-def generate_previews(asset_id: str, file_location: str, source: str) -> Union[list, dict]:
+def _partial_clips_writer(asset_id: str):
+    """
+    Returns an on_partial callback writing the clips received so far to the
+    asset while the response streams, or None when partial writes are
+    disabled. Clips without parsable timecodes are held back.
+    """
+    if not stream_partial_writes:
+        return None
+
+    def write_clips(key, items):
+        if key is not None:
+            return
+        clips = [
+            clip
+            for clip in items
+            if isinstance(clip, dict)
+            and timecode_to_seconds(clip.get("start_timecode")) is not None
+            and timecode_to_seconds(clip.get("end_timecode")) is not None
+        ]
+        asset_manager.update_asset_metadata(asset_id, "previews", {"clips": clips})
+
+    return write_clips
+
+
+def generate_previews(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
+) -> Union[list, dict]:
     """
     Generates a list of potential short video clips from a media asset using Gemini.
 
     Args:
         asset_id (str): The ID of the asset.
         file_location (str): GCS URI of the media file (e.g., gs://bucket/path/to/file.mp4).
+        source (str): The source of the media file (e.g., "GCS", "youtube").
+        bypass_cache (bool): Skip response cache lookups and always call the model.
+        duration (Optional[float]): Asset duration in seconds, used to pick the video input settings.
+        source_checksum (Optional[str]): The checksum of the media file from the message,
+            used to key the response cache.
 
     Returns:
-        Union[list, dict]: A list of preview clips on success, 
-        or a dictionary with an 'error' key on failure.
+        Union[list, dict]: A list of preview clips on success, a dictionary
+        with the complete 'clips' and a 'partial' reason when the response was
+        truncated, or a dictionary with an 'error' key on failure.
     """
     # Initialize raw_response to ensure it's available for the exception block
     raw_response = ""
@@ -154,22 +329,18 @@ def generate_previews(asset_id: str, file_location: str, source: str) -> Union[l
     
 
     try:
-        # Define the system instructions and user prompt for the model.
-        system_instructions_text = """
-        You are helping an entertainment company create shorts out of their entertainment titles. 
-        You are able to identify the scenes that would make users see the full title."""
-        prompt = """
-        Give me five key scenes that would work as a trailer for the content. 
-        Minimum scene duration should be 30 seconds.
-        No spoilers should be included. No results should be shown on screen.
-        """
         raw_response = generate(
-            prompt,
+            SHORTS_PROMPT,
             file_location,
             source,
-            system_instructions_text,
+            SHORTS_SYSTEM_INSTRUCTION,
             SHORTS_SCHEMA,
-            model_name=llm_model,
+            task="shorts",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("shorts", duration),
+            on_partial=_partial_clips_writer(asset_id),
         )
         # Parse the JSON string response into a Python list.
         shorts_data = json.loads(raw_response)
@@ -179,6 +350,25 @@ def generate_previews(asset_id: str, file_location: str, source: str) -> Union[l
         )
         return shorts_data
 
+    except TruncatedResponseError as e:
+        # The complete clips of a truncated response are kept, flagged as partial.
+        if not isinstance(e.partial, list) or not e.partial:
+            logger.error(
+                "Previews response for asset %s is truncated before any complete clip.",
+                asset_id,
+                extra=log_extra,
+            )
+            return {"error": f"Truncated response from model: {e}"}
+        logger.warning(
+            "Previews response for asset %s is truncated, keeping %d complete clips.",
+            asset_id,
+            len(e.partial),
+            extra=log_extra,
+        )
+        return {
+            "clips": e.partial,
+            "partial": f"Response truncated after {len(e.partial)} clips",
+        }
     except json.JSONDecodeError:
         # Handle cases where the model's output is not valid JSON.
         logger.error(
@@ -199,68 +389,197 @@ def generate_previews(asset_id: str, file_location: str, source: str) -> Union[l
         )
         return {"error": f"Failed to generate previews: {str(e)}"}
 
-def create_video_metadata(bucket_name, source_blob_name,collection_name):
+
+def _signed_source_url(file_location: str) -> str:
+    """Signs a short-lived URL of a video, which ffmpeg streams instead of downloading the file."""
+    bucket_name, _, blob_name = file_location.replace("gs://", "", 1).partition("/")
+    return signed_url(storage_client.bucket(bucket_name).blob(blob_name))
+
+
+def load_shot_boundaries(
+    asset_id: str, asset_data: Optional[dict], file_location: str
+) -> List[float]:
     """
-    Downloads a video from a GCS bucket, extracts its duration,
-    ,stores the metadata in a Firestore document
-    and returns the document ID.
+    Returns the shot boundaries of a video asset, detecting its shots and
+    storing the shot index under video_details when the asset has none yet.
+    Detection is bounded by SHOT_DETECTION_TIME_BUDGET_SECONDS; past it the
+    index only covers the start of the video.
 
     Args:
-        bucket_name (str): The name of the GCS bucket.
-        source_blob_name (str): The full path to the video object in the bucket.
-        collection_name (str): The Firestore collection name to store the metadata.
+        asset_id (str): The ID of the asset.
+        asset_data (Optional[dict]): The asset document.
+        file_location (str): GCS URI of the video.
+
+    Returns:
+        List[float]: The shot boundaries in seconds, empty when unavailable.
     """
-    
-    # 1. Download the video to a temporary local file.
-    # We use a temporary file to avoid cluttering the system and
-    # ensure it's deleted automatically.
-    
-    # Create a temporary file with a .mp4 extension for moviepy to recognize it.
-    temp_file = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
-    temp_file_path = temp_file.name
-    temp_file.close()
+    if has_shot_index(asset_data) or not shot_detection_enabled:
+        return get_shot_boundaries(asset_data)
+    if (asset_data or {}).get(
+        "file_category"
+    ) != "video" or not file_location.startswith("gs://"):
+        return []
 
+    log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
     try:
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(source_blob_name)
-        #local_path = os.path.join(temp_dir, os.path.basename(blob_name))
-        
-        print(f"Downloading {source_blob_name} from bucket {bucket_name} to {temp_file_path}...")
-        blob.download_to_filename(temp_file_path)
-        print("Download complete.")
-
-        # 2. Use moviepy to get the video metadata.
-        # This is a much more efficient and reliable method for technical metadata
-        # like duration, as opposed to a large language model.
-        try:
-            video_clip = mp.VideoFileClip(temp_file_path)
-            duration_seconds = video_clip.duration
-            print(f"Video duration: {duration_seconds} seconds")
-            
-            # Close the video clip to release the file handle
-            video_clip.close()
-
-        except Exception as e:
-            print(f"Error processing video with moviepy: {e}")
-            return
+        started = time.time()
+        shot_index = detect_shots(_signed_source_url(file_location))
+    except Exception:
+        logger.warning(
+            "Shot detection failed for asset %s",
+            asset_id,
+            exc_info=True,
+            extra=log_extra,
+        )
+        return []
 
-        # 3. Store the metadata in a Firestore document.
-        # The document will be created in the 'video_metadata' collection.
-        metadata = {
-            #'video_path': f"gs://{bucket_name}/{source_blob_name}",
-            'duration_seconds': duration_seconds,
-            'timestamp': firestore.SERVER_TIMESTAMP
-        }
+    logger.info(
+        "Detected %d shots for asset %s in %.1fs (%s)",
+        shot_index["shot_count"],
+        asset_id,
+        time.time() - started,
+        (
+            "complete"
+            if shot_index["complete"]
+            else f"first {shot_index['duration']}s only"
+        ),
+        extra=log_extra,
+    )
+    asset_manager.update_asset_metadata(
+        asset_id, "video_details", {"shot_index": shot_index}
+    )
+    return shot_index["boundaries"]
 
-        doc_ref = firestore_client.collection('video_metadata').add(metadata)
-        print(f"Metadata for {source_blob_name} stored in Firestore with ID: {doc_ref[1].id}")
-        return doc_ref[1].id
 
-    finally:
-        # Clean up the temporary file, regardless of success or failure.
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            print(f"Cleaned up temporary file: {temp_file_path}")
+def create_poster(
+    asset_id: str,
+    asset_data: Optional[dict],
+    file_location: str,
+    duration: Optional[float],
+    shot_boundaries: List[float],
+) -> None:
+    """
+    Replaces the placeholder poster of a video asset with its best scoring
+    keyframe, uploaded at a few sizes. Failures are logged and leave the
+    placeholder in place.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        asset_data (Optional[dict]): The asset document.
+        file_location (str): GCS URI of the video.
+        duration (Optional[float]): The video duration in seconds.
+        shot_boundaries (List[float]): The shot boundaries from load_shot_boundaries.
+    """
+    asset_data = asset_data or {}
+    if not poster_enabled or not is_placeholder_poster(asset_data.get("poster_url")):
+        return
+    if (
+        asset_data.get("file_category") != "video"
+        or not file_location.startswith("gs://")
+        or not duration
+    ):
+        return
+
+    log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
+    try:
+        poster = generate_poster(
+            asset_id,
+            file_location,
+            _signed_source_url(file_location),
+            duration,
+            storage_client,
+            shot_boundaries,
+        )
+    except Exception:
+        logger.warning(
+            "Poster generation failed for asset %s",
+            asset_id,
+            exc_info=True,
+            extra=log_extra,
+        )
+        return
+    if not poster:
+        logger.warning(
+            "No poster frame could be decoded for asset %s", asset_id, extra=log_extra
+        )
+        return
+
+    asset_manager.update_asset_metadata(
+        asset_id, "poster_url", {"poster_url": poster["poster_url"]}
+    )
+    asset_manager.update_asset_metadata(
+        asset_id,
+        "video_details",
+        {"posters": poster["posters"], "poster_timestamp": poster["timestamp"]},
+    )
+
+
+def add_clip_thumbnails(
+    asset_id: str, asset_data: Optional[dict], file_location: str, clips: list
+) -> None:
+    """
+    Attaches a thumbnail_url to every clip of a video asset, grabbing all
+    the frames with a single ffmpeg invocation. Failures are logged and
+    leave the clips without thumbnails.
+    """
+    if (
+        not thumbnails_enabled
+        or (asset_data or {}).get("file_category") != "video"
+        or not file_location.startswith("gs://")
+    ):
+        return
+    try:
+        attach_thumbnails(
+            clips,
+            "start_timecode",
+            "end_timecode",
+            asset_id,
+            "clips",
+            file_location,
+            _signed_source_url(file_location),
+            storage_client,
+        )
+    except Exception:
+        logger.warning(
+            "Could not create the clip thumbnails for asset %s",
+            asset_id,
+            exc_info=True,
+            extra={"extra_fields": {"asset_id": asset_id}},
+        )
+
+
+def create_video_metadata(bucket_name, source_blob_name,collection_name):
+    """
+    Probes a video in a GCS bucket for its duration without downloading it,
+    stores the metadata in a Firestore document
+    and returns the document ID.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        source_blob_name (str): The full path to the video object in the bucket.
+        collection_name (str): The Firestore collection name to store the metadata.
+    """
+    # 1. Probe the video through ranged reads of its header (or ffprobe on a signed URL).
+    gcs_uri = f"gs://{bucket_name}/{source_blob_name}"
+    print(f"Probing {gcs_uri}...")
+    probe = probe_media(gcs_uri, storage_client)
+    if not probe or not probe.get("duration"):
+        print(f"Error probing video {gcs_uri}")
+        return
+    duration_seconds = probe["duration"]
+    print(f"Video duration: {duration_seconds} seconds")
+
+    # 2. Store the metadata in a Firestore document.
+    # The document will be created in the 'video_metadata' collection.
+    metadata = {
+        #'video_path': f"gs://{bucket_name}/{source_blob_name}",
+        'duration_seconds': duration_seconds,
+        'timestamp': firestore.SERVER_TIMESTAMP
+    }
+
+    doc_ref = firestore_client.collection('video_metadata').add(metadata)
+    print(f"Metadata for {source_blob_name} stored in Firestore with ID: {doc_ref[1].id}")
+    return doc_ref[1].id
 
 @app.route("/", methods=["POST"])
 def handle_message():
@@ -286,6 +605,10 @@ def handle_message():
         file_location = message_data.get("file_location")
         file_name = message_data.get("file_name")
         source = message_data.get("source", "GCS")
+        # Replayed or backfill messages can force fresh model calls.
+        bypass_cache = bool(message_data.get("bypass_cache", False))
+        # Facts probed by the dispatcher at ingest, when available.
+        video_details = message_data.get("video_details") or {}
 
         
         #log all input params
@@ -323,7 +646,43 @@ def handle_message():
             asset_id, "previews", {"status": "processing"}
         )
         # Trigger the core logic to generate preview clips.
-        preview_results = generate_previews(asset_id, file_location, source)
+        asset_data = asset_manager.get_asset(asset_id)
+        duration = video_details.get("duration") or get_asset_duration(asset_data)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # The shots are detected, then the poster is scored on them, while the model generates the clips
+            shot_boundaries = executor.submit(
+                load_shot_boundaries, asset_id, asset_data, file_location
+            )
+            executor.submit(
+                lambda: create_poster(
+                    asset_id,
+                    asset_data,
+                    file_location,
+                    duration,
+                    shot_boundaries.result(),
+                )
+            )
+            preview_results = generate_previews(
+                asset_id,
+                file_location,
+                source,
+                bypass_cache,
+                duration,
+                video_details.get("checksum"),
+            )
+            clips = (
+                preview_results.get("clips")
+                if isinstance(preview_results, dict)
+                else preview_results
+            )
+            if isinstance(clips, list):
+                # Move the clip boundaries to the nearest shot cuts, then out of the spoken words
+                snap_timecodes(
+                    clips, "start_timecode", "end_timecode", shot_boundaries.result()
+                )
+                word_timings = WordTimings.from_asset(asset_manager.get_asset(asset_id))
+                snap_to_words(clips, "start_timecode", "end_timecode", word_timings)
+                add_clip_thumbnails(asset_id, asset_data, file_location, clips)
 
         #### Trigger the core logic to generate highlights only do this if source != 'youtube'
         # video_file_name= file_name +".mp4"
@@ -341,7 +700,7 @@ def handle_message():
         # model_id=llm_model
 
         # print(f"Creating Highlight Reel... for {file_name}")
-        # create_highlight_reel(file_location,duration,model_id)
+        # create_highlight_reel(file_location,duration,model_id,asset_id=asset_id,asset_manager=asset_manager)
 
 
 
@@ -356,6 +715,20 @@ def handle_message():
                 preview_error,
                 extra=log_extra,
             )
+        elif isinstance(preview_results, dict) and "partial" in preview_results:
+            # A truncated response keeps its complete clips, recorded as a partial result.
+            update_data = {
+                "status": "partial_success",
+                "clips": preview_results["clips"],
+                "error_message": preview_results["partial"],
+            }
+            asset_manager.update_asset_metadata(asset_id, "previews", update_data)
+            logger.warning(
+                "Preview generation for asset %s is incomplete: %s",
+                asset_id,
+                preview_results["partial"],
+                extra=log_extra,
+            )
         elif isinstance(preview_results, list):
             # The successful result is a list of clips, which we store in the 'clips' field.
             update_data = {
@@ -275,4 +275,14 @@ Given a video segment with timestamps and summary, you will:
 - Summary describes action that continues after the timestamp
 - First action in summary doesn't match start timestamp
 - Last action in summary doesn't match end timestamp
-- Characters mentioned who don't appear in the time range"""
\ No newline at end of file
+- Characters mentioned who don't appear in the time range"""
+
+SHORTS_SYSTEM_INSTRUCTION = """
+        You are helping an entertainment company create shorts out of their entertainment titles. 
+        You are able to identify the scenes that would make users see the full title."""
+
+SHORTS_PROMPT = """
+        Give me five key scenes that would work as a trailer for the content. 
+        Minimum scene duration should be 30 seconds.
+        No spoilers should be included. No results should be shown on screen.
+        """
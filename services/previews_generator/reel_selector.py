@@ -0,0 +1,108 @@
+#Required Imports
+import os
+import bisect
+import math
+from typing import Dict, Any, List, Optional
+
+# "local" selects reel segments with select_reel_segments, "llm" asks the model.
+REEL_SELECTION_MODE = os.environ.get("REEL_SELECTION_MODE", "local").lower()
+
+# Weight of a segment's tension level in its score.
+TENSION_WEIGHTS = {"high": 1.3, "medium": 1.0, "low": 0.8}
+
+
+def segment_value(segment: Dict[str, Any]) -> float:
+    """
+    Score of a segment per second of reel: its importance, weighted by its
+    tension level and by the confidence of its timestamp validation.
+    """
+    importance = segment.get('importance_score') or 5
+    tension = TENSION_WEIGHTS.get(str(segment.get('tension_level', 'medium')).lower(), 1.0)
+    confidence = (segment.get('validation_confidence') or 10) / 10
+    return importance * tension * confidence
+
+
+def select_reel_segments(segments: List[Dict[str, Any]], target_duration: float,
+                         video_overview: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Selects the reel segments locally, as a knapsack over non-overlapping segments.
+
+    Segments are sorted by end time and a dynamic program over (segment, whole
+    seconds of reel) keeps, for every reel length up to target_duration, the best
+    total of value per second x duration among chronologically compatible segments.
+    The selection keeps the order of the source, so the reel follows its narrative.
+
+    Args:
+        segments: Validated segments from chunk_video_segments
+        target_duration: Maximum reel duration in seconds
+        video_overview: Optional output of analyze_video_overview, for the narrative summary
+
+    Returns:
+        Dict in the format of the LLM selection (selected_segments, total_duration,
+        narrative_summary, selection_rationale)
+    """
+    candidates = sorted(
+        (seg for seg in segments if seg['end_timestamp'] > seg['start_timestamp']),
+        key=lambda seg: (seg['end_timestamp'], seg['start_timestamp'])
+    )
+    capacity = int(target_duration)
+    ends = [seg['end_timestamp'] for seg in candidates]
+    # Whole seconds used by each segment, rounded up so the reel never exceeds the target
+    weights = [math.ceil(seg['end_timestamp'] - seg['start_timestamp']) for seg in candidates]
+    values = [segment_value(seg) * (seg['end_timestamp'] - seg['start_timestamp']) for seg in candidates]
+    # Last segment ending before each segment starts (number of candidates to keep)
+    compatible = [bisect.bisect_right(ends, seg['start_timestamp']) for seg in candidates]
+
+    # best[i][c]: best value using the first i candidates within c seconds
+    best = [[0.0] * (capacity + 1)]
+    for i, seg in enumerate(candidates):
+        previous = best[i]
+        row = previous[:]
+        weight = weights[i]
+        if weight <= capacity:
+            base = best[compatible[i]]
+            for c in range(weight, capacity + 1):
+                taken = base[c - weight] + values[i]
+                if taken > row[c]:
+                    row[c] = taken
+        best.append(row)
+
+    # Walk the table back from the best reel length
+    selected = []
+    c = max(range(capacity + 1), key=lambda length: best[-1][length]) if candidates else 0
+    i = len(candidates)
+    while i > 0 and c > 0:
+        if best[i][c] == best[i - 1][c]:
+            i -= 1
+            continue
+        selected.append(candidates[i - 1])
+        c -= weights[i - 1]
+        i = compatible[i - 1]
+    selected.reverse()
+
+    selected_segments = []
+    for order, seg in enumerate(selected, start=1):
+        selected_segments.append({
+            'segment_id': seg['segment_id'],
+            'order': order,
+            'start_timestamp': seg['start_timestamp'],
+            'end_timestamp': seg['end_timestamp'],
+            'characters': seg.get('characters', []),
+            'transition_note': 'Opening segment' if order == 1 else 'Follows the previous segment in source order',
+            'main_plot': seg.get('main_plot', ''),
+            'alignment_validated': seg.get('alignment_validated'),
+        })
+
+    total_duration = sum(seg['end_timestamp'] - seg['start_timestamp'] for seg in selected)
+    narrative_summary = (video_overview or {}).get('overall_summary') or ' '.join(
+        seg['main_plot'] for seg in selected_segments[:3] if seg['main_plot']
+    )
+    return {
+        'selected_segments': selected_segments,
+        'total_duration': total_duration,
+        'narrative_summary': narrative_summary,
+        'selection_rationale': (
+            f"Selected {len(selected_segments)} of {len(candidates)} segments maximizing importance, "
+            f"tension and confidence within {capacity}s, in source order"
+        ),
+    }
@@ -1,7 +1,9 @@
 import re
 import os
+import bisect
 from typing import Dict, Any, List, Optional
 from google import genai
+from common.intervals import interval_arrays, adjacent_overlaps, snap_gaps
 
 def initialize_vertex_client():
     """
@@ -93,33 +95,35 @@ def mmss_to_seconds(mmss: str) -> int:
         print(f"Warning: Invalid timestamp format '{mmss}', defaulting to 0")
         return 0
 
-def validate_timestamp_markers(segment: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Check if summary contains timestamp boundary markers and potential issues,
-    and suggest corrections.
-    
-    Args:
-        segment: Segment dictionary with main_plot and timestamps
-        
-    Returns:
-        Dict with validation results and suggestions
-    """
-    summary = segment.get('main_plot', '').lower()
+# Phrases suggesting that a summary describes content from outside its segment
+TEMPORAL_WORDS = {
+    'before': ['previously', 'earlier', 'before this', 'prior to', 'preceding', 'had been'],
+    'after': ['later', 'will', 'about to', 'following', 'next', 'subsequently', 'then']
+}
+START_INDICATORS = ['continues', 'still', 'already', 'ongoing', 'in progress', 'resumes']
+END_INDICATORS = ['continues', 'ongoing', 'begins to', 'starts to', 'about to']
+
+# Every marker phrase in a single word-boundary regex, longest phrases first
+_MARKER_PHRASES = sorted(
+    {phrase for words in TEMPORAL_WORDS.values() for phrase in words} | set(START_INDICATORS) | set(END_INDICATORS),
+    key=len,
+    reverse=True
+)
+MARKER_PATTERN = re.compile(r'\b(?:' + '|'.join(re.escape(phrase) for phrase in _MARKER_PHRASES) + r')\b')
+
+def _marker_result(summary: str, hits: List[tuple]) -> Dict[str, Any]:
+    """Builds the validation result of a summary from its (phrase, start, end) marker hits."""
     issues = []
     suggestions = {
         'adjust_start': 0,
         'adjust_end': 0,
         'confidence': 10
     }
-    
-    TEMPORAL_WORDS = {
-        'before': ['previously', 'earlier', 'before this', 'prior to', 'preceding', 'had been'],
-        'after': ['later', 'will', 'about to', 'following', 'next', 'subsequently', 'then']
-    }
+    found = {phrase for phrase, _, _ in hits}
     
     for direction, words in TEMPORAL_WORDS.items():
         for word in words:
-            if word in summary:
+            if word in found:
                 issues.append(f"Temporal reference '{word}' suggests content from {direction} segment boundaries")
                 suggestions['confidence'] -= 2
                 if direction == 'before':
@@ -127,14 +131,13 @@ def validate_timestamp_markers(segment: Dict[str, Any]) -> Dict[str, Any]:
                 else:
                     suggestions['adjust_end'] = 2
     
-    start_indicators = ['continues', 'still', 'already', 'ongoing', 'in progress', 'resumes']
-    if any(indicator in summary[:30] for indicator in start_indicators):
+    # Start indicators within the first 30 characters, end indicators within the last 50
+    if any(phrase in START_INDICATORS and end <= 30 for phrase, _, end in hits):
         issues.append("Start indicator suggests action started before segment")
         suggestions['adjust_start'] = -2
         suggestions['confidence'] -= 3
 
-    end_indicators = ['continues', 'ongoing', 'begins to', 'starts to', 'about to']
-    if any(indicator in summary[-50:] for indicator in end_indicators):
+    if any(phrase in END_INDICATORS and start >= len(summary) - 50 for phrase, start, _ in hits):
         issues.append("End indicator suggests action continues after segment")
         suggestions['adjust_end'] = 2
         suggestions['confidence'] -= 3
@@ -150,36 +153,85 @@ def validate_timestamp_markers(segment: Dict[str, Any]) -> Dict[str, Any]:
         'needs_adjustment': len(issues) > 0 or suggestions['confidence'] < 8
     }
 
-def detect_segment_overlap(seg1: Dict[str, Any], seg2: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    start1, end1 = seg1['start_timestamp'], seg1['end_timestamp']
-    start2, end2 = seg2['start_timestamp'], seg2['end_timestamp']
-    
-    if start1 < end2 and start2 < end1:
-        overlap_start = max(start1, start2)
-        overlap_end = min(end1, end2)
-        return {
-            'segments': [seg1['segment_id'], seg2['segment_id']],
-            'overlap_start': overlap_start,
-            'overlap_end': overlap_end,
-            'duration': overlap_end - overlap_start
+def validate_timestamp_markers(segment: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check if summary contains timestamp boundary markers and potential issues,
+    and suggest corrections.
+    
+    Args:
+        segment: Segment dictionary with main_plot and timestamps
+        
+    Returns:
+        Dict with validation results and suggestions
+    """
+    summary = segment.get('main_plot', '').lower()
+    hits = [(match.group(), match.start(), match.end()) for match in MARKER_PATTERN.finditer(summary)]
+    return _marker_result(summary, hits)
+
+def validate_all_timestamp_markers(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validate the timestamp markers of every segment of a video in a single regex pass.
+    
+    Args:
+        segments: Segment dictionaries with main_plot and timestamps
+        
+    Returns:
+        The validate_timestamp_markers result of each segment, in order
+    """
+    summaries = [seg.get('main_plot', '').lower() for seg in segments]
+    # Summaries are joined by newlines, which no marker phrase spans
+    offsets = []
+    position = 0
+    for summary in summaries:
+        offsets.append(position)
+        position += len(summary) + 1
+    
+    hits = [[] for _ in summaries]
+    for match in MARKER_PATTERN.finditer('\n'.join(summaries)):
+        index = bisect.bisect_right(offsets, match.start()) - 1
+        offset = offsets[index]
+        hits[index].append((match.group(), match.start() - offset, match.end() - offset))
+    
+    return [_marker_result(summary, summary_hits) for summary, summary_hits in zip(summaries, hits)]
+
+def detect_overlaps(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Detect the overlaps between consecutive segments, for all segments at once.
+    
+    Args:
+        segments: Segments with start_timestamp/end_timestamp in seconds, in reel order
+        
+    Returns:
+        One dict per overlapping pair (segments, overlap_start, overlap_end, duration)
+    """
+    starts, ends = interval_arrays(segments)
+    overlaps = adjacent_overlaps(starts, ends)
+    return [
+        {
+            'segments': [segments[i]['segment_id'], segments[i + 1]['segment_id']],
+            'overlap_start': float(overlap_start),
+            'overlap_end': float(overlap_end),
+            'duration': float(duration)
         }
-    return None
+        for i, overlap_start, overlap_end, duration in zip(
+            overlaps.index.tolist(), overlaps.start, overlaps.end, overlaps.duration
+        )
+    ]
+
+def detect_segment_overlap(seg1: Dict[str, Any], seg2: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    overlaps = detect_overlaps([seg1, seg2])
+    return overlaps[0] if overlaps else None
 
 def smooth_segment_boundaries(segments: List[Dict[str, Any]], max_gap: int = 2) -> List[Dict[str, Any]]:
     if len(segments) <= 1:
         return segments
     
-    smoothed = []
-    for i, seg in enumerate(segments):
-        smoothed_seg = seg.copy()
-        if i > 0:
-            prev_seg = smoothed[-1]
-            gap = seg['start_timestamp'] - prev_seg['end_timestamp']
-            if 0 < gap <= max_gap:
-                mid_point = prev_seg['end_timestamp'] + gap / 2
-                smoothed[-1]['end_timestamp'] = mid_point
-                smoothed_seg['start_timestamp'] = mid_point
-                print(f"   → Smoothed gap between segments {prev_seg['segment_id']} and {seg['segment_id']}")
-        smoothed.append(smoothed_seg)
+    starts, ends = interval_arrays(segments)
+    snapped = snap_gaps(starts, ends, max_gap)
+    smoothed = [seg.copy() for seg in segments]
+    for i in snapped.index.tolist():
+        smoothed[i]['end_timestamp'] = float(snapped.ends[i])
+        smoothed[i + 1]['start_timestamp'] = float(snapped.starts[i + 1])
+        print(f"   → Smoothed gap between segments {segments[i]['segment_id']} and {segments[i + 1]['segment_id']}")
     
     return smoothed
\ No newline at end of file
@@ -1,34 +1,79 @@
 #Required Imports
-import moviepy as mp
 import os
-from moviepy import VideoFileClip, concatenate_videoclips
-from typing import List, Optional
+import tempfile
+from typing import List, Optional, Tuple
+from .clip_cutter import (
+    plan_cut,
+    probe_streams,
+    matches_source,
+    is_valid_clip,
+    encode_part,
+    concat_copy,
+    encode_concat,
+)
+from common.segment_pool import render_segments
 
 
-def create_final_highlight_reel(segment_paths: List[str], output_path: str = "highlight_reel.mp4") -> Optional[str]:
+def render_highlight_reel(video_path: str, segments: List[Tuple[float, float]],
+                          output_path: str = "highlight_reel.mp4", frame_accurate: bool = True) -> Optional[str]:
     """
-    Create a highlight reel by concatenating video segments.
+    Render a highlight reel straight from the source video timestamps, without
+    per-segment intermediate files or a second encode.
+
+    When the source codecs can be matched, the reel is a concat demuxer list
+    pointing at the source with inpoint/outpoint per segment and is stream
+    copied. Only the partial GOP before the first keyframe of a segment that
+    does not start on one is re-encoded, as a short head part matching the
+    source profile, level, codec tag and timescale. Otherwise, or when a head
+    still differs from the source once probed, the segments are joined by a
+    single ffmpeg filter graph and encoded once. The same happens when the
+    stream-copied reel fails the is_valid_clip probe check.
 
     Args:
-        segment_paths (List[str]): List of file paths to the video segments.
+        video_path (str): Local path of the source video.
+        segments (List[Tuple[float, float]]): (start, end) of the segments in seconds, in reel order.
         output_path (str): File path to save the final highlight reel. Defaults to "highlight_reel.mp4".
+        frame_accurate (bool): Keep exact segment starts instead of snapping them to keyframes.
 
     Returns:
         str: Path to the created highlight reel video file.
     """
     try:
-        clips = [VideoFileClip(path) for path in segment_paths]
-        final_clip = concatenate_videoclips(clips, method="chain")
-        final_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
+        streams = probe_streams(video_path)
+        plans = [plan_cut(video_path, start, end, frame_accurate, streams) for start, end in segments]
+
+        stream_copied = False
+        if not any(mode == "reencode" for plan in plans for mode, _, _ in plan):
+            extension = os.path.splitext(video_path)[1] or ".mp4"
+            with tempfile.TemporaryDirectory() as temp_dir:
+                concat_parts = []
+                encode_jobs = []
+                for i, plan in enumerate(plans):
+                    for mode, start, end in plan:
+                        if mode == "copy":
+                            concat_parts.append((video_path, start, end))
+                        else:
+                            head_path = os.path.join(temp_dir, f"part_{i + 1}{extension}")
+                            encode_jobs.append((video_path, start, end, head_path, streams))
+                            concat_parts.append(head_path)
+                print(f"Rendering {len(segments)} segments with stream copy ({len(encode_jobs)} re-encoded heads)")
+                # Heads are independent of each other and are encoded in parallel
+                head_paths = render_segments(encode_part, encode_jobs)
+                if all(matches_source(head_path, streams) for head_path in head_paths):
+                    concat_copy(concat_parts, output_path)
+                    # A join of parts that do not fit together can be cut short or lose a stream
+                    planned_duration = sum(end - start for plan in plans for _, start, end in plan)
+                    stream_copied = is_valid_clip(output_path, planned_duration, streams)
+                    if not stream_copied:
+                        print("Stream-copied highlight reel failed the probe check, re-encoding")
 
-        # Close all clips to release resources
-        for clip in clips:
-            clip.close()
-        final_clip.close()
+        if not stream_copied:
+            print(f"Rendering {len(segments)} segments in a single filter graph encode")
+            encode_concat(video_path, segments, output_path, streams)
 
         print(f"Highlight reel created at: {output_path}")
         return output_path
 
     except Exception as e:
         print(f"Error creating highlight reel: {e}")
-        return None
\ No newline at end of file
+        return None
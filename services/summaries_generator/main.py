@@ -2,21 +2,84 @@
 
 import os
 import json
+import time
 import base64
 import logging
+from typing import List, Optional
 
 
 from google import genai
 from google.genai import types
+from google.cloud import storage
 
 from flask import Flask, request
 
 from common.media_asset_manager import MediaAssetManager
 from common.logging_config import configure_logger
+from common.context_cache import get_or_create_video_cache
+from common.generation_profiles import get_generation_profile, record_generation_metrics
+from common.llm_retry import call_with_retries
+from common.json_stream import (
+    stream_generate_content,
+    streaming_enabled,
+    stream_partial_writes,
+    TruncatedResponseError,
+)
+from common.video_input import (
+    resolve_video_input,
+    build_video_part,
+    can_use_context_cache,
+    get_asset_duration,
+)
+from common.response_cache import (
+    response_cache,
+    build_cache_key,
+    get_source_checksum,
+    is_json_response,
+)
+from common.transcripts import (
+    get_transcript,
+    is_transcript_sufficient,
+    should_defer_for_transcript,
+)
+from common.timecodes import timecode_to_seconds, seconds_to_timecode
+from common.shot_detection import get_shot_boundaries, snap_timecodes
+from common.word_timings import WordTimings, snap_to_words
+from common.frame_grabber import thumbnails_enabled, attach_thumbnails
+from common.media_probe import signed_url
+from common.windowing import (
+    use_windowed_analysis,
+    plan_windows,
+    run_windows,
+    failed_windows,
+    window_prompt_note,
+    merge_windowed_items,
+)
 from .structured_output_schema import (
     SUMMARY_SCHEMA,
     KEY_SECTIONS_SCHEMA,
     ASSET_CATEGORIZATION_SCHEMA,
+    COMBINED_SUBTASK_SCHEMAS,
+    COMBINED_SUMMARY_SCHEMA,
+)
+from .summary_status import (
+    build_summary_update,
+    get_failed_subtasks,
+    get_previous_subtasks,
+    mark_partial,
+)
+from .prompts import (
+    SUMMARY_PROMPT,
+    SUMMARY_SYSTEM_INSTRUCTION,
+    KEY_SECTIONS_PROMPT,
+    KEY_SECTIONS_SYSTEM_INSTRUCTION,
+    CATEGORIZATION_PROMPT,
+    TRANSCRIPT_SYSTEM_INSTRUCTION,
+    TRANSCRIPT_SUMMARY_PROMPT,
+    TRANSCRIPT_CATEGORIZATION_PROMPT,
+    CATEGORIZATION_SYSTEM_INSTRUCTION,
+    COMBINED_PROMPT,
+    COMBINED_SYSTEM_INSTRUCTION,
 )
 
 # Configure logger for the service
@@ -28,7 +91,14 @@ project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
 # A location must be specified for Vertex AI
 location = os.environ.get("GCP_REGION", "us-central1")
 asset_manager = MediaAssetManager(project_id=project_id)
+storage_client = storage.Client()
 llm_model = os.environ.get("LLM_MODEL", "gemini-2.5-flash")
+# "separate" sends one request per subtask, "combined" sends a single request
+# with a merged schema and falls back to per-subtask requests when needed.
+summary_generation_mode = os.environ.get("SUMMARY_GENERATION_MODE", "separate")
+# "video" analyzes the video for every subtask, "transcript" generates the summary
+# and categorization from the asset's transcript when it is substantial enough.
+summary_input_mode = os.environ.get("SUMMARY_INPUT_MODE", "video")
 
 app = Flask(__name__)
 
@@ -39,7 +109,13 @@ def generate(
     source,
     system_instruction_text,
     response_schema,
-    model_name=llm_model,
+    model_name=None,
+    asset_id=None,
+    bypass_cache=False,
+    task="default",
+    video_input=None,
+    on_partial=None,
+    source_checksum=None,
 ) -> str:
     """ "
     Common function that will execute the prompts as per the inputs and return the
@@ -47,42 +123,118 @@ def generate(
     Args:
         prompt_text (str): The text prompt for the model.
         video_uri (str): The GCS URI of the video file (e.g., "gs://your-bucket/your-video.mp4").
+            None sends a text-only request, with everything the model needs in the prompt.
         source (str): The source of the video, e.g., "GCS" or "youtube".
         system_instruction_text (str): The system instruction for the model.
-        model_name (str): The name of the generative model to use (default: "gemini-2.5-pro").
+        model_name (str, optional): Overrides the model of the task's generation profile.
+        asset_id (str, optional): The ID of the asset. When provided, the video is
+            referenced through the asset's shared context cache instead of being sent inline.
+        bypass_cache (bool, optional): Skip the response cache lookup and always call the model.
+        task (str, optional): The generation profile to use (e.g., "summary", "shorts").
+        video_input (dict, optional): Video input settings from resolve_video_input
+            (media resolution, frame sampling rate and start/end offsets).
+        on_partial (callable, optional): Called with an array key and its complete
+            items as they stream in (see common.json_stream).
+        source_checksum (str, optional): The checksum of the video carried by the
+            message, which keys the response cache without looking the object up.
+    Raises:
+        TruncatedResponseError: The streamed response is not a complete JSON
+            document. Its partial attribute holds the salvaged document when
+            complete array items were received.
     Returns:
         str: The generated text response from the model.
 
     """
+    profile = get_generation_profile(task, default_model=llm_model)
+    if model_name:
+        profile["model"] = model_name
+    model_name = profile["model"]
     logger.info(f"Using model: {model_name}")
+    # The task's video input settings take precedence over the profile's resolution.
+    video_input = dict(video_input or {})
+    video_input["media_resolution"] = (
+        video_input.get("media_resolution") or profile["media_resolution"]
+    )
+
+    # Byte-identical requests are answered from the persistent response cache.
+    cache_key = None
+    if response_cache.enabled:
+        # Text-only prompts embed their whole input, so the prompt alone keys them.
+        source_checksum = (
+            get_source_checksum(video_uri, source, source_checksum)
+            if video_uri
+            else "text"
+        )
+        if source_checksum:
+            cache_key = build_cache_key(
+                source_checksum,
+                f"{system_instruction_text}\n{prompt_text}",
+                response_schema,
+                model_name,
+                {**profile, "video_input": video_input},
+            )
+            cached_response = response_cache.get(cache_key, bypass_cache)
+            if cached_response is not None:
+                return cached_response
+
     client = genai.Client(
         vertexai=True,
         project=project_id,
         location="global",
     )
 
-    msg1_text1 = types.Part.from_text(text=prompt_text)
-
-    if source == "youtube":
-        msg1_video1 = types.Part.from_uri(
-            file_uri=video_uri, mime_type="video/youtube"
+    cached_content = None
+    if (
+        video_uri
+        and asset_id
+        and source != "youtube"
+        and can_use_context_cache(video_input)
+    ):
+        cached_content = get_or_create_video_cache(
+            client,
+            asset_manager,
+            asset_id,
+            video_uri,
+            model_name,
+            fps=video_input.get("fps"),
         )
-    else:  # Default to GCS
-        msg1_video1 = types.Part.from_uri(
-            file_uri=video_uri, mime_type="video/*"
+
+    if cached_content:
+        # The video already lives in the cache, and requests using a cache cannot
+        # carry their own system instruction, so it is sent along with the prompt.
+        msg1_text1 = types.Part.from_text(
+            text=f"{system_instruction_text}\n\n{prompt_text}"
         )
+        contents = [
+            types.Content(role="user", parts=[msg1_text1]),
+        ]
+        system_instruction = None
+    elif not video_uri:
+        msg1_text1 = types.Part.from_text(text=prompt_text)
+        contents = [
+            types.Content(role="user", parts=[msg1_text1]),
+        ]
+        system_instruction = [types.Part.from_text(text=system_instruction_text)]
+    else:
+        msg1_text1 = types.Part.from_text(text=prompt_text)
 
-    si_text1 = system_instruction_text
+        msg1_video1 = build_video_part(
+            video_uri,
+            "video/youtube" if source == "youtube" else "video/*",
+            video_input,
+        )
 
-    contents = [
-        types.Content(role="user", parts=[msg1_text1, msg1_video1]),
-    ]
+        contents = [
+            types.Content(role="user", parts=[msg1_text1, msg1_video1]),
+        ]
+        system_instruction = [types.Part.from_text(text=system_instruction_text)]
 
     generate_content_config = types.GenerateContentConfig(
-        temperature=1,
+        temperature=profile["temperature"],
         top_p=1,
         seed=0,
-        max_output_tokens=65535,
+        max_output_tokens=profile["max_output_tokens"],
+        media_resolution=video_input["media_resolution"],
         response_mime_type="application/json",
         response_schema=response_schema,
         safety_settings=[
@@ -95,22 +247,90 @@ def generate(
             ),
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ],
-        system_instruction=[types.Part.from_text(text=si_text1)],
+        system_instruction=system_instruction,
+        cached_content=cached_content,
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=profile["thinking_budget"],
         ),
     )
 
-    response = client.models.generate_content(
-        model=model_name,
-        contents=contents,
-        config=generate_content_config,
-    )
+    started_at = time.monotonic()
+    try:
+        if streaming_enabled:
+            # Streaming surfaces complete items before the response ends and
+            # keeps them when the response gets truncated.
+            response_text, response, parser = call_with_retries(
+                lambda: stream_generate_content(
+                    client, model_name, contents, generate_content_config, on_partial
+                ),
+                task=task,
+                asset_id=asset_id,
+            )
+        else:
+            response = call_with_retries(
+                lambda: client.models.generate_content(
+                    model=model_name,
+                    contents=contents,
+                    config=generate_content_config,
+                ),
+                task=task,
+                asset_id=asset_id,
+            )
+            response_text, parser = response.text, None
+    except Exception:
+        record_generation_metrics(task, profile, started_at, asset_id=asset_id)
+        raise
+    record_generation_metrics(task, profile, started_at, response, asset_id)
+
+    # Only well-formed responses are cached so that retries can recover from bad ones.
+    if is_json_response(response_text):
+        if cache_key:
+            response_cache.set(cache_key, response_text)
+    elif parser:
+        # A truncated response is never returned as a complete one. Its complete
+        # array items travel with the error for the callers accepting partial results.
+        logger.warning(
+            "Response for task '%s' is truncated.",
+            task,
+            extra={"extra_fields": {"asset_id": asset_id, "task": task}},
+        )
+        raise TruncatedResponseError(task, parser.salvage_items())
+
+    return response_text
 
-    return response.text
 
+def _partial_sections_writer(asset_id: str):
+    """
+    Returns an on_partial callback writing the key sections received so far
+    to the asset while the response streams, or None when partial writes are
+    disabled. Sections without parsable timestamps are held back.
+    """
+    if not stream_partial_writes:
+        return None
+
+    def write_sections(key, items):
+        if key != "sections":
+            return
+        sections = [
+            section
+            for section in items
+            if isinstance(section, dict)
+            and timecode_to_seconds(section.get("start_time")) is not None
+            and timecode_to_seconds(section.get("end_time")) is not None
+        ]
+        asset_manager.update_asset_metadata(asset_id, "summary", {"sections": sections})
+
+    return write_sections
 
-def generate_summary(asset_id: str, file_location: str, source: str) -> dict:
+
+def generate_summary(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
     """
     Generates a summary for a media asset using GenAI models.
 
@@ -126,21 +346,17 @@ def generate_summary(asset_id: str, file_location: str, source: str) -> dict:
     logger.info("Generating summary for asset: %s", asset_id, extra=log_extra)
     raw_response = ""
     try:
-        system_instructions_text = """
-         You are a skilled video analysis expert. 
-         You have a deep understanding of media. 
-         Your task is to analyze the provided video and extract key information. """
-        prompt = """
-            Please analyze the following video and provide summary, itemized_summary and subject_topics.
-            Avoid any additional comment or text.
-        """
         raw_response = generate(
-            prompt,
+            SUMMARY_PROMPT,
             file_location,
             source,
-            system_instructions_text,
+            SUMMARY_SYSTEM_INSTRUCTION,
             SUMMARY_SCHEMA,
-            model_name=llm_model,
+            task="summary",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("summary", duration),
         )
         summary_data = json.loads(raw_response)
 
@@ -169,7 +385,14 @@ def generate_summary(asset_id: str, file_location: str, source: str) -> dict:
         return {"error": f"Failed to process with Gemini: {str(e)}"}
 
 
-def generate_key_sections(asset_id: str, file_location: str, source: str) -> dict:
+def generate_key_sections(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
     """
     Generates key sections for a media asset using GenAI models.
 
@@ -182,32 +405,25 @@ def generate_key_sections(asset_id: str, file_location: str, source: str) -> dic
               or an error dictionary if generation fails.
     """
     log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
+    if use_windowed_analysis(duration):
+        return generate_key_sections_windowed(
+            asset_id, file_location, source, bypass_cache, duration, source_checksum
+        )
     logger.info("Generating key sections for asset: %s", asset_id, extra=log_extra)
     raw_response = ""
     try:
-        # Define key section prompt
-        prompt_content = """
-            Please analyze the following video and provide a list of all the  clips with their type and timestamps. 
-            Also explain the reason why the selection of that particular timestamp has been made. 
-            Please format your response as a JSON object with the given structure. 
-            Make sure the audio is not truncated while suggesting the clips. 
-            Avoid any additional comment or text.
-            Please make sure the timestamps are accurate and reflect the precise start and end of each clip.
-            """
-        # Establish system instructions
-        system_instruction_text = """
-            You are a skilled video analysis expert. 
-            You have a deep understanding of media and can accurately identify key moments in a video. 
-            Your task is to analyze the provided video and extract all the moments clips. 
-            For each clip, you need to classify the type of moment and provide the precise start and end timestamps. """
-        # Define a specific model so that the default one is not used
         raw_response = generate(
-            prompt_content,
+            KEY_SECTIONS_PROMPT,
             file_location,
             source,
-            system_instruction_text,
+            KEY_SECTIONS_SYSTEM_INSTRUCTION,
             KEY_SECTIONS_SCHEMA,
-            model_name=llm_model,
+            task="sections",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("sections", duration),
+            on_partial=_partial_sections_writer(asset_id),
         )
         key_sections_data = json.loads(raw_response)
 
@@ -217,6 +433,26 @@ def generate_key_sections(asset_id: str, file_location: str, source: str) -> dic
             extra=log_extra,
         )
         return key_sections_data
+    except TruncatedResponseError as e:
+        # The complete sections of a truncated response are kept, flagged as partial.
+        sections = e.partial.get("sections") if isinstance(e.partial, dict) else None
+        if not sections:
+            logger.error(
+                "Key sections response for asset %s is truncated before any complete section.",
+                asset_id,
+                extra=log_extra,
+            )
+            return {"error": f"Truncated response from model: {e}"}
+        logger.warning(
+            "Key sections response for asset %s is truncated, keeping %d complete sections.",
+            asset_id,
+            len(sections),
+            extra=log_extra,
+        )
+        return mark_partial(
+            {"sections": sections},
+            f"Response truncated after {len(sections)} sections",
+        )
     except json.JSONDecodeError:
         logger.error(
             "Failed to decode JSON for key sections on asset %s. Raw response: %s",
@@ -236,8 +472,106 @@ def generate_key_sections(asset_id: str, file_location: str, source: str) -> dic
         return {"error": f"Failed to process with Gemini: {str(e)}"}
 
 
+def _set_section_times(section: dict, start: float, end: float):
+    """Writes merged section boundaries back as timecodes."""
+    section["start_time"] = seconds_to_timecode(start)
+    section["end_time"] = seconds_to_timecode(end)
+
+
+def generate_key_sections_windowed(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
+    """
+    Generates key sections for a long media asset by analyzing overlapping
+    windows of the video concurrently and merging the sections found in each
+    window into a single timeline.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        file_location (str): GCS URI of the media file.
+        source (str): The source of the media file (e.g., "GCS", "youtube").
+        bypass_cache (bool): Skip response cache lookups and always call the model.
+        duration (Optional[float]): Asset duration in seconds.
+        source_checksum (Optional[str]): The checksum of the media file from the message.
+    Returns:
+        dict: A dictionary containing the merged sections, marked as partial
+              with the failed_windows when some windows failed, or an error
+              dictionary if every window failed.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
+    windows = plan_windows(duration)
+    logger.info(
+        "Generating key sections for asset %s in %d windows",
+        asset_id,
+        len(windows),
+        extra=log_extra,
+    )
+
+    def analyze_window(window):
+        raw_response = generate(
+            KEY_SECTIONS_PROMPT + window_prompt_note(window),
+            file_location,
+            source,
+            KEY_SECTIONS_SYSTEM_INSTRUCTION,
+            KEY_SECTIONS_SCHEMA,
+            task="sections",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("sections", duration, *window),
+        )
+        return json.loads(raw_response).get("sections", [])
+
+    window_sections = run_windows(analyze_window, windows)
+    failed = failed_windows(window_sections, windows)
+    if len(failed) == len(windows):
+        return {"error": "Failed to process with Gemini: every analysis window failed"}
+
+    sections = merge_windowed_items(
+        window_sections,
+        windows,
+        get_times=lambda section: (
+            timecode_to_seconds(section.get("start_time")),
+            timecode_to_seconds(section.get("end_time")),
+        ),
+        set_times=_set_section_times,
+    )
+    if failed:
+        # The sections of the failed windows are missing, the subtask is recorded as partial
+        error_message = f"{len(failed)} of {len(windows)} analysis windows failed: " + ", ".join(
+            f"{seconds_to_timecode(window['start'])}-{seconds_to_timecode(window['end'])}"
+            for window in failed
+        )
+        logger.warning(
+            "Key sections for asset %s are incomplete: %s",
+            asset_id,
+            error_message,
+            extra=log_extra,
+        )
+        return mark_partial(
+            {"sections": sections}, error_message, failed_windows=failed
+        )
+    logger.info(
+        "Successfully generated %d key sections for asset %s",
+        len(sections),
+        asset_id,
+        extra=log_extra,
+    )
+    return {"sections": sections}
+
+
 def generate_asset_categorization(
-    asset_id: str, file_location: str, source: str
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
 ) -> dict:
     """
     Generates Detailed Categorization for a media asset using GenAI models.
@@ -256,51 +590,17 @@ def generate_asset_categorization(
     )
     raw_response = ""
     try:
-        # Define key section prompt
-        prompt_content = """
-        Create a detailed categorization of the movie or series title.
-
-        The categories and their content are are follows:
-
-        Character
-        This item should list the various roles of people within the story, such as victims, suspects, law enforcement, and witnesses. Each role should be clearly defined to understand their function in the narrative.
-
-        Concept
-        This should describe the core idea or the foundation of the story, indicating whether it's an original creation or based on existing material.
-
-        Scenario
-        This section should outline the main plot points and the overall structure of the story, including the central problem to be solved and the genre elements like mystery or intrigue.
-
-        Setting
-        This item should detail the time and location of the story, including both the general environment (e.g., small town, city) and specific places where key events occur. It should also specify the time period, such as the decade or century.
-
-        Subject
-        This section should define the primary topic and themes of the story, such as the type of crime or the lifestyle depicted.
-
-        Practice
-        This item should describe the procedural and professional elements of the story, such as the legal, investigative, or judicial processes that are central to the plot.
-
-        Theme
-        This should list the abstract concepts and ideas explored in the narrative, such as justice, conflict, morality, and human nature.
-
-        Video Mood
-        This section should describe the intended emotional and atmospheric tone of the story, using adjectives to convey the viewing experience, such as suspenseful, chilling, or powerful.
-
-        Do not have verbose description. Use single words when adding items to the result."""
-        # Establish system instructions
-        system_instruction_text = """
-            You are a skilled video analysis expert. 
-            You have a deep understanding of media and can accurately identify key moments in a video. 
-            Your task is to analyze the provided video and extract all the moments clips. 
-            For each clip, you need to classify the type of moment and provide the precise start and end timestamps. """
-        # Define a specific model so that the default one is not used
         raw_response = generate(
-            prompt_content,
+            CATEGORIZATION_PROMPT,
             file_location,
             source,
-            system_instruction_text,
+            CATEGORIZATION_SYSTEM_INSTRUCTION,
             ASSET_CATEGORIZATION_SCHEMA,
-            model_name=llm_model,
+            task="categorization",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("categorization", duration),
         )
         detailed_categorization_data = json.loads(raw_response)
 
@@ -329,10 +629,360 @@ def generate_asset_categorization(
         return {"error": f"Failed to process with Gemini: {str(e)}"}
 
 
+def generate_combined_metadata(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
+    """
+    Generates the summary, key sections and categorization with a single request
+    using a merged response schema, so the video is only sent to the model once.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        file_location (str): GCS URI of the media file.
+        source (str): The source of the media file (e.g., "GCS", "youtube").
+        bypass_cache (bool): Skip response cache lookups and always call the model.
+        duration (Optional[float]): Asset duration in seconds, used to pick the video input settings.
+        source_checksum (Optional[str]): The checksum of the media file from the message.
+    Returns:
+        dict: A dictionary keyed by subtask name ("summary", "sections",
+              "categorization"). Each value holds the fields owned by that
+              subtask, or an error dictionary when the combined response was
+              truncated, malformed or missing any of those fields.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
+    logger.info("Generating combined metadata for asset: %s", asset_id, extra=log_extra)
+    raw_response = ""
+    truncated_field = None
+    try:
+        raw_response = generate(
+            COMBINED_PROMPT,
+            file_location,
+            source,
+            COMBINED_SYSTEM_INSTRUCTION,
+            COMBINED_SUMMARY_SCHEMA,
+            task="combined_summary",
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+            source_checksum=source_checksum,
+            video_input=resolve_video_input("combined_summary", duration),
+            on_partial=_partial_sections_writer(asset_id),
+        )
+        combined_data = json.loads(raw_response)
+    except TruncatedResponseError as e:
+        if not isinstance(e.partial, dict) or not e.partial:
+            logger.warning(
+                "Combined response for asset %s is truncated before any complete field.",
+                asset_id,
+                extra=log_extra,
+            )
+            error = {"error": f"Truncated response from model: {e}"}
+            return {name: error for name in COMBINED_SUBTASK_SCHEMAS}
+        # Only the fields before the one being written when the response was
+        # cut off are complete, the subtasks owning the others are re-run.
+        combined_data = e.partial
+        truncated_field = list(combined_data)[-1]
+        logger.warning(
+            "Combined response for asset %s is truncated in field '%s'.",
+            asset_id,
+            truncated_field,
+            extra=log_extra,
+        )
+    except json.JSONDecodeError:
+        # A response cut off by the output token limit ends up here as well.
+        logger.warning(
+            "Combined response for asset %s is truncated or malformed.",
+            asset_id,
+            extra=log_extra,
+        )
+        error = {"error": f"Malformed JSON response from model: {raw_response}"}
+        return {name: error for name in COMBINED_SUBTASK_SCHEMAS}
+    except Exception as e:
+        logger.error(
+            "Failed to generate combined metadata for asset %s",
+            asset_id,
+            exc_info=True,
+            extra=log_extra,
+        )
+        error = {"error": f"Failed to process with Gemini: {str(e)}"}
+        return {name: error for name in COMBINED_SUBTASK_SCHEMAS}
+
+    if not isinstance(combined_data, dict):
+        error = {"error": f"Unexpected combined response format: {raw_response}"}
+        return {name: error for name in COMBINED_SUBTASK_SCHEMAS}
+
+    # Split the merged object back into the fields owned by each subtask.
+    results = {}
+    for name, schema in COMBINED_SUBTASK_SCHEMAS.items():
+        fields = list(schema["properties"])
+        missing_fields = [field for field in fields if field not in combined_data]
+        if missing_fields:
+            results[name] = {
+                "error": f"Combined response missing fields: {', '.join(missing_fields)}"
+            }
+        elif truncated_field in fields:
+            results[name] = {
+                "error": f"Combined response truncated in field: {truncated_field}"
+            }
+        else:
+            results[name] = {field: combined_data[field] for field in fields}
+
+    logger.info(
+        "Successfully generated combined metadata for asset %s",
+        asset_id,
+        extra=log_extra,
+    )
+    return results
+
+
+# Per-subtask generators, also used as the fallback for combined mode.
+SUBTASK_GENERATORS = {
+    "summary": generate_summary,
+    "sections": generate_key_sections,
+    "categorization": generate_asset_categorization,
+}
+
+
+# Subtasks that can be generated from the transcript alone, with their
+# prompt and schema. Key sections need the video for precise timestamps.
+TRANSCRIPT_SUBTASKS = {
+    "summary": (TRANSCRIPT_SUMMARY_PROMPT, SUMMARY_SCHEMA),
+    "categorization": (TRANSCRIPT_CATEGORIZATION_PROMPT, ASSET_CATEGORIZATION_SCHEMA),
+}
+
+
+def generate_from_transcript(
+    asset_id: str,
+    subtask: str,
+    transcript_text: str,
+    bypass_cache: bool = False,
+) -> dict:
+    """
+    Generates a subtask's metadata with a text-only request over the transcript.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        subtask (str): One of the TRANSCRIPT_SUBTASKS names.
+        transcript_text (str): The asset's transcript.
+        bypass_cache (bool): Skip response cache lookups and always call the model.
+    Returns:
+        dict: The subtask result, or an error dictionary if generation fails.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id, "subtask": subtask}}
+    logger.info(
+        "Generating %s from transcript for asset: %s",
+        subtask,
+        asset_id,
+        extra=log_extra,
+    )
+    prompt, schema = TRANSCRIPT_SUBTASKS[subtask]
+    raw_response = ""
+    try:
+        raw_response = generate(
+            prompt.format(transcript=transcript_text),
+            None,
+            "transcript",
+            TRANSCRIPT_SYSTEM_INSTRUCTION,
+            schema,
+            task=subtask,
+            asset_id=asset_id,
+            bypass_cache=bypass_cache,
+        )
+        return json.loads(raw_response)
+    except json.JSONDecodeError:
+        logger.error(
+            "Failed to decode JSON for %s from transcript on asset %s. Raw response: %s",
+            subtask,
+            asset_id,
+            raw_response,
+            exc_info=True,
+            extra=log_extra,
+        )
+        return {"error": f"Malformed JSON response from model: {raw_response}"}
+    except Exception as e:
+        logger.error(
+            "Failed to generate %s from transcript for asset %s",
+            subtask,
+            asset_id,
+            exc_info=True,
+            extra=log_extra,
+        )
+        return {"error": f"Failed to process with Gemini: {str(e)}"}
+
+
+def generate_transcript_subtasks(
+    asset_id: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    subtasks: Optional[List[str]] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
+    """
+    Generates the TRANSCRIPT_SUBTASKS (restricted to the given subtasks, if
+    any) from the asset's transcript. A transcription still in progress is not
+    waited for (see should_defer_for_transcript).
+
+    Returns:
+        dict: The successful subtask results keyed by subtask name. Empty when
+              the transcript is missing, pending or too thin, so the video is used instead.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id}}
+    transcript_subtasks = [
+        name for name in TRANSCRIPT_SUBTASKS if subtasks is None or name in subtasks
+    ]
+    if source == "youtube" or not transcript_subtasks:
+        # YouTube assets are not transcribed.
+        return {}
+    transcription = get_transcript(asset_manager.get_asset(asset_id))
+    if not is_transcript_sufficient(transcription, duration):
+        logger.info(
+            "Transcript for asset %s is missing, pending or too thin, analyzing the video instead.",
+            asset_id,
+            extra=log_extra,
+        )
+        return {}
+
+    results = {}
+    for name in transcript_subtasks:
+        result = generate_from_transcript(
+            asset_id, name, transcription["text"], bypass_cache
+        )
+        if "error" in result:
+            logger.warning(
+                "Transcript generation of %s failed for asset %s, falling back to the video.",
+                name,
+                asset_id,
+                extra=log_extra,
+            )
+        else:
+            results[name] = result
+    return results
+
+
+def generate_summary_subtasks(
+    asset_id: str,
+    file_location: str,
+    source: str,
+    bypass_cache: bool = False,
+    duration: Optional[float] = None,
+    subtasks: Optional[List[str]] = None,
+    source_checksum: Optional[str] = None,
+) -> dict:
+    """
+    Runs the summary, key sections and categorization subtasks according to
+    the configured SUMMARY_GENERATION_MODE.
+
+    In transcript input mode, the subtasks that do not need timestamps are
+    generated from the transcript first. In combined mode a single request is
+    then attempted and only the subtasks it failed to produce are re-run with
+    their own dedicated request. The combined request is skipped for long
+    assets, whose key sections are generated window by window, and when the
+    transcript already produced the other subtasks.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        file_location (str): GCS URI of the media file.
+        source (str): The source of the media file (e.g., "GCS", "youtube").
+        bypass_cache (bool): Skip response cache lookups and always call the model.
+        duration (Optional[float]): Asset duration in seconds, used to pick the video input settings.
+        subtasks (Optional[List[str]]): The subtasks to run, all of them when None.
+        source_checksum (Optional[str]): The checksum of the media file from the message,
+            used to key the response cache.
+    Returns:
+        dict: A dictionary keyed by subtask name with each subtask's result
+              or error dictionary.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id, "file_location": file_location}}
+    subtasks = subtasks or list(SUBTASK_GENERATORS)
+    results = {}
+    if summary_input_mode == "transcript":
+        results = generate_transcript_subtasks(
+            asset_id, source, bypass_cache, duration, subtasks
+        )
+
+    # The combined request covers every subtask, so it is only worth it when all of them run.
+    if (
+        summary_generation_mode == "combined"
+        and set(subtasks) == set(SUBTASK_GENERATORS)
+        and not use_windowed_analysis(duration)
+        and not results
+    ):
+        combined_results = generate_combined_metadata(
+            asset_id, file_location, source, bypass_cache, duration, source_checksum
+        )
+        failed_subtasks = [
+            name for name, result in combined_results.items() if "error" in result
+        ]
+        if failed_subtasks:
+            logger.warning(
+                "Combined generation incomplete for asset %s, falling back to per-subtask requests for: %s",
+                asset_id,
+                ", ".join(failed_subtasks),
+                extra=log_extra,
+            )
+        results = {
+            name: result
+            for name, result in combined_results.items()
+            if "error" not in result
+        }
+
+    for name, generator in SUBTASK_GENERATORS.items():
+        if name in subtasks and name not in results:
+            results[name] = generator(
+                asset_id, file_location, source, bypass_cache, duration, source_checksum
+            )
+    return results
+
+
+def add_section_thumbnails(
+    asset_id: str, asset_data: Optional[dict], file_location: str, sections: list
+) -> None:
+    """
+    Attaches a thumbnail_url to every key section of a video asset, grabbing
+    all the frames with a single ffmpeg invocation. Failures are logged and
+    leave the sections without thumbnails.
+    """
+    if (
+        not thumbnails_enabled
+        or (asset_data or {}).get("file_category") != "video"
+        or not file_location.startswith("gs://")
+    ):
+        return
+    try:
+        bucket_name, _, blob_name = file_location.replace("gs://", "", 1).partition("/")
+        attach_thumbnails(
+            sections,
+            "start_time",
+            "end_time",
+            asset_id,
+            "sections",
+            file_location,
+            # ffmpeg streams the video through a signed URL instead of downloading it
+            signed_url(storage_client.bucket(bucket_name).blob(blob_name)),
+            storage_client,
+        )
+    except Exception:
+        logger.warning(
+            "Could not create the section thumbnails for asset %s",
+            asset_id,
+            exc_info=True,
+            extra={"extra_fields": {"asset_id": asset_id}},
+        )
+
+
 @app.route("/", methods=["POST"])
 def handle_message():
     """
     Cloud Run entry point that processes Pub/Sub messages to generate summaries.
+
+    Republishing a task message with "retry_failed_subtasks": true re-runs only
+    the subtasks recorded as failed under summary.subtasks, or the ones listed
+    in the message's "subtasks" field.
     """
 
     # Checks if message is in the post input
@@ -353,6 +1003,12 @@ def handle_message():
         file_location = message_data.get("file_location")
         file_name = message_data.get("file_name")
         source = message_data.get("source", "GCS")
+        # Replayed or backfill messages can force fresh model calls.
+        bypass_cache = bool(message_data.get("bypass_cache", False))
+        # Retries re-run only the failed subtasks (or the ones listed in "subtasks").
+        retry_failed_subtasks = bool(message_data.get("retry_failed_subtasks", False))
+        # Facts probed by the dispatcher at ingest, when available.
+        video_details = message_data.get("video_details") or {}
 
         if not all([asset_id, file_location, file_name, source]):
             logger.error(
@@ -394,94 +1050,109 @@ def handle_message():
             )
             return "", 204
 
-        asset_manager.update_asset_metadata(
-            asset_id, "summary", {"status": "processing"}
-        )
-
-        # Generate both summary from asset
-        summary_results = generate_summary(asset_id, file_location, source)
-        # Obtains key sections
-        key_sections_results = generate_key_sections(asset_id, file_location, source)
-        # Obtains detailed categorization
-        detailed_categorization_results = generate_asset_categorization(
-            asset_id, file_location, source
-        )
-
-        # --- Consolidate results and handle partial failures ---
-        combined_results = {}
-        error_messages = []
-
-        summary_error = summary_results.get("error")
-        sections_error = key_sections_results.get("error")
-        categorization_error = detailed_categorization_results.get("error")
-
-        if summary_error:
-            error_messages.append(f"SummaryError: {summary_error}")
-            logger.warning(
-                "Summary generation failed for asset %s: %s",
+        # Retry messages only re-run the subtasks that did not complete and
+        # merge their results into the existing summary section.
+        subtasks = None
+        previous_subtasks = None
+        if retry_failed_subtasks:
+            summary_data = asset_data.get("summary") or {}
+            subtasks = message_data.get("subtasks") or get_failed_subtasks(summary_data)
+            if not subtasks:
+                logger.info(
+                    "No failed summary subtasks to retry for asset %s",
+                    asset_id,
+                    extra=log_extra,
+                )
+                return "", 204
+            previous_subtasks = get_previous_subtasks(summary_data, subtasks)
+            logger.info(
+                "Retrying summary subtasks for asset %s: %s",
                 asset_id,
-                summary_error,
+                ", ".join(subtasks),
                 extra=log_extra,
             )
-        else:
-            combined_results.update(summary_results)
-            logger.info(
-                "Successfully generated summary for asset %s", asset_id, extra=log_extra
-            )
 
-        if sections_error:
-            error_messages.append(f"KeySectionsError: {sections_error}")
-            logger.warning(
-                "Key sections generation failed for asset %s : %s",
-                asset_id,
-                sections_error,
-                extra=log_extra,
+        # A pending transcript hands the message back to Pub/Sub, which redelivers
+        # it after the subscription's retry backoff, instead of holding the request.
+        if (
+            summary_input_mode == "transcript"
+            and source != "youtube"
+            and any(
+                name in (subtasks or SUBTASK_GENERATORS) for name in TRANSCRIPT_SUBTASKS
             )
-        else:
-            combined_results.update(key_sections_results)
+            and should_defer_for_transcript(
+                asset_data, request_json.get("deliveryAttempt")
+            )
+        ):
             logger.info(
-                "Successfully generated key sections for asset %s",
+                "Transcript for asset %s is pending, deferring the summary generation.",
                 asset_id,
                 extra=log_extra,
             )
+            return "Transcript pending, deferring the message", 503
 
-        if categorization_error:
-            error_messages.append(f"CategorizationError: {categorization_error}")
-            logger.warning(
-                "Detailed categorization failed for asset %s : %s",
-                asset_id,
-                categorization_error,
-                extra=log_extra,
+        asset_manager.update_asset_metadata(
+            asset_id, "summary", {"status": "processing"}
+        )
+
+        # Generate summary, key sections and detailed categorization from asset
+        subtask_results = generate_summary_subtasks(
+            asset_id,
+            file_location,
+            source,
+            bypass_cache,
+            video_details.get("duration") or get_asset_duration(asset_data),
+            subtasks,
+            video_details.get("checksum"),
+        )
+
+        for name, result in subtask_results.items():
+            if "error" in result:
+                logger.warning(
+                    "Summary subtask '%s' failed for asset %s: %s",
+                    name,
+                    asset_id,
+                    result["error"],
+                    extra=log_extra,
+                )
+            else:
+                logger.info(
+                    "Successfully generated summary subtask '%s' for asset %s",
+                    name,
+                    asset_id,
+                    extra=log_extra,
+                )
+
+        # --- Consolidate results and handle partial failures ---
+        update_data = build_summary_update(subtask_results, previous_subtasks)
+        if update_data.get("sections"):
+            # The previews and transcription services store the shot index and
+            # the word timings while the sections are generated
+            latest_asset_data = asset_manager.get_asset(asset_id)
+            snap_timecodes(
+                update_data["sections"],
+                "start_time",
+                "end_time",
+                get_shot_boundaries(latest_asset_data),
             )
-        else:
-            combined_results.update(detailed_categorization_results)
-            logger.info(
-                "Successfully generated detailed categorization for asset %s",
-                asset_id,
-                extra=log_extra,
+            snap_to_words(
+                update_data["sections"],
+                "start_time",
+                "end_time",
+                WordTimings.from_asset(latest_asset_data),
             )
-
-        if error_messages:
-            status = "partial_success" if combined_results else "failed"
-            combined_error_message = " | ".join(error_messages)
-            update_data = {
-                "status": status,
-                **combined_results,
-                "error_message": combined_error_message,
-            }
+            add_section_thumbnails(
+                asset_id, latest_asset_data, file_location, update_data["sections"]
+            )
+        if update_data["error_message"]:
             logger.error(
                 "Summary/sections/categorization generation for asset %s completed with status '%s'. Errors: %s",
                 asset_id,
-                status,
-                combined_error_message,
+                update_data["status"],
+                update_data["error_message"],
                 extra=log_extra,
             )
         else:
-            update_data = {
-                "status": "completed",
-                **combined_results,
-                "error_message": None,
-            }
             logger.info(
                 "Successfully completed summary, key sections, and categorization generation for asset: %s",
                 asset_id,
@@ -0,0 +1,107 @@
+""" Prompts and system instructions used by the summaries generator """
+
+SUMMARY_SYSTEM_INSTRUCTION = """
+         You are a skilled video analysis expert.
+         You have a deep understanding of media.
+         Your task is to analyze the provided video and extract key information. """
+
+SUMMARY_PROMPT = """
+            Please analyze the following video and provide summary, itemized_summary and subject_topics.
+            Avoid any additional comment or text.
+        """
+
+KEY_SECTIONS_SYSTEM_INSTRUCTION = """
+            You are a skilled video analysis expert.
+            You have a deep understanding of media and can accurately identify key moments in a video.
+            Your task is to analyze the provided video and extract all the moments clips.
+            For each clip, you need to classify the type of moment and provide the precise start and end timestamps. """
+
+KEY_SECTIONS_PROMPT = """
+            Please analyze the following video and provide a list of all the  clips with their type and timestamps.
+            Also explain the reason why the selection of that particular timestamp has been made.
+            Please format your response as a JSON object with the given structure.
+            Make sure the audio is not truncated while suggesting the clips.
+            Avoid any additional comment or text.
+            Please make sure the timestamps are accurate and reflect the precise start and end of each clip.
+            """
+
+CATEGORIZATION_SYSTEM_INSTRUCTION = KEY_SECTIONS_SYSTEM_INSTRUCTION
+
+CATEGORIZATION_PROMPT = """
+        Create a detailed categorization of the movie or series title.
+
+        The categories and their content are are follows:
+
+        Character
+        This item should list the various roles of people within the story, such as victims, suspects, law enforcement, and witnesses. Each role should be clearly defined to understand their function in the narrative.
+
+        Concept
+        This should describe the core idea or the foundation of the story, indicating whether it's an original creation or based on existing material.
+
+        Scenario
+        This section should outline the main plot points and the overall structure of the story, including the central problem to be solved and the genre elements like mystery or intrigue.
+
+        Setting
+        This item should detail the time and location of the story, including both the general environment (e.g., small town, city) and specific places where key events occur. It should also specify the time period, such as the decade or century.
+
+        Subject
+        This section should define the primary topic and themes of the story, such as the type of crime or the lifestyle depicted.
+
+        Practice
+        This item should describe the procedural and professional elements of the story, such as the legal, investigative, or judicial processes that are central to the plot.
+
+        Theme
+        This should list the abstract concepts and ideas explored in the narrative, such as justice, conflict, morality, and human nature.
+
+        Video Mood
+        This section should describe the intended emotional and atmospheric tone of the story, using adjectives to convey the viewing experience, such as suspenseful, chilling, or powerful.
+
+        Do not have verbose description. Use single words when adding items to the result."""
+
+# Combined mode sends a single request covering the three tasks above, so the
+# video is only tokenized once. The output is split back per task afterwards.
+COMBINED_SYSTEM_INSTRUCTION = """
+            You are a skilled video analysis expert.
+            You have a deep understanding of media and can accurately identify key moments in a video.
+            Your task is to analyze the provided video once and produce its summary,
+            its key sections with precise start and end timestamps, and a detailed categorization of the title. """
+
+COMBINED_PROMPT = f"""
+        Please analyze the following video and complete the three tasks below in a single JSON object
+        that follows the given structure. Every field of the structure must be present.
+        Avoid any additional comment or text.
+
+        TASK 1 - SUMMARY (fields: summary, itemized_summary, subject_topics, people)
+        {SUMMARY_PROMPT.strip()}
+
+        TASK 2 - KEY SECTIONS (field: sections)
+        {KEY_SECTIONS_PROMPT.strip()}
+
+        TASK 3 - CATEGORIZATION (fields: character, concept, scenario, setting, subject, practice, theme, video_mood)
+        {CATEGORIZATION_PROMPT.strip()}"""
+
+# Transcript mode runs the subtasks that do not need timestamps against the
+# transcript only, which costs a fraction of a video request.
+TRANSCRIPT_SYSTEM_INSTRUCTION = """
+         You are a skilled video analysis expert.
+         You have a deep understanding of media.
+         Your task is to analyze the transcript of a video and extract key information from it. """
+
+TRANSCRIPT_SUMMARY_PROMPT = """
+            Please analyze the following video transcript and provide summary, itemized_summary and subject_topics.
+            Avoid any additional comment or text.
+
+            TRANSCRIPT:
+            {transcript}
+        """
+
+TRANSCRIPT_CATEGORIZATION_PROMPT = (
+    CATEGORIZATION_PROMPT.replace(
+        "Create a detailed categorization of the movie or series title.",
+        "Create a detailed categorization of the movie or series title from the transcript below.",
+    )
+    + """
+
+        TRANSCRIPT:
+        {transcript}"""
+)
@@ -124,4 +124,27 @@ KEY_SECTIONS_SCHEMA = {
             }
         }
     }
-}
\ No newline at end of file
+}
+
+# Subtasks merged into a single request when running in combined mode. Each
+# entry maps the subtask name to the schema whose top-level properties it owns,
+# which is what allows the combined response to be split back apart.
+COMBINED_SUBTASK_SCHEMAS = {
+    "summary": SUMMARY_SCHEMA,
+    "sections": KEY_SECTIONS_SCHEMA,
+    "categorization": ASSET_CATEGORIZATION_SCHEMA,
+}
+
+COMBINED_SUMMARY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        name: prop
+        for schema in COMBINED_SUBTASK_SCHEMAS.values()
+        for name, prop in schema["properties"].items()
+    },
+    "required": [
+        name
+        for schema in COMBINED_SUBTASK_SCHEMAS.values()
+        for name in schema["properties"]
+    ],
+}
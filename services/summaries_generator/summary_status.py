@@ -0,0 +1,144 @@
+""" Per-subtask status of an asset's summary section
+
+The summary section is produced by three subtasks (summary, key sections and
+categorization). Each one records its own status under `summary.subtasks`, so
+that a partially successful asset can be recovered by re-running only the
+subtasks that failed. The overall status and error message are derived from
+the subtask statuses.
+
+A subtask that produced incomplete results (e.g. a truncated response, or
+failed analysis windows) returns them marked with `mark_partial`: they are
+stored, but the subtask is recorded as "partial" and re-run by retries.
+"""
+from typing import List, Optional
+
+# Subtask names with the prefix used for their errors in `summary.error_message`.
+SUBTASK_ERROR_PREFIXES = {
+    "summary": "SummaryError",
+    "sections": "KeySectionsError",
+    "categorization": "CategorizationError",
+}
+# Key of the marker added to incomplete subtask results.
+PARTIAL_RESULT_KEY = "partial"
+
+
+def mark_partial(result: dict, error_message: str, **details) -> dict:
+    """
+    Marks a subtask result as incomplete.
+
+    Args:
+        result (dict): The fields produced by the subtask (modified in place).
+        error_message (str): What is missing from the result.
+        **details: Extra fields recorded with the subtask status (e.g. failed_windows).
+
+    Returns:
+        dict: The result.
+    """
+    result[PARTIAL_RESULT_KEY] = {"error_message": error_message, **details}
+    return result
+
+
+def build_summary_update(subtask_results: dict, previous_subtasks: Optional[dict] = None) -> dict:
+    """
+    Builds the `summary` section update from subtask results.
+
+    Args:
+        subtask_results (dict): Result or error dictionary per subtask that ran.
+        previous_subtasks (Optional[dict]): The recorded `summary.subtasks`, used
+            for the subtasks that did not run this time.
+
+    Returns:
+        dict: The fields produced by the successful subtasks, along with the
+        `subtasks` statuses and the overall status and error message.
+    """
+    subtasks = dict(previous_subtasks or {})
+    update_data = {}
+    for name, result in subtask_results.items():
+        error = result.get("error")
+        partial = result.get(PARTIAL_RESULT_KEY)
+        if error:
+            subtasks[name] = {"status": "failed", "error_message": error}
+        elif partial:
+            update_data.update(
+                {field: value for field, value in result.items() if field != PARTIAL_RESULT_KEY}
+            )
+            subtasks[name] = {"status": "partial", **partial}
+        else:
+            update_data.update(result)
+            subtasks[name] = {"status": "completed", "error_message": None}
+
+    error_messages = [
+        f"{prefix}: {subtasks[name]['error_message']}"
+        for name, prefix in SUBTASK_ERROR_PREFIXES.items()
+        if subtasks.get(name, {}).get("status") in ("failed", "partial")
+    ]
+    if error_messages:
+        any_produced = any(
+            subtask.get("status") in ("completed", "partial")
+            for subtask in subtasks.values()
+        )
+        status = "partial_success" if any_produced else "failed"
+    else:
+        status = "completed"
+
+    update_data.update(
+        {
+            "status": status,
+            "subtasks": subtasks,
+            "error_message": " | ".join(error_messages) if error_messages else None,
+        }
+    )
+    return update_data
+
+
+def get_failed_subtasks(summary_data: Optional[dict]) -> List[str]:
+    """
+    Returns the subtasks of a summary section that did not complete. Assets
+    processed before subtask statuses were recorded fall back to the overall
+    status and to the error prefixes found in the error message.
+    """
+    summary_data = summary_data or {}
+    subtasks = summary_data.get("subtasks")
+    if not subtasks:
+        status = summary_data.get("status")
+        if status == "completed":
+            return []
+        error_message = summary_data.get("error_message") or ""
+        failed = [
+            name
+            for name, prefix in SUBTASK_ERROR_PREFIXES.items()
+            if f"{prefix}:" in error_message
+        ]
+        if status == "partial_success" and failed:
+            return failed
+        return list(SUBTASK_ERROR_PREFIXES)
+    return [
+        name
+        for name in SUBTASK_ERROR_PREFIXES
+        if subtasks.get(name, {}).get("status") != "completed"
+    ]
+
+
+def get_previous_subtasks(summary_data: Optional[dict], rerun_subtasks: List[str]) -> dict:
+    """
+    Returns the recorded `summary.subtasks` to merge the results of a partial
+    re-run into. Assets processed before subtask statuses were recorded get
+    statuses derived from get_failed_subtasks for the subtasks not re-run.
+
+    Args:
+        summary_data (Optional[dict]): The asset's summary section.
+        rerun_subtasks (List[str]): The subtasks being run again.
+    """
+    summary_data = summary_data or {}
+    if summary_data.get("subtasks"):
+        return dict(summary_data["subtasks"])
+    failed = get_failed_subtasks(summary_data)
+    return {
+        name: (
+            {"status": "failed", "error_message": "Not completed"}
+            if name in failed
+            else {"status": "completed", "error_message": None}
+        )
+        for name in SUBTASK_ERROR_PREFIXES
+        if name not in rerun_subtasks
+    }
@@ -0,0 +1,5 @@
+""" Puts the services directory on the import path, as the service images do. """
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
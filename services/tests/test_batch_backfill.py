@@ -0,0 +1,121 @@
+""" End-to-end test of a backfill run through the local batch runner and a fake asset store. """
+import json
+
+import pytest
+
+from batch_backfill import main as backfill
+from batch_backfill.batch_requests import make_backfill_key, parse_output_line
+from batch_backfill.runners import list_jsonl, read_jsonl
+
+SECTIONS = {"sections": [{"title": "Intro", "start_time": "00:00", "end_time": "00:30"}]}
+SHORTS = [{"title": "Best moment", "start_timecode": "00:10", "end_timecode": "00:40"}]
+
+
+class FakeAssetManager:
+    """In-memory stand-in for MediaAssetManager, shared by every instance of a test."""
+
+    assets = {}
+    updates = []
+
+    def __init__(self, project_id=None):
+        pass
+
+    def get_asset(self, asset_id):
+        return self.assets.get(asset_id)
+
+    def get_assets(self, asset_ids, field_paths=None):
+        return {asset_id: self.assets[asset_id] for asset_id in asset_ids if asset_id in self.assets}
+
+    def bulk_update_asset_metadata(self, updates):
+        self.updates.extend(updates)
+        return len(updates)
+
+
+@pytest.fixture
+def asset_manager(monkeypatch):
+    FakeAssetManager.assets = {
+        # Processed before subtask statuses were recorded, with a failed summary
+        "legacy": {
+            "file_path": "gs://bucket/legacy.mp4",
+            "file_category": "video",
+            "video_details": {"duration": 120.0},
+            "summary": {"status": "partial_success", "error_message": "SummaryError: bad JSON"},
+        },
+        "recorded": {
+            "file_path": "gs://bucket/recorded.mp4",
+            "file_category": "video",
+            "summary": {
+                "status": "partial_success",
+                "subtasks": {
+                    "summary": {"status": "completed", "error_message": None},
+                    "sections": {"status": "failed", "error_message": "timeout"},
+                    "categorization": {"status": "failed", "error_message": "timeout"},
+                },
+            },
+        },
+    }
+    FakeAssetManager.updates = []
+    monkeypatch.setattr(backfill, "MediaAssetManager", FakeAssetManager)
+    return FakeAssetManager
+
+
+def test_local_backfill_round_trip(asset_manager, tmp_path):
+    run = str(tmp_path / "run")
+    fixtures = tmp_path / "fixtures.json"
+    fixtures.write_text(json.dumps({"sections": SECTIONS, "shorts": SHORTS}))
+
+    manifest = backfill.prepare(run, ["legacy", "recorded"], ["sections", "shorts"])
+    assert {(entry["asset_id"], entry["task"]) for entry in manifest["entries"].values()} == {
+        ("legacy", "sections"), ("legacy", "shorts"), ("recorded", "sections"), ("recorded", "shorts"),
+    }
+
+    manifest = backfill.submit(run, local=True, fixtures=str(fixtures))
+    keys = []
+    for job in manifest["jobs"].values():
+        for output_uri in list_jsonl(job["output_prefix"]):
+            for line in read_jsonl(output_uri):
+                key, text, error = parse_output_line(line)
+                entry = manifest["entries"][key]
+                assert key == make_backfill_key(entry["asset_id"], entry["task"])
+                assert error is None
+                assert json.loads(text) == (SECTIONS if entry["task"] == "sections" else SHORTS)
+                keys.append(key)
+    assert sorted(keys) == sorted(manifest["entries"])
+
+    assert backfill.ingest(run) == 4
+    updates = {(asset_id, section): data for asset_id, section, data in asset_manager.updates}
+
+    legacy = updates[("legacy", "summary")]
+    assert legacy["sections"] == SECTIONS["sections"]
+    assert {name: subtask["status"] for name, subtask in legacy["subtasks"].items()} == {
+        "summary": "failed",
+        "sections": "completed",
+        "categorization": "completed",
+    }
+    assert legacy["status"] == "partial_success"
+
+    recorded = updates[("recorded", "summary")]
+    assert {name: subtask["status"] for name, subtask in recorded["subtasks"].items()} == {
+        "summary": "completed",
+        "sections": "completed",
+        "categorization": "failed",
+    }
+    assert recorded["error_message"] == "CategorizationError: timeout"
+
+    for asset_id in ("legacy", "recorded"):
+        assert updates[(asset_id, "previews")] == {"status": "completed", "clips": SHORTS, "error_message": None}
+
+
+def test_requests_without_output_are_ingested_as_failed(asset_manager, tmp_path):
+    run = str(tmp_path / "run")
+    fixtures = tmp_path / "fixtures.json"
+    # No canned shorts response: the local runner reports those requests as failed
+    fixtures.write_text(json.dumps({"sections": SECTIONS}))
+
+    backfill.prepare(run, ["recorded"], ["sections", "shorts"])
+    backfill.submit(run, local=True, fixtures=str(fixtures))
+    backfill.ingest(run)
+
+    updates = {(asset_id, section): data for asset_id, section, data in asset_manager.updates}
+    assert updates[("recorded", "previews")]["status"] == "failed"
+    assert updates[("recorded", "summary")]["subtasks"]["sections"]["status"] == "completed"
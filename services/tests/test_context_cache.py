@@ -0,0 +1,102 @@
+""" Tests for common.context_cache: reuse, creation and concurrent creation of cache entries. """
+import datetime
+from types import SimpleNamespace
+
+from common.context_cache import CONTEXT_CACHE_FIELD, get_or_create_video_cache
+
+VIDEO_URI = "gs://bucket/video.mp4"
+MODEL = "gemini-2.5-flash"
+MODEL_KEY = "gemini_2_5_flash_default"
+
+
+def in_seconds(seconds):
+    return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=seconds)
+
+
+class FakeCaches:
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+
+    def create(self, model, config):
+        name = f"cachedContents/{len(self.created) + 1}"
+        self.created.append(name)
+        return SimpleNamespace(name=name, expire_time=in_seconds(3600))
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+class FakeAssetManager:
+    """Keeps the context cache records in memory; before_write runs ahead of a conditional write."""
+
+    def __init__(self, records=None, before_write=None):
+        self.asset = {CONTEXT_CACHE_FIELD: dict(records or {})}
+        self.before_write = before_write
+
+    def get_asset(self, asset_id):
+        return self.asset
+
+    def update_asset_metadata_if(self, asset_id, metadata_type, data, condition):
+        if self.before_write:
+            self.before_write(self)
+        if not condition(self.asset):
+            return False
+        self.asset[metadata_type].update(data)
+        return True
+
+
+def record(name, expire_time, video_uri=VIDEO_URI):
+    return {MODEL_KEY: {"name": name, "video_uri": video_uri, "expire_time": expire_time}}
+
+
+def test_reuses_a_recorded_cache():
+    client = SimpleNamespace(caches=FakeCaches())
+    manager = FakeAssetManager(record("cachedContents/existing", in_seconds(3600)))
+
+    assert get_or_create_video_cache(client, manager, "a", VIDEO_URI, MODEL) == "cachedContents/existing"
+    assert client.caches.created == []
+
+
+def test_replaces_an_expiring_cache_without_deleting_it():
+    client = SimpleNamespace(caches=FakeCaches())
+    manager = FakeAssetManager(record("cachedContents/expiring", in_seconds(30)))
+
+    name = get_or_create_video_cache(client, manager, "a", VIDEO_URI, MODEL)
+
+    assert name == "cachedContents/1"
+    assert manager.asset[CONTEXT_CACHE_FIELD][MODEL_KEY]["name"] == name
+    # Requests that read the old record may still use it, the TTL removes it
+    assert client.caches.deleted == []
+
+
+def test_does_not_reuse_a_cache_of_another_video():
+    client = SimpleNamespace(caches=FakeCaches())
+    manager = FakeAssetManager(
+        record("cachedContents/other", in_seconds(3600), video_uri="gs://bucket/other.mp4")
+    )
+
+    assert get_or_create_video_cache(client, manager, "a", VIDEO_URI, MODEL) == "cachedContents/1"
+
+
+def test_concurrent_creation_keeps_the_recorded_cache():
+    client = SimpleNamespace(caches=FakeCaches())
+
+    def other_worker_records_first(manager):
+        manager.asset[CONTEXT_CACHE_FIELD].update(record("cachedContents/winner", in_seconds(3600)))
+
+    manager = FakeAssetManager(before_write=other_worker_records_first)
+
+    assert get_or_create_video_cache(client, manager, "a", VIDEO_URI, MODEL) == "cachedContents/winner"
+    assert manager.asset[CONTEXT_CACHE_FIELD][MODEL_KEY]["name"] == "cachedContents/winner"
+    # Our own entry was never recorded, so no one else can be using it
+    assert client.caches.deleted == ["cachedContents/1"]
+
+
+def test_failed_record_write_still_uses_the_new_cache():
+    client = SimpleNamespace(caches=FakeCaches())
+    manager = FakeAssetManager()
+    manager.update_asset_metadata_if = lambda *args: False
+
+    assert get_or_create_video_cache(client, manager, "a", VIDEO_URI, MODEL) == "cachedContents/1"
+    assert client.caches.deleted == []
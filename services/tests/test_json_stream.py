@@ -0,0 +1,89 @@
+""" Tests for common.json_stream: chunked feeding and salvage of truncated responses. """
+import json
+
+import pytest
+
+from common.json_stream import IncrementalJsonParser, TruncatedResponseError
+
+DOCUMENT = {
+    "summary": "A talk about {braces} and [brackets], with \"quotes\".",
+    "sections": [
+        {"title": "Intro, part [1]", "start_time": "00:00", "end_time": "01:30"},
+        {"title": "Main \\ topic", "start_time": "01:30", "end_time": "12:05"},
+        {"title": "Q&A", "start_time": "12:05", "end_time": "20:00"},
+    ],
+    "tags": ["a", "b"],
+}
+
+
+def feed_in_chunks(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 10000])
+def test_feed_reports_every_array_item_once(chunk_size):
+    text = json.dumps(DOCUMENT, indent=2)
+    parser = IncrementalJsonParser()
+    items = feed_in_chunks(parser, text, chunk_size)
+
+    assert items == [("sections", section) for section in DOCUMENT["sections"]] + [("tags", "a"), ("tags", "b")]
+    assert parser.items["sections"] == DOCUMENT["sections"]
+    assert json.loads(parser.text) == DOCUMENT
+
+
+def test_feed_reports_items_of_a_top_level_array():
+    clips = [{"title": "one", "score": 1}, {"title": "two", "score": 2.5}, 3, None]
+    parser = IncrementalJsonParser()
+    items = feed_in_chunks(parser, json.dumps(clips), 5)
+
+    assert items == [(None, clip) for clip in clips]
+
+
+def test_item_is_reported_as_soon_as_it_closes():
+    parser = IncrementalJsonParser()
+    assert parser.feed('[{"title": "one"}, {"title": "t') == [(None, {"title": "one"})]
+    assert parser.feed('wo"}]') == [(None, {"title": "two"})]
+
+
+def test_salvage_drops_the_incomplete_trailing_item():
+    text = json.dumps(DOCUMENT)
+    cut = text.index("Q&A")
+    parser = IncrementalJsonParser()
+    feed_in_chunks(parser, text[:cut], 11)
+
+    salvaged = parser.salvage()
+    assert salvaged == {"summary": DOCUMENT["summary"], "sections": DOCUMENT["sections"][:2]}
+    assert parser.salvage_items() == salvaged
+
+
+def test_salvage_of_a_truncated_top_level_array():
+    parser = IncrementalJsonParser()
+    parser.feed('[{"title": "one", "tags": ["x", "y"]}, {"title": "two", "tags": ["x"')
+
+    assert parser.salvage_items() == [{"title": "one", "tags": ["x", "y"]}]
+
+
+def test_salvage_items_refuses_documents_without_complete_items():
+    parser = IncrementalJsonParser()
+    parser.feed('{"summary": "abc')
+
+    assert parser.salvage_items() is None
+
+
+def test_salvage_of_an_empty_response():
+    parser = IncrementalJsonParser()
+
+    assert parser.salvage() is None
+    assert parser.salvage_items() is None
+
+
+def test_truncated_response_error_carries_the_partial_document():
+    error = TruncatedResponseError("sections", {"sections": []})
+
+    assert isinstance(error, ValueError)
+    assert error.partial == {"sections": []}
+    assert "sections" in str(error)
+    assert TruncatedResponseError("summary").partial is None
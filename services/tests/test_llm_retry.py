@@ -0,0 +1,170 @@
+""" Tests for common.llm_retry: retries, backoff, hedging and the attempt log. """
+import threading
+
+import httpx
+import pytest
+from google.genai import errors
+
+from common import llm_retry
+from common.llm_retry import attempt_cancelled, call_with_retries
+
+
+class FlakyCall:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return "ok"
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Records the backoff sleeps instead of waiting, with hedging off and no deadlines."""
+    sleeps = []
+    monkeypatch.setattr(llm_retry.time, "sleep", sleeps.append)
+    monkeypatch.setattr(llm_retry, "retry_max_attempts", 4)
+    monkeypatch.setattr(llm_retry, "hedging_enabled", False)
+    monkeypatch.setattr(llm_retry, "attempt_timeout_seconds", 0)
+    monkeypatch.setattr(llm_retry, "call_deadline_seconds", 0)
+    return sleeps
+
+
+@pytest.fixture
+def attempt_logs(monkeypatch):
+    logs = []
+    monkeypatch.setattr(
+        llm_retry,
+        "_log_attempts",
+        lambda task, asset_id, attempts, hedged_attempts, succeeded: logs.append(
+            (attempts, hedged_attempts, succeeded)
+        ),
+    )
+    return logs
+
+
+def api_error(code):
+    return errors.APIError(code, {"error": {"code": code, "message": "error", "status": "ERROR"}})
+
+
+def test_is_retryable():
+    assert llm_retry.is_retryable(api_error(429))
+    assert llm_retry.is_retryable(api_error(503))
+    assert llm_retry.is_retryable(httpx.ReadTimeout("timed out"))
+    assert llm_retry.is_retryable(ConnectionError())
+    assert not llm_retry.is_retryable(api_error(400))
+    assert not llm_retry.is_retryable(ValueError())
+
+
+def test_retries_until_success(no_sleep, attempt_logs):
+    call = FlakyCall(api_error(429), httpx.ConnectError("refused"))
+
+    assert call_with_retries(call, task="test") == "ok"
+    assert call.calls == 3
+    assert len(no_sleep) == 2
+    assert attempt_logs == [(3, 0, True)]
+
+
+def test_does_not_retry_other_errors(no_sleep, attempt_logs):
+    call = FlakyCall(api_error(400))
+
+    with pytest.raises(errors.APIError):
+        call_with_retries(call, task="test")
+    assert call.calls == 1
+    assert no_sleep == []
+    assert attempt_logs == [(1, 0, False)]
+
+
+def test_gives_up_after_the_maximum_attempts(no_sleep, attempt_logs, monkeypatch):
+    monkeypatch.setattr(llm_retry, "retry_max_attempts", 3)
+    call = FlakyCall(*[api_error(503)] * 5)
+
+    with pytest.raises(errors.APIError):
+        call_with_retries(call, task="test")
+    assert call.calls == 3
+    assert len(no_sleep) == 2
+    assert attempt_logs == [(3, 0, False)]
+
+
+def test_backoff_delay_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(llm_retry, "retry_base_delay_seconds", 2)
+    monkeypatch.setattr(llm_retry, "retry_max_delay_seconds", 10)
+    monkeypatch.setattr(llm_retry.random, "uniform", lambda low, high: (low, high))
+
+    assert llm_retry._backoff_delay(1) == (0, 4)
+    assert llm_retry._backoff_delay(2) == (0, 8)
+    assert llm_retry._backoff_delay(5) == (0, 10)
+
+
+def test_hedge_delay_needs_enough_samples(monkeypatch):
+    monkeypatch.setattr(llm_retry, "hedging_enabled", True)
+    monkeypatch.setattr(llm_retry, "hedge_min_samples", 10)
+    monkeypatch.setattr(llm_retry, "hedge_percentile", 90)
+    monkeypatch.setattr(llm_retry, "_latencies", {"test": [float(i) for i in range(9)]})
+
+    assert llm_retry._hedge_delay("test") is None
+    llm_retry._latencies["test"].append(9.0)
+    assert llm_retry._hedge_delay("test") == 9.0
+
+
+def enable_hedging(monkeypatch, hedge_after):
+    monkeypatch.setattr(llm_retry, "hedging_enabled", True)
+    monkeypatch.setattr(llm_retry, "_hedge_delay", lambda task: hedge_after)
+
+
+def test_hedge_wins_and_the_slow_attempt_is_cancelled(attempt_logs, monkeypatch):
+    enable_hedging(monkeypatch, 0.05)
+    release = threading.Event()
+    seen_cancelled = []
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            # The first attempt hangs until the hedge has answered
+            release.wait(5)
+            seen_cancelled.append(attempt_cancelled())
+            return "slow"
+        return "fast"
+
+    assert call_with_retries(call, task="test") == "fast"
+    release.set()
+    assert attempt_logs == [(1, 1, True)]
+    # Wait for the abandoned attempt to observe its flag
+    for _ in range(100):
+        if seen_cancelled:
+            break
+        threading.Event().wait(0.01)
+    assert seen_cancelled == [True]
+
+
+def test_failed_hedged_attempts_are_counted(no_sleep, attempt_logs, monkeypatch):
+    enable_hedging(monkeypatch, 0.01)
+    monkeypatch.setattr(llm_retry, "retry_max_attempts", 2)
+
+    def call():
+        threading.Event().wait(0.05)
+        raise api_error(503)
+
+    with pytest.raises(errors.APIError):
+        call_with_retries(call, task="test")
+    assert attempt_logs == [(2, 2, False)]
+
+
+def test_attempt_deadline_raises_and_retries(no_sleep, attempt_logs, monkeypatch):
+    monkeypatch.setattr(llm_retry, "attempt_timeout_seconds", 0.05)
+    monkeypatch.setattr(llm_retry, "retry_max_attempts", 2)
+    release = threading.Event()
+
+    try:
+        with pytest.raises(llm_retry.LlmDeadlineExceeded):
+            call_with_retries(lambda: release.wait(5), task="test")
+    finally:
+        release.set()
+    assert len(no_sleep) == 1
+    assert attempt_logs == [(2, 0, False)]
@@ -0,0 +1,82 @@
+""" Tests for MediaAssetManager batched writes, against an in-memory Firestore stand-in. """
+from common.media_asset_manager import MediaAssetManager
+
+
+class FakeDocRef:
+    def __init__(self, store, asset_id):
+        self.store = store
+        self.id = asset_id
+
+    def update(self, payload):
+        if self.id not in self.store:
+            raise KeyError(f"No document to update: {self.id}")
+        self.store[self.id].update(payload)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self.store = store
+        self.writes = []
+
+    def update(self, doc_ref, payload):
+        self.writes.append((doc_ref, payload))
+
+    def commit(self):
+        # Like Firestore, a batch is applied atomically or not at all
+        for doc_ref, _ in self.writes:
+            if doc_ref.id not in self.store:
+                raise KeyError(f"No document to update: {doc_ref.id}")
+        for doc_ref, payload in self.writes:
+            self.store[doc_ref.id].update(payload)
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self.store = store
+
+    def document(self, asset_id):
+        return FakeDocRef(self.store, asset_id)
+
+
+class FakeDb:
+    def __init__(self, store):
+        self.store = store
+
+    def batch(self):
+        return FakeBatch(self.store)
+
+
+def make_manager(store):
+    manager = MediaAssetManager.__new__(MediaAssetManager)
+    manager.db = FakeDb(store)
+    manager.media_assets_collection = FakeCollection(store)
+    return manager
+
+
+def test_bulk_update_applies_every_update():
+    store = {"a": {}, "b": {}}
+
+    committed = make_manager(store).bulk_update_asset_metadata(
+        [("a", "summary", {"status": "completed"}), ("b", "previews", {"status": "failed"})]
+    )
+
+    assert committed == 2
+    assert store["a"]["summary.status"] == "completed"
+    assert store["b"]["previews.status"] == "failed"
+
+
+def test_bulk_update_skips_missing_documents_without_dropping_the_batch():
+    store = {"a": {}, "c": {}}
+
+    committed = make_manager(store).bulk_update_asset_metadata(
+        [
+            ("a", "summary", {"status": "completed"}),
+            ("deleted", "summary", {"status": "completed"}),
+            ("c", "summary", {"status": "partial_success"}),
+        ]
+    )
+
+    assert committed == 2
+    assert store["a"]["summary.status"] == "completed"
+    assert store["c"]["summary.status"] == "partial_success"
+    assert "deleted" not in store
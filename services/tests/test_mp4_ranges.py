@@ -0,0 +1,223 @@
+""" Tests for common.mp4_ranges on a small MP4 built box by box.
+
+The fixture holds a video track (two stts runs, two stsc runs, sync samples,
+an edit list and co64 chunk offsets) and an audio track (uniform sample size
+and stco chunk offsets), with their chunks interleaved in the mdat box.
+"""
+import struct
+
+import pytest
+
+from common import mp4_ranges
+from common.mp4_ranges import fetch_time_ranges, read_mp4_index
+
+TIMESCALE = 1000
+# Video: 4 samples of 500ms then 6 of 250ms, starting 250ms into the media
+VIDEO_STTS = [(4, 500), (6, 250)]
+VIDEO_TIMES = [0, 500, 1000, 1500, 2000, 2250, 2500, 2750, 3000, 3250]
+VIDEO_SIZES = [100 + 10 * index for index in range(10)]
+VIDEO_CHUNKS = [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+VIDEO_STSC = [(1, 3, 1), (3, 2, 1)]
+VIDEO_SYNC = [1, 6]
+VIDEO_MEDIA_TIME = 250
+# Audio: 8 samples of 500ms, 2 per chunk
+AUDIO_SIZE = 50
+AUDIO_CHUNKS = [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+
+def box(box_type, *payloads):
+    payload = b"".join(payloads)
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode("latin-1")) + payload
+
+
+def full_box(box_type, *payloads, version=0):
+    return box(box_type, struct.pack(">B3x", version), *payloads)
+
+
+def table(box_type, fmt, entries):
+    return full_box(box_type, struct.pack(">I", len(entries)), *(struct.pack(fmt, *entry) for entry in entries))
+
+
+def sample_bytes(track, index, size):
+    return bytes([(1 if track == "vide" else 100) + index]) * size
+
+
+def track_box(handler, codec, entry, stts, stsz, stsc, offsets_box, stss=None, media_time=None):
+    stbl = [
+        full_box("stsd", struct.pack(">I", 1), box(codec, entry)),
+        table("stts", ">II", stts),
+        stsz,
+        table("stsc", ">III", stsc),
+        offsets_box,
+    ]
+    if stss:
+        stbl.append(table("stss", ">I", [(number,) for number in stss]))
+    mdia = box(
+        "mdia",
+        full_box("mdhd", struct.pack(">IIII", 0, 0, TIMESCALE, 3500)),
+        full_box("hdlr", struct.pack(">I4s12sx", 0, handler.encode("latin-1"), b"")),
+        box("minf", box("stbl", *stbl)),
+    )
+    edts = b""
+    if media_time is not None:
+        # An empty edit delaying the presentation, then the edit holding the media start
+        edts = box("edts", table("elst", ">IiI", [(100, -1, 1 << 16), (3500, media_time, 1 << 16)]))
+    return box("trak", edts, mdia)
+
+
+def build_moov(video_offsets, audio_offsets, fragmented=False):
+    video = track_box(
+        "vide",
+        "avc1",
+        b"\0" * 24 + struct.pack(">HH", 1280, 720) + b"\0" * 50,
+        VIDEO_STTS,
+        full_box("stsz", struct.pack(">II", 0, len(VIDEO_SIZES)), *(struct.pack(">I", size) for size in VIDEO_SIZES)),
+        VIDEO_STSC,
+        table("co64", ">Q", [(offset,) for offset in video_offsets]),
+        stss=VIDEO_SYNC,
+        media_time=VIDEO_MEDIA_TIME,
+    )
+    audio = track_box(
+        "soun",
+        "mp4a",
+        b"\0" * 28,
+        [(8, 500)],
+        full_box("stsz", struct.pack(">II", AUDIO_SIZE, 8)),
+        [(1, 2, 1)],
+        table("stco", ">I", [(offset,) for offset in audio_offsets]),
+    )
+    return box("moov", box("mvex") if fragmented else b"", video, audio)
+
+
+def build_mp4(moov_first=True, fragmented=False):
+    """
+    Returns the file bytes and the byte offset of every video and audio sample.
+    """
+    ftyp = box("ftyp", b"isom", struct.pack(">I", 512), b"isomiso2")
+    moov_size = len(build_moov([0] * len(VIDEO_CHUNKS), [0] * len(AUDIO_CHUNKS), fragmented))
+    mdat_start = len(ftyp) + (moov_size if moov_first else 0) + 8
+
+    data = bytearray()
+    sample_offsets = {"vide": {}, "soun": {}}
+    chunk_offsets = {"vide": [], "soun": []}
+    for video_chunk, audio_chunk in zip(VIDEO_CHUNKS, AUDIO_CHUNKS):
+        for track, chunk in (("vide", video_chunk), ("soun", audio_chunk)):
+            chunk_offsets[track].append(mdat_start + len(data))
+            for index in chunk:
+                size = VIDEO_SIZES[index] if track == "vide" else AUDIO_SIZE
+                sample_offsets[track][index] = mdat_start + len(data)
+                data += sample_bytes(track, index, size)
+
+    moov = build_moov(chunk_offsets["vide"], chunk_offsets["soun"], fragmented)
+    assert len(moov) == moov_size
+    mdat = box("mdat", bytes(data))
+    parts = [ftyp, moov, mdat] if moov_first else [ftyp, mdat, moov]
+    return b"".join(parts), sample_offsets
+
+
+class BytesReader:
+    """Range reader over bytes, recording the ranges read."""
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.reads = []
+
+    def read(self, start, end):
+        self.reads.append((start, end))
+        return self.data[start:min(end, self.size)]
+
+
+@pytest.fixture
+def mp4():
+    return build_mp4()
+
+
+def tracks_by_handler(index):
+    return {track.handler: track for track in index.tracks}
+
+
+@pytest.mark.parametrize("moov_first", [True, False])
+def test_read_mp4_index_maps_samples_to_times_and_offsets(moov_first):
+    data, sample_offsets = build_mp4(moov_first)
+    index = read_mp4_index(BytesReader(data))
+
+    assert index.size == len(data)
+    tracks = tracks_by_handler(index)
+    video, audio = tracks["vide"], tracks["soun"]
+
+    assert (video.codec, video.width, video.height) == ("avc1", 1280, 720)
+    assert video.timescale == TIMESCALE
+    assert video.media_time == VIDEO_MEDIA_TIME
+    assert list(video.times) == VIDEO_TIMES
+    assert list(video.sizes) == VIDEO_SIZES
+    assert list(video.offsets) == [sample_offsets["vide"][index] for index in range(10)]
+    assert video.sync_samples == [0, 5]
+
+    assert audio.codec == "mp4a"
+    assert audio.media_time == 0
+    assert list(audio.times) == [500 * index for index in range(8)]
+    assert list(audio.sizes) == [AUDIO_SIZE] * 8
+    assert list(audio.offsets) == [sample_offsets["soun"][index] for index in range(8)]
+    assert audio.sync_samples is None
+
+
+def test_sample_span_starts_at_the_preceding_sync_sample(mp4):
+    video = tracks_by_handler(read_mp4_index(BytesReader(mp4[0])))["vide"]
+
+    # 1.0s is media time 1250, in sample 2, whose GOP starts at sample 0
+    assert video.sample_span(1.0, 1.6) == (0, 5)
+    # 2.0s is media time 2250, sample 5, itself a sync sample
+    assert video.sample_span(2.0, 2.1) == (5, 7)
+    assert video.sample_span(3.0, 60.0) == (5, 10)
+
+
+def test_track_byte_ranges_merge_contiguous_samples(mp4):
+    data, sample_offsets = mp4
+    video = tracks_by_handler(read_mp4_index(BytesReader(data)))["vide"]
+    offsets = sample_offsets["vide"]
+
+    # Samples 5 and 6 sit in different chunks, with an audio chunk between them
+    assert video.byte_ranges(2.0, 2.1) == [
+        (offsets[5], offsets[5] + VIDEO_SIZES[5]),
+        (offsets[6], offsets[6] + VIDEO_SIZES[6]),
+    ]
+    # Samples 0 to 2 form the first chunk
+    assert video.byte_ranges(0.0, 0.5)[0] == (offsets[0], offsets[2] + VIDEO_SIZES[2])
+
+
+def test_read_mp4_index_rejects_unsupported_sources(mp4):
+    fragmented, _ = build_mp4(fragmented=True)
+
+    assert read_mp4_index(BytesReader(fragmented)) is None
+    assert read_mp4_index(BytesReader(mp4[0][:40])) is None
+    assert read_mp4_index(BytesReader(b"\x1aE\xdf\xa3" + b"\0" * 100)) is None
+
+
+def test_fetch_time_ranges_writes_a_sparse_copy(mp4, tmp_path, monkeypatch):
+    data, sample_offsets = mp4
+    # The fixture is smaller than the head probe and the merge gap of real sources
+    monkeypatch.setattr(mp4_ranges, "HEAD_PROBE_BYTES", 32)
+    monkeypatch.setattr(mp4_ranges, "MERGE_GAP_BYTES", 0)
+    monkeypatch.setattr(mp4_ranges, "range_fetch_max_fraction", 1.0)
+    local_path = tmp_path / "sparse.mp4"
+
+    assert fetch_time_ranges(BytesReader(data), [(3.0, 3.3)], str(local_path), padding=0) == str(local_path)
+
+    copy = local_path.read_bytes()
+    assert len(copy) == len(data)
+    # The first second of every track is fetched for probing, then the GOP of the range
+    fetched = {"vide": [0, 1, 2, 3, 5, 6, 7, 8, 9], "soun": [0, 1, 2, 6, 7]}
+    for track, offsets in sample_offsets.items():
+        for index, offset in offsets.items():
+            size = VIDEO_SIZES[index] if track == "vide" else AUDIO_SIZE
+            expected = sample_bytes(track, index, size) if index in fetched[track] else b"\0" * size
+            assert copy[offset:offset + size] == expected, (track, index)
+    moov_start = data.index(b"moov") - 4
+    assert copy[:moov_start] == data[:moov_start]
+
+
+def test_fetch_time_ranges_declines_ranges_covering_most_of_the_source(mp4, tmp_path, monkeypatch):
+    monkeypatch.setattr(mp4_ranges, "range_fetch_max_fraction", 0.5)
+
+    assert fetch_time_ranges(BytesReader(mp4[0]), [(0.0, 3.5)], str(tmp_path / "copy.mp4"), padding=0) is None
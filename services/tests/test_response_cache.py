@@ -0,0 +1,102 @@
+""" Tests for common.response_cache: cache keys, source checksums and disk eviction. """
+import os
+import time
+
+from common import response_cache
+from common.response_cache import LocalDiskBackend, build_cache_key, get_source_checksum
+
+KEY_ARGS = ("crc32c:abc", "prompt", {"type": "object"}, "gemini-2.5-flash", {"temperature": 1})
+
+
+def test_build_cache_key_is_stable():
+    assert build_cache_key(*KEY_ARGS) == build_cache_key(*KEY_ARGS)
+    # Dict ordering does not change the key
+    assert build_cache_key(*KEY_ARGS[:4], {"b": 1, "a": 2}) == build_cache_key(
+        *KEY_ARGS[:4], {"a": 2, "b": 1}
+    )
+
+
+def test_build_cache_key_changes_with_every_input():
+    changed = [
+        ("crc32c:def",) + KEY_ARGS[1:],
+        KEY_ARGS[:1] + ("other prompt",) + KEY_ARGS[2:],
+        KEY_ARGS[:2] + (None,) + KEY_ARGS[3:],
+        KEY_ARGS[:3] + ("gemini-2.5-pro", KEY_ARGS[4]),
+        KEY_ARGS[:4] + ({"temperature": 0},),
+    ]
+    keys = {build_cache_key(*args) for args in changed}
+    assert len(keys) == len(changed)
+    assert build_cache_key(*KEY_ARGS) not in keys
+
+
+def test_build_cache_key_changes_with_the_version(monkeypatch):
+    key = build_cache_key(*KEY_ARGS)
+    monkeypatch.setattr(response_cache, "CACHE_KEY_VERSION", response_cache.CACHE_KEY_VERSION + 1)
+    assert build_cache_key(*KEY_ARGS) != key
+
+
+def test_source_checksum_from_the_request_skips_the_lookup(monkeypatch):
+    def fail():
+        raise AssertionError("the object should not be looked up")
+
+    monkeypatch.setattr(response_cache, "_get_storage_client", fail)
+    assert get_source_checksum("gs://bucket/video.mp4", "GCS", "crc32c:abc") == "crc32c:abc"
+    assert get_source_checksum("https://youtu.be/xyz", "youtube") == "uri:https://youtu.be/xyz"
+
+
+def test_source_checksum_is_not_remembered_across_requests(monkeypatch):
+    class Blob:
+        crc32c = "fresh"
+
+    class Bucket:
+        def get_blob(self, name):
+            return Blob()
+
+    class Client:
+        def bucket(self, name):
+            return Bucket()
+
+    monkeypatch.setattr(response_cache, "_get_storage_client", Client)
+    get_source_checksum("gs://bucket/video.mp4", "GCS", "crc32c:stale")
+    assert get_source_checksum("gs://bucket/video.mp4") == "crc32c:fresh"
+
+
+def set_entry(backend, key, size, mtime):
+    backend.set(key, "x" * size)
+    os.utime(backend._path(key), (mtime, mtime))
+
+
+def test_local_disk_backend_round_trip(tmp_path):
+    backend = LocalDiskBackend(str(tmp_path), max_bytes=1000)
+
+    assert backend.get("missing") is None
+    backend.set("key", '{"a": 1}')
+    assert backend.get("key") == '{"a": 1}'
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_local_disk_backend_evicts_least_recently_used(tmp_path):
+    backend = LocalDiskBackend(str(tmp_path), max_bytes=350)
+    now = time.time()
+    set_entry(backend, "old", 100, now - 300)
+    set_entry(backend, "recent", 100, now - 100)
+    set_entry(backend, "older_but_read", 100, now - 400)
+    # Reading an entry refreshes its access time
+    backend.get("older_but_read")
+
+    backend.set("new", "x" * 100)
+
+    assert backend.get("old") is None
+    assert backend.get("recent") is not None
+    assert backend.get("older_but_read") is not None
+    assert backend.get("new") is not None
+
+
+def test_local_disk_backend_ignores_other_files(tmp_path):
+    (tmp_path / "notes.txt").write_text("x" * 1000)
+    backend = LocalDiskBackend(str(tmp_path), max_bytes=150)
+
+    backend.set("key", "x" * 100)
+
+    assert backend.get("key") is not None
+    assert (tmp_path / "notes.txt").exists()
@@ -0,0 +1,145 @@
+""" Tests for common.shot_detection: cut picking, detection on synthetic frames and snapping. """
+import numpy as np
+import pytest
+
+from common import shot_detection
+from common.shot_detection import (
+    FRAME_HEIGHT,
+    FRAME_WIDTH,
+    _pick_cuts,
+    detect_shots,
+    get_shot_boundaries,
+    has_shot_index,
+    snap_times,
+    snap_timecodes,
+)
+
+
+def solid_frames(colours):
+    """One frame per (r, g, b) colour."""
+    frames = np.zeros((len(colours), FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    frames[:] = np.asarray(colours, dtype=np.uint8)[:, None, None, :]
+    return frames
+
+
+def test_pick_cuts_keeps_the_strongest_cut_within_the_minimum_spacing():
+    scores = np.zeros(20)
+    scores[[5, 6, 12]] = [0.5, 0.9, 0.6]
+
+    # Cuts start a shot at the frame after the score; 6 and 7 are too close, 7 is stronger
+    assert _pick_cuts(scores, min_frames=4) == [7, 13]
+
+
+def test_pick_cuts_ignores_scores_under_the_threshold_and_too_early_cuts():
+    scores = np.zeros(20)
+    scores[[1, 10]] = [0.9, shot_detection.shot_cut_threshold]
+
+    # Frame 2 would leave a first shot shorter than min_frames; 0.3 is not above the threshold
+    assert _pick_cuts(scores, min_frames=4) == []
+
+
+def test_detect_shots_finds_colour_changes(monkeypatch):
+    colours = [(200, 30, 30)] * 10 + [(30, 30, 200)] * 10 + [(30, 200, 30)] * 10
+    frames = solid_frames(colours)
+
+    def sample_frames(source, sample_fps):
+        # Chunks split mid-shot, so scores must continue across chunks
+        yield frames[:7]
+        yield frames[7:25]
+        yield frames[25:]
+
+    monkeypatch.setattr(shot_detection, "_sample_frames", sample_frames)
+    shot_index = detect_shots("video.mp4", sample_fps=4, time_budget=0)
+
+    assert shot_index["boundaries"] == [2.5, 5.0]
+    assert shot_index["shot_count"] == 3
+    assert shot_index["duration"] == 7.5
+    assert shot_index["complete"] is True
+
+
+def test_shot_index_presence():
+    single_shot = {"video_details": {"shot_index": {"boundaries": [], "shot_count": 1}}}
+
+    assert has_shot_index(single_shot)
+    assert get_shot_boundaries(single_shot) == []
+    assert not has_shot_index({"video_details": {}})
+    assert not has_shot_index(None)
+
+
+def test_snap_times_moves_times_within_tolerance():
+    snapped = snap_times([9.0, 12.4, 20.0, 31.0], [10.0, 13.0, 30.0], tolerance=1.5)
+
+    assert snapped.tolist() == [10.0, 13.0, 20.0, 30.0]
+
+
+def test_snap_times_with_a_single_boundary():
+    snapped = snap_times([0.5, 9.0, 11.0, 30.0], [10.0], tolerance=1.5)
+
+    assert snapped.tolist() == [0.5, 10.0, 10.0, 30.0]
+
+
+def test_snap_times_without_boundaries_or_times():
+    assert snap_times([4.0], []).tolist() == [4.0]
+    assert snap_times([], [10.0]).tolist() == []
+
+
+def test_snap_timecodes_rewrites_timecodes_and_exact_times():
+    items = [{"start_timecode": "00:09", "end_timecode": "00:29"}]
+
+    snap_timecodes(items, "start_timecode", "end_timecode", [10.0, 13.0, 30.0], tolerance=1.5)
+
+    assert items == [
+        {"start_timecode": "00:10", "end_timecode": "00:30", "start_seconds": 10.0, "end_seconds": 30.0}
+    ]
+
+
+def test_snap_timecodes_skips_items_that_would_end_up_empty():
+    items = [
+        # Both ends snap to the boundary at 10s
+        {"start_timecode": "00:09", "end_timecode": "00:11"},
+        {"start_timecode": "soon", "end_timecode": "00:11"},
+        "not a dict",
+    ]
+    expected = [dict(items[0]), dict(items[1]), items[2]]
+
+    snap_timecodes(items, "start_timecode", "end_timecode", [10.0], tolerance=1.5)
+
+    assert items == expected
+
+
+@pytest.mark.parametrize("boundaries", [[], np.array([])])
+def test_snap_timecodes_without_boundaries(boundaries):
+    items = [{"start_timecode": "00:09", "end_timecode": "00:11"}]
+
+    snap_timecodes(items, "start_timecode", "end_timecode", boundaries)
+
+    assert items == [{"start_timecode": "00:09", "end_timecode": "00:11"}]
+
+
+def test_detect_shots_stops_at_the_time_budget(monkeypatch):
+    closed = []
+
+    def sample_frames(source, sample_fps):
+        try:
+            for _ in range(6):
+                yield solid_frames([(100, 100, 100)] * 5)
+        finally:
+            closed.append(True)
+
+    class Clock:
+        now = 0.0
+
+        @classmethod
+        def monotonic(cls):
+            cls.now += 10.0
+            return cls.now
+
+    monkeypatch.setattr(shot_detection, "_sample_frames", sample_frames)
+    monkeypatch.setattr(shot_detection, "CHUNK_FRAMES", 5)
+    monkeypatch.setattr(shot_detection, "time", Clock)
+    shot_index = detect_shots("video.mp4", sample_fps=4, time_budget=15)
+
+    # The budget runs out after the second chunk, and the decoder is stopped
+    assert shot_index["duration"] == 2.5
+    assert shot_index["complete"] is False
+    assert closed == [True]
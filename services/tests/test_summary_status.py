@@ -0,0 +1,35 @@
+""" Tests for summaries_generator.summary_status: merging re-run subtasks into recorded statuses. """
+from summaries_generator.summary_status import build_summary_update, get_previous_subtasks
+
+
+def test_recorded_subtask_statuses_are_kept():
+    recorded = {
+        "summary": {"status": "completed", "error_message": None},
+        "sections": {"status": "failed", "error_message": "timeout"},
+        "categorization": {"status": "completed", "error_message": None},
+    }
+
+    assert get_previous_subtasks({"subtasks": recorded}, ["sections"]) == recorded
+
+
+def test_legacy_assets_keep_their_failed_subtasks():
+    summary_data = {"status": "partial_success", "error_message": "SummaryError: bad JSON"}
+
+    previous = get_previous_subtasks(summary_data, ["sections"])
+
+    assert previous == {
+        "summary": {"status": "failed", "error_message": "Not completed"},
+        "categorization": {"status": "completed", "error_message": None},
+    }
+    update = build_summary_update({"sections": {"sections": []}}, previous)
+    assert update["status"] == "partial_success"
+    assert update["subtasks"]["sections"]["status"] == "completed"
+
+
+def test_legacy_failed_assets_are_not_recorded_as_completed():
+    previous = get_previous_subtasks({"status": "failed", "error_message": "boom"}, ["summary"])
+
+    assert {name: status["status"] for name, status in previous.items()} == {
+        "sections": "failed",
+        "categorization": "failed",
+    }
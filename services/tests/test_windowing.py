@@ -0,0 +1,103 @@
+""" Tests for common.windowing: window planning and merging of windowed results. """
+import pytest
+
+from common import windowing
+from common.windowing import failed_windows, merge_windowed_items, plan_windows
+
+
+def get_times(item):
+    return item["start"], item["end"]
+
+
+def set_times(item, start, end):
+    item["start"], item["end"] = start, end
+
+
+def test_plan_windows_covers_the_timeline_with_overlap():
+    windows = plan_windows(3600, length=600, overlap=30)
+
+    assert windows[0] == (0.0, 600.0)
+    assert windows[-1][1] == 3600.0
+    for (_, previous_end), (start, end) in zip(windows, windows[1:]):
+        assert previous_end - start == pytest.approx(30)
+        assert end - start <= 600
+
+
+def test_plan_windows_folds_a_short_tail_into_the_last_window():
+    assert plan_windows(1250, length=600, overlap=30) == [(0.0, 600.0), (570.0, 1250.0)]
+
+
+def test_plan_windows_keeps_a_long_tail_as_its_own_window():
+    assert plan_windows(1400, length=600, overlap=30) == [(0.0, 600.0), (570.0, 1170.0), (1140.0, 1400.0)]
+
+
+def test_plan_windows_of_a_short_video():
+    assert plan_windows(100, length=600, overlap=30) == [(0.0, 100.0)]
+
+
+def test_use_windowed_analysis(monkeypatch):
+    monkeypatch.setattr(windowing, "windowed_analysis_enabled", True)
+    monkeypatch.setattr(windowing, "windowed_analysis_min_duration", 1800)
+
+    assert windowing.use_windowed_analysis(1800)
+    assert not windowing.use_windowed_analysis(1799)
+    assert not windowing.use_windowed_analysis(None)
+    monkeypatch.setattr(windowing, "windowed_analysis_enabled", False)
+    assert not windowing.use_windowed_analysis(7200)
+
+
+def test_merge_drops_duplicates_seen_from_both_windows():
+    windows = [(0.0, 600.0), (570.0, 1170.0)]
+    window_items = [
+        [{"start": 10, "end": 40, "title": "a"}, {"start": 575, "end": 598, "title": "b", "score": 1}],
+        [{"start": 576, "end": 600, "title": "b again", "score": 2}, {"start": 700, "end": 760, "title": "c"}],
+    ]
+
+    merged = merge_windowed_items(window_items, windows, get_times, set_times, score=lambda item: item.get("score", 0))
+
+    assert [item["title"] for item in merged] == ["a", "b again", "c"]
+
+
+def test_merge_keeps_the_first_duplicate_without_a_score():
+    windows = [(0.0, 600.0), (570.0, 1170.0)]
+    window_items = [[{"start": 575, "end": 598, "title": "first"}], [{"start": 576, "end": 600, "title": "second"}]]
+
+    merged = merge_windowed_items(window_items, windows, get_times, set_times)
+
+    assert [item["title"] for item in merged] == ["first"]
+
+
+def test_merge_clamps_items_to_their_window_and_skips_failed_windows():
+    windows = [(0.0, 600.0), (570.0, 1170.0), (1140.0, 1800.0)]
+    window_items = [
+        [{"start": 590, "end": 640, "title": "a"}],
+        None,
+        [{"start": 1150, "end": 1200, "title": "c"}, {"start": 1900, "end": 1950, "title": "outside"}],
+    ]
+
+    merged = merge_windowed_items(window_items, windows, get_times, set_times)
+
+    assert merged == [{"start": 590, "end": 600.0, "title": "a"}, {"start": 1150, "end": 1200, "title": "c"}]
+
+
+def test_merge_shifts_timestamps_reported_relative_to_the_window():
+    windows = [(0.0, 600.0), (570.0, 1170.0)]
+    window_items = [[], [{"start": 30, "end": 90, "title": "relative"}, {"start": 200, "end": 260, "title": "later"}]]
+
+    merged = merge_windowed_items(window_items, windows, get_times, set_times)
+
+    assert [(item["start"], item["end"]) for item in merged] == [(600, 660), (770, 830)]
+
+
+def test_merge_does_not_modify_the_window_items():
+    item = {"start": 590, "end": 640}
+    merge_windowed_items([[item]], [(0.0, 600.0)], get_times, set_times)
+
+    assert item == {"start": 590, "end": 640}
+
+
+def test_failed_windows():
+    windows = [(0.0, 600.0), (570.0, 1170.0), (1140.0, 1800.0)]
+
+    assert failed_windows([[1], None, []], windows) == [{"start": 570.0, "end": 1170.0}]
+    assert failed_windows([[1], [], []], windows) == []
@@ -0,0 +1,97 @@
+""" Tests for common.word_timings: snapping boundaries to the gaps between words. """
+import pytest
+
+from common.word_timings import WordTimings, snap_to_words
+
+# "Hello world." then a pause, then "This is fine."
+WORDS = [
+    {"word": "Hello", "end_time": "0.4s"},
+    {"word": "world.", "start_time": "0.5s", "end_time": "1s"},
+    {"word": "This", "start_time": "3s", "end_time": "3.3s"},
+    {"word": "is", "start_time": "3.4s", "end_time": "3.6s"},
+    {"word": "fine.", "start_time": "3.7s", "end_time": "4.2s"},
+]
+
+
+@pytest.fixture
+def word_timings():
+    return WordTimings(WORDS)
+
+
+def test_words_are_loaded_from_the_asset():
+    assert len(WordTimings.from_asset({"transcription": {"words": WORDS}})) == 5
+    assert len(WordTimings.from_asset({"transcription": {}})) == 0
+    assert len(WordTimings.from_asset(None)) == 0
+
+
+def test_inside_word(word_timings):
+    assert word_timings.inside_word(0.2)
+    assert word_timings.inside_word(3.5)
+    assert not word_timings.inside_word(2.0)
+    assert not word_timings.inside_word(3.0)
+
+
+def test_start_moves_to_just_before_the_next_sentence(word_timings):
+    assert word_timings.snap(3.0, "start") == pytest.approx(2.8)
+    assert word_timings.snap(2.1, "start") == pytest.approx(2.8)
+
+
+def test_end_moves_to_just_after_the_previous_sentence(word_timings):
+    assert word_timings.snap(1.5, "end") == pytest.approx(1.2)
+
+
+def test_boundary_inside_a_word_moves_to_the_nearest_word_gap(word_timings):
+    # No sentence gap within 0.3s of 3.45, which cuts "is" in half
+    assert word_timings.snap(3.45, "start", tolerance=0.3) == pytest.approx(3.35)
+    assert word_timings.snap(3.9, "end", tolerance=0.3) == pytest.approx(3.65)
+
+
+def test_boundary_out_of_reach_is_unchanged(word_timings):
+    assert word_timings.snap(10.0, "start") == 10.0
+    # Between words but away from a sentence gap
+    assert word_timings.snap(3.35, "start", tolerance=0.3) == 3.35
+
+
+def test_snap_to_words_rewrites_timecodes_and_exact_times(word_timings):
+    items = [{"start_time": "00:03", "end_time": "00:04", "title": "fine"}]
+
+    snap_to_words(items, "start_time", "end_time", word_timings)
+
+    assert items == [{
+        "start_time": "00:03",
+        "end_time": "00:04",
+        "title": "fine",
+        "start_seconds": 2.8,
+        "end_seconds": 4.4,
+    }]
+
+
+def test_snap_to_words_prefers_the_exact_times_of_earlier_steps(word_timings):
+    items = [{"start_time": "00:00", "end_time": "00:05", "start_seconds": 3.0, "end_seconds": 3.9}]
+
+    snap_to_words(items, "start_time", "end_time", word_timings, tolerance=0.3)
+
+    assert items[0]["start_seconds"] == 2.8
+    assert items[0]["end_seconds"] == 3.65
+
+
+def test_snap_to_words_leaves_unusable_items_alone(word_timings):
+    items = [
+        {"start_time": "later", "end_time": "00:04"},
+        # Would start after its end, at 2.8s, and end at 1.2s
+        {"start_time": "00:02.2", "end_time": "00:02.2"},
+        "not a dict",
+    ]
+    expected = [dict(items[0]), dict(items[1]), items[2]]
+
+    snap_to_words(items, "start_time", "end_time", word_timings)
+
+    assert items == expected
+
+
+def test_snap_to_words_without_word_timings():
+    items = [{"start_time": "00:03", "end_time": "00:04"}]
+
+    snap_to_words(items, "start_time", "end_time", WordTimings([]))
+
+    assert items == [{"start_time": "00:03", "end_time": "00:04"}]
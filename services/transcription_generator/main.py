@@ -18,6 +18,7 @@ import ffmpeg
 
 from common.media_asset_manager import MediaAssetManager
 from common.logging_config import configure_logger
+from common.audio_silence import silence_analysis_enabled, build_silence_index
 
 # Configure logger for the service
 configure_logger()
@@ -34,6 +35,33 @@ llm_model = os.environ.get("LLM_MODEL", "chirp")
 app = Flask(__name__)
 
 
+def store_silence_index(asset_id: str, local_audio_path: str) -> None:
+    """
+    Builds the silence index of the extracted audio and stores it with the
+    asset, before the transcription completes so that the other services can
+    use it. Failures are logged and do not fail the transcription.
+
+    Args:
+        asset_id (str): The ID of the asset.
+        local_audio_path (str): Path of the extracted audio.
+    """
+    log_extra = {"extra_fields": {"asset_id": asset_id}}
+    try:
+        silence_index = build_silence_index(local_audio_path)
+    except Exception:
+        logger.warning(
+            "Could not build the silence index for asset %s", asset_id, exc_info=True, extra=log_extra
+        )
+        return
+    logger.info(
+        "Found %d silences for asset %s",
+        len(silence_index["starts"]),
+        asset_id,
+        extra=log_extra,
+    )
+    asset_manager.update_asset_metadata(asset_id, "transcription", {"silence_index": silence_index})
+
+
 def generate_transcription(asset_id: str, video_gcs_uri: str) -> dict:
     """
     Extracts audio from a video file in GCS, transcribes it using the
@@ -92,6 +120,10 @@ def generate_transcription(asset_id: str, video_gcs_uri: str) -> dict:
             logger.error("ffmpeg failed: %s", stderr, exc_info=True, extra=log_extra)
             raise e
 
+        # The low sample rate audio is reused for the silence index
+        if silence_analysis_enabled:
+            store_silence_index(asset_id, local_audio_path)
+
         # 4. Upload extracted audio to GCS
         logger.info("Uploading extracted audio to %s", audio_gcs_uri, extra=log_extra)
         audio_blob = bucket.blob(audio_gcs_path)
@@ -107,8 +107,8 @@ resource "google_pubsub_topic" "dead_letter_topic" {
 
 # Separate Service Account for Batch Processor/Dispatcher
 # This follows the principle of least privilege. The dispatcher only needs permissions
-# to publish to Pub/Sub and write initial records to Firestore. It does not need
-# access to GCS objects or AI/ML APIs.
+# to publish to Pub/Sub, write initial records to Firestore and read the header of new
+# GCS objects to probe them. It does not need access to AI/ML APIs.
 resource "google_service_account" "batch_processor_sa" {
   project      = var.project_id
   account_id   = "batch-processor-sa"
@@ -134,7 +134,8 @@ resource "google_service_account" "metadata_generator_sa" {
 
 # Permissions for Batch Processor SA
 # Grants the dispatcher service account the ability to subscribe to the central
-# ingestion topic, publish to the task-specific topics, and write to Firestore.
+# ingestion topic, publish to the task-specific topics, write to Firestore and
+# read GCS objects.
 resource "google_project_iam_member" "batch_processor_pubsub_subscriber" {
   project = var.project_id
   role    = "roles/pubsub.subscriber"
@@ -153,6 +154,12 @@ resource "google_project_iam_member" "batch_processor_firestore_user" {
   member  = "serviceAccount:${google_service_account.batch_processor_sa.email}"
 }
 
+resource "google_project_iam_member" "batch_processor_gcs_reader" {
+  project = var.project_id
+  role    = "roles/storage.objectViewer" # Probing reads the header of new videos
+  member  = "serviceAccount:${google_service_account.batch_processor_sa.email}"
+}
+
 # Permissions for Consolidated Metadata Generator SA
 # Grants the metadata generator services the ability to subscribe to their respective
 # task topics, read/write GCS objects, write to Firestore, and use AI/ML services.
@@ -232,6 +239,14 @@ resource "google_service_account_iam_member" "metadata_generator_sa_token_creato
   member             = "serviceAccount:service-${data.google_project.project.number}@gcp-sa-pubsub.iam.gserviceaccount.com"
 }
 
+# Allows the metadata generators to sign short-lived URLs of the source videos,
+# which ffmpeg streams for shot detection instead of downloading them.
+resource "google_service_account_iam_member" "metadata_generator_sa_url_signer" {
+  service_account_id = google_service_account.metadata_generator_sa.name
+  role               = "roles/iam.serviceAccountTokenCreator"
+  member             = "serviceAccount:${google_service_account.metadata_generator_sa.email}"
+}
+
 # Pub/Sub Service Account to Cloud Run Invoker role for push subscriptions
 # These bindings grant the service accounts (impersonated by Pub/Sub) the
 # `run.invoker` role, allowing them to trigger their respective Cloud Run services.
@@ -354,6 +369,14 @@ resource "google_cloud_run_service" "summaries_generator" {
           name  = "LLM_MODEL"
           value = var.summaries_generator_llm_model
         }
+        env {
+          name  = "SUMMARY_GENERATION_MODE"
+          value = var.summaries_generator_mode
+        }
+        env {
+          name  = "SUMMARY_INPUT_MODE"
+          value = var.summaries_generator_input_mode
+        }
       }
       container_concurrency = var.summaries_generator_concurrency
       timeout_seconds       = 600 # 10 minutes, can be adjusted for long tasks
@@ -432,6 +455,10 @@ resource "google_cloud_run_service" "previews_generator" {
           name  = "OUTPUT_BUCKET_NAME"
           value = var.output_bucket_name
         }
+        env {
+          name  = "REEL_SELECTION_MODE"
+          value = var.previews_generator_reel_selection_mode
+        }
         resources {
           limits = {
             cpu    = "8"
@@ -492,6 +519,12 @@ resource "google_pubsub_subscription" "summaries_sub" {
     max_delivery_attempts = 5
   }
 
+  # Messages deferred while their transcript is pending are redelivered after this backoff
+  retry_policy {
+    minimum_backoff = "60s"
+    maximum_backoff = "600s"
+  }
+
   push_config {
     push_endpoint = google_cloud_run_service.summaries_generator.status[0].url
     oidc_token {
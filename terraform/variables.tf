@@ -70,6 +70,18 @@ variable "summaries_generator_llm_model" {
   default     = "gemini-2.5-flash"
 }
 
+variable "summaries_generator_mode" {
+  description = "How the summaries generator calls the LLM: 'separate' (one request per subtask) or 'combined' (single request with a merged schema)."
+  type        = string
+  default     = "separate"
+}
+
+variable "summaries_generator_input_mode" {
+  description = "What the summaries generator analyzes for the summary and categorization: 'video' or 'transcript' (falls back to the video when the transcript is missing or too thin)."
+  type        = string
+  default     = "video"
+}
+
 variable "transcription_generator_llm_model" {
   description = "The LLM model to be used by the transcription generator service."
   type        = string
@@ -82,6 +94,12 @@ variable "previews_generator_llm_model" {
   default     = "gemini-2.5-flash"
 }
 
+variable "previews_generator_reel_selection_mode" {
+  description = "How the previews generator selects highlight reel segments: 'local' (deterministic optimizer) or 'llm'."
+  type        = string
+  default     = "local"
+}
+
 
 
 # Concurrency threshold for dispatcher and metadata generator services
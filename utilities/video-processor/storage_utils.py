@@ -2,6 +2,8 @@ import logging
 import os
 from google.cloud import storage
 from urllib.parse import urlparse
+from typing import List, Optional, Tuple
+from mp4_ranges import GcsRangeReader, fetch_time_ranges, range_fetch_enabled
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,8 +36,13 @@ def parse_gcs_uri(uri: str) -> (str, str):
         return None, None
 
 
-def download_from_gcs(gcs_uri: str, temp_dir: str) -> str:
-    """Downloads a file from a GCS URI to a temp directory and returns its local path."""
+def download_from_gcs(gcs_uri: str, temp_dir: str, time_ranges: Optional[List[Tuple[float, float]]] = None) -> str:
+    """
+    Downloads a file from a GCS URI to a temp directory and returns its local path.
+    When time_ranges are given and the file is a progressive MP4, only its index
+    and the bytes of those (start, end) ranges in seconds are fetched, into a
+    sparse file of the original size.
+    """
     if not gcs_uri:
         raise ValueError("A valid GCS URI must be provided.")
     try:
@@ -47,9 +54,19 @@ def download_from_gcs(gcs_uri: str, temp_dir: str) -> str:
         if not bucket_name:
             raise ValueError(f"Could not parse bucket name from URI: {gcs_uri}")
 
+        local_path = os.path.join(temp_dir, os.path.basename(blob_name))
+
+        if time_ranges and range_fetch_enabled:
+            try:
+                logging.info(f"Fetching {len(time_ranges)} time ranges of {gcs_uri} to {local_path}...")
+                reader = GcsRangeReader(storage_client, bucket_name, blob_name)
+                if fetch_time_ranges(reader, time_ranges, local_path):
+                    return local_path
+            except Exception as e:
+                logging.warning(f"Byte-range fetch of '{gcs_uri}' failed, downloading it whole: {e}")
+
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(blob_name)
-        local_path = os.path.join(temp_dir, os.path.basename(blob_name))
 
         logging.info(f"Downloading {gcs_uri} to {local_path}...")
         blob.download_to_filename(local_path)
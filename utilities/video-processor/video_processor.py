@@ -3,6 +3,7 @@ import os
 import tempfile
 from moviepy.editor import VideoFileClip, ImageClip, concatenate_videoclips, CompositeVideoClip, ColorClip
 from storage_utils import download_from_gcs, upload_blob, parse_gcs_uri
+from segment_pool import render_segments
 
 # --- NEW IMPORTS for robust image handling ---
 from PIL import Image
@@ -117,46 +118,55 @@ def process_video_from_document_data(doc_data: dict, document_id: str):
         return
     output_bucket_name = output_bucket_uri.replace("gs://", "").strip("/")
     
+    # Sections are validated first, so that only their time ranges are fetched.
+    valid_sections = []
+    for i, section in enumerate(sections):
+        clip_num = i + 1
+        start_tc = section.get("start_time")
+        end_tc = section.get("end_time")
+
+        if not start_tc or not end_tc:
+            logging.warning(f"Skipping section {clip_num} due to missing timecodes.")
+            continue
+
+        try:
+            valid_sections.append((clip_num, timecode_to_seconds(start_tc), timecode_to_seconds(end_tc)))
+        except (ValueError, IndexError):
+            logging.warning(f"Skipping section {clip_num} due to invalid timecodes.")
+
     with tempfile.TemporaryDirectory() as temp_dir:
         logging.info(f"Created temporary directory: {temp_dir}")
-        local_video_path = download_from_gcs(main_video_gs_path, temp_dir)
+        time_ranges = [(start_seconds, end_seconds) for _, start_seconds, end_seconds in valid_sections]
+        local_video_path = download_from_gcs(main_video_gs_path, temp_dir, time_ranges=time_ranges)
         local_logo_path = download_from_gcs(logo_gs_path, temp_dir) if logo_gs_path else None
 
-        for i, section in enumerate(sections):
-            clip_num = i + 1
-            logging.info(f"--- Processing Section {clip_num} ---")
-            start_tc = section.get("start_time")
-            end_tc = section.get("end_time")
-
-            if not start_tc or not end_tc:
-                logging.warning(f"Skipping section {clip_num} due to missing timecodes.")
+        # Sections are rendered across a process pool.
+        jobs = []
+        output_filenames = []
+        for clip_num, start_seconds, end_seconds in valid_sections:
+            output_filename = f"clip_{clip_num}_{os.path.basename(local_video_path)}"
+            local_output_path = os.path.join(temp_dir, output_filename)
+            jobs.append((local_video_path, start_seconds, end_seconds, local_output_path, local_logo_path))
+            output_filenames.append((clip_num, output_filename))
+
+        try:
+            processed_clip_paths = render_segments(trim_and_add_logo, jobs)
+        except Exception as e:
+            logging.error(f"An unexpected error occurred while rendering the sections: {e}", exc_info=True)
+            return
+
+        for (clip_num, output_filename), processed_clip_path in zip(output_filenames, processed_clip_paths):
+            logging.info(f"--- Uploading Section {clip_num} ---")
+            if not processed_clip_path:
+                logging.error(f"Failed to process clip {clip_num}, skipping upload.")
                 continue
-            
             try:
-                start_seconds = timecode_to_seconds(start_tc)
-                end_seconds = timecode_to_seconds(end_tc)
-
-                output_filename = f"clip_{clip_num}_{os.path.basename(local_video_path)}"
-                local_output_path = os.path.join(temp_dir, output_filename)
-                
-                processed_clip_path = trim_and_add_logo(
-                    main_video_path=local_video_path,
-                    start_time=start_seconds,
-                    end_time=end_seconds,
-                    output_path=local_output_path,
-                    logo_path=local_logo_path
-                )
-                
-                if processed_clip_path:
-                    destination_blob_name = f"processed_clips/{document_id}/{output_filename}"
-                    logging.info(f"Uploading {local_output_path} to gs://{output_bucket_name}/{destination_blob_name}")
-                    upload_blob(output_bucket_name, processed_clip_path, destination_blob_name)
-                    logging.info(f"Successfully uploaded clip {clip_num}.")
-                else:
-                    logging.error(f"Failed to process clip {clip_num}, skipping upload.")
-
+                destination_blob_name = f"processed_clips/{document_id}/{output_filename}"
+                logging.info(f"Uploading {processed_clip_path} to gs://{output_bucket_name}/{destination_blob_name}")
+                upload_blob(output_bucket_name, processed_clip_path, destination_blob_name)
+                logging.info(f"Successfully uploaded clip {clip_num}.")
             except Exception as e:
-                logging.error(f"An unexpected error occurred processing section {clip_num}: {e}", exc_info=True)
+                logging.error(f"An unexpected error occurred uploading section {clip_num}: {e}", exc_info=True)
 
         logging.info("--- All sections processed. ---")
 